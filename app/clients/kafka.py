@@ -1,8 +1,9 @@
+import asyncio
 import json
 import os
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Iterable, Optional
 
 from aiokafka import AIOKafkaProducer
 
@@ -26,21 +27,60 @@ class KafkaModerationClient:
             self._producer = AIOKafkaProducer(bootstrap_servers=self.bootstrap_servers)
         await self._producer.start()
 
+    @property
+    def is_started(self) -> bool:
+        return self._producer is not None
+
     async def stop(self) -> None:
         if self._producer is not None:
             await self._producer.stop()
             self._producer = None
 
-    async def send_moderation_request(self, item_id: int, task_id: int) -> None:
+    async def send_moderation_request(
+        self,
+        item_id: int,
+        task_id: int,
+        task_created_at: Optional[datetime] = None,
+    ) -> None:
+        assert self._producer is not None
+
+        value = self._moderation_payload(item_id, task_id, task_created_at, datetime.now(timezone.utc))
+        await self._producer.send_and_wait(self.moderation_topic, value=value)
+
+    async def send_moderation_requests(
+        self,
+        messages: Iterable[tuple[int, int, Optional[datetime], datetime]],
+    ) -> None:
+        """
+        Пачка (item_id, task_id, task_created_at, timestamp): все сообщения ставятся в буфер продюсера
+        и ждутся разом, так что aiokafka отправляет их общими батчами.
+        """
         assert self._producer is not None
 
+        futures = [
+            await self._producer.send(
+                self.moderation_topic,
+                value=self._moderation_payload(item_id, task_id, task_created_at, timestamp),
+            )
+            for item_id, task_id, task_created_at, timestamp in messages
+        ]
+        await asyncio.gather(*futures)
+
+    @staticmethod
+    def _moderation_payload(
+        item_id: int,
+        task_id: int,
+        task_created_at: Optional[datetime],
+        timestamp: datetime,
+    ) -> bytes:
         payload = {
             "item_id": item_id,
             "task_id": task_id,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            # по нему воркер ищет задачу только в ее секции moderation_results
+            "task_created_at": task_created_at.isoformat() if task_created_at is not None else None,
+            "timestamp": timestamp.isoformat(),
         }
-        value = json.dumps(payload).encode("utf-8")
-        await self._producer.send_and_wait(self.moderation_topic, value=value)
+        return json.dumps(payload).encode("utf-8")
 
     async def send_to_dlq(self, message: dict, error: str, retry_count: int = 0) -> None:
         assert self._producer is not None
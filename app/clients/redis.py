@@ -1,25 +1,102 @@
 import os
-from typing import Optional
+from typing import Any, Optional
 
 from redis import asyncio as aioredis
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+from redis.asyncio.retry import Retry
+from redis.backoff import EqualJitterBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.clients.redis_sharding import ShardedRedis
+
+
+# single — один инстанс, cluster — Redis Cluster, sharded — несколько независимых инстансов,
+# ключи раскладываются консистентным хешированием на стороне клиента
+REDIS_MODE = os.getenv("REDIS_MODE", "single")
+# узлы для cluster/sharded: "host:port,host:port"
+REDIS_NODES = os.getenv("REDIS_NODES", "")
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+# медленный Redis не должен подвешивать запрос: кэш — оптимизация, а не источник истины
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "0.5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_RETRY_ATTEMPTS = int(os.getenv("REDIS_RETRY_ATTEMPTS", "1"))
+REDIS_RETRY_BACKOFF_BASE = float(os.getenv("REDIS_RETRY_BACKOFF_BASE", "0.01"))
+REDIS_RETRY_BACKOFF_CAP = float(os.getenv("REDIS_RETRY_BACKOFF_CAP", "0.1"))
+
+
+def _parse_nodes(value: str) -> list[tuple[str, int]]:
+    nodes = []
+    for item in value.split(","):
+        item = item.strip()
+        if item:
+            host, _, port = item.partition(":")
+            nodes.append((host, int(port or 6379)))
+    return nodes
+
+
+def _connection_options(decode_responses: bool) -> dict[str, Any]:
+    return {
+        "decode_responses": decode_responses,
+        "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "retry": Retry(EqualJitterBackoff(cap=REDIS_RETRY_BACKOFF_CAP, base=REDIS_RETRY_BACKOFF_BASE), REDIS_RETRY_ATTEMPTS),
+        "retry_on_error": [ConnectionError, TimeoutError],
+    }
+
+
+def build_client(decode_responses: bool) -> Any:
+    options = _connection_options(decode_responses)
+    redis_db = os.getenv("REDIS_DB", "1")
+
+    if REDIS_MODE == "cluster":
+        # в Redis Cluster есть только db 0
+        return RedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in _parse_nodes(REDIS_NODES)],
+            max_connections=REDIS_MAX_CONNECTIONS,
+            **options,
+        )
+
+    if REDIS_MODE == "sharded":
+        nodes = _parse_nodes(REDIS_NODES)
+        clients = [
+            aioredis.Redis(host=host, port=port, db=int(redis_db), max_connections=REDIS_MAX_CONNECTIONS, **options)
+            for host, port in nodes
+        ]
+        return ShardedRedis(clients, names=[f"{host}:{port}" for host, port in nodes])
+
+    if REDIS_MODE != "single":
+        raise ValueError(f"Unknown REDIS_MODE: {REDIS_MODE}")
+
+    redis_host = os.getenv("REDIS_HOST", "localhost")
+    redis_port = os.getenv("REDIS_PORT", "6379")
+    redis_url = f"redis://{redis_host}:{redis_port}/{redis_db}"
+    return aioredis.from_url(redis_url, encoding="utf-8", max_connections=REDIS_MAX_CONNECTIONS, **options)
 
 
 class RedisClient:
     _instance: Optional[aioredis.Redis] = None
+    # без декодирования: кэш хранит готовые байты ответа, лишний decode/encode не нужен
+    _binary_instance: Optional[aioredis.Redis] = None
 
     @classmethod
     def get_client(cls) -> aioredis.Redis:
         if cls._instance is None:
-            redis_host = os.getenv("REDIS_HOST", "localhost")
-            redis_port = os.getenv("REDIS_PORT", "6379")
-            redis_db = os.getenv("REDIS_DB", "1")
-            redis_url = f"redis://{redis_host}:{redis_port}/{redis_db}"
-            
-            cls._instance = aioredis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+            cls._instance = build_client(decode_responses=True)
         return cls._instance
 
+    @classmethod
+    def get_binary_client(cls) -> aioredis.Redis:
+        if cls._binary_instance is None:
+            cls._binary_instance = build_client(decode_responses=False)
+        return cls._binary_instance
+
     @classmethod
     async def close(cls):
-        if cls._instance:
-            await cls._instance.close()
-            cls._instance = None
+        for instance in (cls._instance, cls._binary_instance):
+            if instance is not None:
+                await instance.aclose()
+        cls._instance = None
+        cls._binary_instance = None
@@ -0,0 +1,164 @@
+"""
+Шардирование ключей по нескольким независимым Redis на стороне клиента.
+
+Ключ -> узел выбирается консистентным хешированием (кольцо с виртуальными узлами),
+поэтому при добавлении узла переезжает только ~1/N ключей кэша.
+"""
+import asyncio
+import bisect
+import hashlib
+from collections import defaultdict
+from typing import Any, Sequence
+
+from redis import asyncio as aioredis
+
+
+VIRTUAL_NODES = 160
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8"), usedforsecurity=False).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes: Sequence[str], virtual_nodes: int = VIRTUAL_NODES) -> None:
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        points = sorted(
+            (_hash(f"{node}#{replica}"), index)
+            for index, node in enumerate(nodes)
+            for replica in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._indexes = [index for _, index in points]
+
+    def node_index(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._indexes[position]
+
+
+class ShardedRedis:
+    """Подмножество команд redis.asyncio.Redis, которое использует сервис, поверх нескольких узлов."""
+
+    def __init__(self, clients: Sequence[aioredis.Redis], names: Sequence[str]) -> None:
+        self.clients = list(clients)
+        self._ring = HashRing(names)
+
+    def client_for(self, key: str) -> aioredis.Redis:
+        return self.clients[self._ring.node_index(key)]
+
+    def _group_keys(self, keys: Sequence[str]) -> dict[int, list[str]]:
+        groups: dict[int, list[str]] = defaultdict(list)
+        for key in keys:
+            groups[self._ring.node_index(key)].append(key)
+        return groups
+
+    async def get(self, key: str) -> Any:
+        return await self.client_for(key).get(key)
+
+    async def set(self, key: str, value: Any, **kwargs: Any) -> Any:
+        return await self.client_for(key).set(key, value, **kwargs)
+
+    async def hset(self, key: str, *args: Any, **kwargs: Any) -> Any:
+        return await self.client_for(key).hset(key, *args, **kwargs)
+
+    async def hgetall(self, key: str) -> Any:
+        return await self.client_for(key).hgetall(key)
+
+    async def hdel(self, key: str, *fields: str) -> int:
+        return await self.client_for(key).hdel(key, *fields)
+
+    async def delete(self, *keys: str) -> int:
+        return await self._multi_key("delete", keys)
+
+    async def unlink(self, *keys: str) -> int:
+        return await self._multi_key("unlink", keys)
+
+    async def _multi_key(self, command: str, keys: Sequence[str]) -> int:
+        results = await asyncio.gather(
+            *(getattr(self.clients[index], command)(*group) for index, group in self._group_keys(keys).items())
+        )
+        return sum(results)
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        # скрипт работает с ключами одного узла: узел выбирается по первому ключу
+        return await self.client_for(keys_and_args[0]).evalsha(sha, numkeys, *keys_and_args)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        return await self.client_for(keys_and_args[0]).eval(script, numkeys, *keys_and_args)
+
+    def pipeline(self, transaction: bool = False) -> "ShardedPipeline":
+        if transaction:
+            raise ValueError("Transactions are not supported across shards")
+        return ShardedPipeline(self)
+
+    async def ping(self) -> bool:
+        return all(await asyncio.gather(*(client.ping() for client in self.clients)))
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(client.aclose() for client in self.clients))
+
+    close = aclose
+
+
+class ShardedPipeline:
+    """
+    Pipeline, разложенный по узлам: на каждый узел уходит свой pipeline, узлы опрашиваются параллельно.
+    Многоключевые DELETE/UNLINK режутся по узлам, результат складывается.
+    """
+
+    MULTI_KEY_COMMANDS = frozenset({"delete", "unlink"})
+
+    def __init__(self, redis: ShardedRedis) -> None:
+        self._redis = redis
+        # (имя команды, [(индекс узла, позиция в pipeline узла), ...])
+        self._commands: list[tuple[str, list[tuple[int, int]]]] = []
+        self._pipelines: dict[int, Any] = {}
+
+    async def __aenter__(self) -> "ShardedPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.reset()
+
+    async def reset(self) -> None:
+        for pipe in self._pipelines.values():
+            await pipe.reset()
+        self._pipelines.clear()
+        self._commands.clear()
+
+    def _queue(self, index: int, name: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> tuple[int, int]:
+        pipe = self._pipelines.get(index)
+        if pipe is None:
+            pipe = self._pipelines[index] = self._redis.clients[index].pipeline(transaction=False)
+        getattr(pipe, name)(*args, **kwargs)
+        return index, len(pipe) - 1
+
+    def __getattr__(self, name: str):
+        def queue_command(*args: Any, **kwargs: Any) -> "ShardedPipeline":
+            if name in self.MULTI_KEY_COMMANDS:
+                groups = self._redis._group_keys(args)
+                slots = [self._queue(index, name, tuple(group), kwargs) for index, group in groups.items()]
+            else:
+                slots = [self._queue(self._redis._ring.node_index(args[0]), name, args, kwargs)]
+            self._commands.append((name, slots))
+            return self
+
+        return queue_command
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    async def execute(self) -> list[Any]:
+        indexes = list(self._pipelines)
+        replies = await asyncio.gather(*(self._pipelines[index].execute() for index in indexes))
+        by_node = dict(zip(indexes, replies))
+
+        results = []
+        for name, slots in self._commands:
+            values = [by_node[index][position] for index, position in slots]
+            results.append(sum(values) if name in self.MULTI_KEY_COMMANDS else values[0])
+
+        self._pipelines.clear()
+        self._commands.clear()
+        return results
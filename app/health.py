@@ -0,0 +1,195 @@
+"""
+Liveness и readiness без нагрузки на зависимости.
+
+Проверки модели, пула БД, Redis и Kafka producer выполняет фоновая задача раз в
+HEALTH_PROBE_INTERVAL_SECONDS, каждая со своим таймаутом. Результат сразу сериализуется,
+и /readyz отдает готовые байты: частые проверки оркестратора и балансировщика не делают
+ни одного запроса к зависимостям.
+
+Readiness падает, если хоть одна проверка не прошла, результаты устарели, модель
+перезагружается прямо сейчас или процесс останавливается. Liveness проверяет только сам процесс: цикл проверок жив.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import db
+from app.clients.redis import RedisClient
+from app.responses import dumps_json
+
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "2"))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "1"))
+# через сколько секунд без завершенного цикла проверок процесс считается зависшим
+HEALTH_STALE_SECONDS = float(os.getenv("HEALTH_STALE_SECONDS", "10"))
+
+Probe = Callable[[], Awaitable[Optional[str]]]
+
+
+class ProbeFailed(Exception):
+    pass
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    detail: str = ""
+    latency_ms: float = 0.0
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        probes: dict[str, Probe],
+        *,
+        interval: float = HEALTH_PROBE_INTERVAL_SECONDS,
+        timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS,
+        stale_after: float = HEALTH_STALE_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._probes = probes
+        self._interval = interval
+        self._timeout = timeout
+        self._stale_after = stale_after
+        self._clock = clock
+
+        self.results: dict[str, ProbeResult] = {}
+        self.checked_at: Optional[float] = None
+        self.reloading = False
+        self.draining = False
+        self._ready = False
+        self._ready_body = dumps_json({"status": "starting"})
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Первый цикл — probe() при старте, дальше раз в interval до stop_event."""
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                await self.probe()
+
+    async def probe(self) -> None:
+        names = list(self._probes)
+        results = await asyncio.gather(*(self._run_probe(name) for name in names))
+        self.results = dict(zip(names, results))
+        self.checked_at = self._clock()
+        self._publish()
+
+    async def _run_probe(self, name: str) -> ProbeResult:
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(self._probes[name](), timeout=self._timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            ok, detail = False, "timeout"
+        except ProbeFailed as exc:
+            ok, detail = False, str(exc)
+        except Exception as exc:
+            ok, detail = False, f"{type(exc).__name__}: {exc}"
+        latency_ms = round((time.perf_counter() - started) * 1000, 3)
+        if not ok and self.results.get(name, ProbeResult(ok=True)).ok:
+            logger.warning("Health probe %s failed: %s", name, detail)
+        return ProbeResult(ok=ok, detail=detail or "", latency_ms=latency_ms)
+
+    @contextmanager
+    def model_reloading(self) -> Iterator[None]:
+        self.reloading = True
+        self._publish()
+        try:
+            yield
+        finally:
+            self.reloading = False
+            self._publish()
+
+    def start_draining(self) -> None:
+        """Остановка: readiness падает сразу, не дожидаясь следующего цикла проверок."""
+        self.draining = True
+        self._publish()
+
+    def _publish(self) -> None:
+        failed = [name for name, result in self.results.items() if not result.ok]
+        self._ready = self.checked_at is not None and not failed and not self.reloading and not self.draining
+        if self.draining:
+            status = "draining"
+        elif self.checked_at is None:
+            status = "starting"
+        elif self.reloading:
+            status = "model_reloading"
+        else:
+            status = "ok" if not failed else "fail"
+        self._ready_body = dumps_json(
+            {
+                "status": status,
+                "checks": {
+                    name: {"ok": result.ok, "detail": result.detail, "latency_ms": result.latency_ms}
+                    for name, result in self.results.items()
+                },
+            }
+        )
+
+    def is_stale(self) -> bool:
+        return self.checked_at is None or self._clock() - self.checked_at > self._stale_after
+
+    def alive(self) -> bool:
+        # до первого цикла процесс еще стартует, это не повод его перезапускать
+        return self.checked_at is None or not self.is_stale()
+
+    def readiness(self) -> tuple[bool, bytes]:
+        if self._ready and self.is_stale():
+            return False, dumps_json({"status": "stale"})
+        return self._ready, self._ready_body
+
+
+def _model_probe(app: Any) -> Probe:
+    async def probe() -> Optional[str]:
+        if getattr(app.state, "model", None) is None:
+            raise ProbeFailed("model is not loaded")
+        return getattr(app.state, "model_version", None)
+
+    return probe
+
+
+async def _db_probe() -> Optional[str]:
+    if db.pool_stats() is None:
+        raise ProbeFailed("pool is not initialized")
+    try:
+        # половина таймаута проверки: ожидание пула должно закончиться раньше общего таймаута
+        await db.check_primary(HEALTH_PROBE_TIMEOUT_SECONDS / 2)
+    except asyncio.TimeoutError:
+        stats = db.pool_stats()
+        if stats is not None and stats["idle"] == 0 and stats["size"] >= stats["max_size"]:
+            raise ProbeFailed(f"pool exhausted ({stats['size']}/{stats['max_size']} busy)") from None
+        raise
+    stats = db.pool_stats()
+    return f"{stats['size'] - stats['idle']}/{stats['max_size']} busy"
+
+
+async def _redis_probe() -> Optional[str]:
+    await RedisClient.get_client().ping()
+    return None
+
+
+def _kafka_probe(kafka_client: Any) -> Probe:
+    async def probe() -> Optional[str]:
+        if not kafka_client.is_started:
+            raise ProbeFailed("producer is not started")
+        return None
+
+    return probe
+
+
+def create_health_monitor(app: Any, kafka_client: Any) -> HealthMonitor:
+    return HealthMonitor(
+        {
+            "model": _model_probe(app),
+            "db": _db_probe,
+            "redis": _redis_probe,
+            "kafka": _kafka_probe(kafka_client),
+        }
+    )
@@ -0,0 +1,3 @@
+"""
+Периодические и разовые джобы обслуживания (секции, прогрев кэша и т.п.).
+"""
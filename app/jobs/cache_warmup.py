@@ -0,0 +1,175 @@
+"""
+Прогрев кэша предсказаний для всех открытых объявлений.
+
+Объявления с продавцами читаются серверным курсором (с реплики, если она есть),
+скорятся пачками одной матрицей и пишутся в Redis pipeline'ом с разбросом TTL.
+После каждой записанной пачки последний id сохраняется в checkpoint-файл,
+повторный запуск с тем же файлом продолжает с него.
+
+    python -m app.jobs.cache_warmup --batch-size 5000 --rate-limit 20000 --checkpoint warmup.checkpoint
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from app.clients.redis import RedisClient
+from app.logging_config import setup_logging, shutdown_logging
+from app.responses import encode_prediction
+from db import close_db, get_connection, init_db
+from model import get_model_version, get_or_train_model
+from repositories.ads import AdRepository
+from repositories.prediction_cache import CacheNamespace, PredictionCacheRepository
+from services.moderation import predict_proba_rows
+
+
+logger = logging.getLogger(__name__)
+
+WARMUP_BATCH_SIZE = int(os.getenv("CACHE_WARMUP_BATCH_SIZE", "5000"))
+# доля TTL, на которую случайно укорачивается срок жизни прогретых записей
+WARMUP_TTL_JITTER = float(os.getenv("CACHE_WARMUP_TTL_JITTER", "0.25"))
+
+
+@dataclass
+class WarmupStats:
+    items: int = 0
+    batches: int = 0
+    last_id: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "last_id": self.last_id,
+            "seconds": round(self.seconds, 3),
+            "items_per_sec": round(self.items / self.seconds) if self.seconds else None,
+        }
+
+
+def read_checkpoint(path: Optional[Path]) -> int:
+    if path is None or not path.exists():
+        return 0
+    return int(path.read_text(encoding="utf-8").strip() or 0)
+
+
+def write_checkpoint(path: Optional[Path], last_id: int) -> None:
+    if path is None:
+        return
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(str(last_id), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def score_batch(model, rows) -> dict[int, bytes]:
+    """Готовые тела ответов /simple_predict для пачки строк курсора."""
+    item_ids, probabilities = predict_proba_rows(model, rows)
+    return {
+        item_id: encode_prediction(probability > 0.5, probability)
+        for item_id, probability in zip(item_ids, probabilities)
+    }
+
+
+class RateLimiter:
+    """Ровняет среднюю скорость до rate элементов в секунду (0 — без ограничения)."""
+
+    def __init__(self, rate: float, clock=time.monotonic, sleep=asyncio.sleep) -> None:
+        self._rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._started = clock()
+        self._done = 0
+
+    async def acquire(self, count: int) -> None:
+        self._done += count
+        if self._rate <= 0:
+            return
+        delay = self._done / self._rate - (self._clock() - self._started)
+        if delay > 0:
+            await self._sleep(delay)
+
+
+async def warmup(
+    *,
+    batch_size: int,
+    rate_limit: float,
+    checkpoint: Optional[Path],
+    after_id: Optional[int] = None,
+    ttl_jitter: float = WARMUP_TTL_JITTER,
+    model=None,
+    model_version: Optional[str] = None,
+) -> WarmupStats:
+    model = model if model is not None else get_or_train_model()
+    # пишем в неймспейс той модели, которой скорим: API с этой моделью прочитает записи сразу
+    namespace = CacheNamespace(version=model_version or get_model_version())
+    cache_repo = PredictionCacheRepository(RedisClient.get_binary_client(), namespace=namespace)
+    limiter = RateLimiter(rate_limit)
+    stats = WarmupStats(last_id=after_id if after_id is not None else read_checkpoint(checkpoint))
+    started = time.perf_counter()
+    logger.info("Cache warmup started after id=%s, model version %s", stats.last_id, namespace.version)
+
+    async def write(payloads: dict[int, bytes], last_id: int) -> None:
+        await cache_repo.set_predictions_raw(payloads, ttl_jitter=ttl_jitter)
+        stats.items += len(payloads)
+        stats.batches += 1
+        stats.last_id = last_id
+        write_checkpoint(checkpoint, last_id)
+
+    pending_write: Optional[asyncio.Task] = None
+    try:
+        async with get_connection(readonly=True) as conn:
+            async with conn.transaction(readonly=True):
+                async for rows in AdRepository(conn).iter_open_with_sellers(stats.last_id, batch_size):
+                    payloads = score_batch(model, rows)
+                    # следующую пачку читаем из курсора, пока предыдущая пишется в Redis
+                    if pending_write is not None:
+                        await pending_write
+                    await limiter.acquire(len(payloads))
+                    pending_write = asyncio.create_task(write(payloads, rows[-1]["id"]))
+        if pending_write is not None:
+            await pending_write
+    finally:
+        if pending_write is not None and not pending_write.done():
+            pending_write.cancel()
+        stats.seconds = time.perf_counter() - started
+
+    # полный проход завершен: следующий запуск должен начинать сначала
+    if checkpoint is not None and checkpoint.exists():
+        checkpoint.unlink()
+    logger.info("Cache warmup finished: %s", stats.as_dict())
+    return stats
+
+
+async def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Warm up prediction cache for open ads")
+    parser.add_argument("--batch-size", type=int, default=WARMUP_BATCH_SIZE)
+    parser.add_argument("--rate-limit", type=float, default=0, help="max items per second, 0 = unlimited")
+    parser.add_argument("--checkpoint", type=Path, help="file with the last written id, used to resume")
+    parser.add_argument("--after-id", type=int, help="start after this id, overrides the checkpoint")
+    parser.add_argument("--ttl-jitter", type=float, default=WARMUP_TTL_JITTER)
+    parser.add_argument("--model-version", help="cache namespace, defaults to the version of the local model file")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    await init_db()
+    try:
+        await warmup(
+            batch_size=args.batch_size,
+            rate_limit=args.rate_limit,
+            checkpoint=args.checkpoint,
+            after_id=args.after_id,
+            ttl_jitter=args.ttl_jitter,
+            model_version=args.model_version,
+        )
+    finally:
+        await close_db()
+        await RedisClient.close()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+Обслуживание секций moderation_results:
+- создает месячные секции на несколько месяцев вперед; строки, успевшие попасть
+  в moderation_results_default, переносятся в свои секции
+- секции старше срока хранения выгружает в сжатый CSV, отцепляет и удаляет
+
+Запускать по крону раз в сутки:
+
+    python -m app.jobs.moderation_partitions --dry-run
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+import asyncpg
+
+from app.logging_config import setup_logging, shutdown_logging
+from db import close_db, get_connection, init_db
+
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_AHEAD_MONTHS = int(os.getenv("MODERATION_PARTITIONS_AHEAD_MONTHS", "3"))
+RETENTION_MONTHS = int(os.getenv("MODERATION_RESULTS_RETENTION_MONTHS", "6"))
+ARCHIVE_DIR = Path(os.getenv("MODERATION_ARCHIVE_DIR", "archive/moderation_results"))
+
+PARTITION_NAME_RE = re.compile(r"^moderation_results_p(\d{4})(\d{2})$")
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def retention_cutoff(today: date, retention_months: int) -> date:
+    """Первый месяц, который еще хранится: секции строго раньше него архивируются."""
+    months = today.year * 12 + (today.month - 1) - retention_months
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partitions_to_archive(names: list[str], today: date, retention_months: int) -> list[str]:
+    cutoff = retention_cutoff(today, retention_months)
+    expired = [(month, name) for name in names if (month := partition_month(name)) is not None and month < cutoff]
+    return [name for _, name in sorted(expired)]
+
+
+async def ensure_partitions(
+    conn: asyncpg.Connection,
+    months_ahead: int,
+    from_month: Optional[date] = None,
+) -> int:
+    return await conn.fetchval(
+        "SELECT create_moderation_results_partitions($1, $2)",
+        months_ahead,
+        from_month,
+    )
+
+
+async def count_default_rows(conn: asyncpg.Connection) -> int:
+    """Строки в DEFAULT-секции значат, что джоба отставала: секции нужного месяца не было."""
+    return await conn.fetchval("SELECT COUNT(*) FROM moderation_results_default")
+
+
+async def list_partitions(conn: asyncpg.Connection) -> list[str]:
+    rows = await conn.fetch(
+        """
+        SELECT child.relname AS name
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'moderation_results'
+        """
+    )
+    return [row["name"] for row in rows]
+
+
+async def archive_partition(conn: asyncpg.Connection, name: str, archive_dir: Path) -> Path:
+    """
+    Сначала выгружает секцию в <name>.csv.gz (через временный файл), и только
+    после успешной записи отцепляет и удаляет ее одной транзакцией.
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    target = archive_dir / f"{name}.csv.gz"
+    tmp_target = target.with_suffix(".gz.tmp")
+
+    with gzip.open(tmp_target, "wb") as f:
+        await conn.copy_from_table(name, output=f, format="csv", header=True)
+    os.replace(tmp_target, target)
+
+    async with conn.transaction():
+        await conn.execute(f'ALTER TABLE moderation_results DETACH PARTITION "{name}"')
+        # DROP проходит мимо триггера счетчика pending-задач: их вычитаем из отцепленной секции сами
+        await conn.execute(
+            f"""
+            UPDATE moderation_pending_counters
+            SET pending = pending - (SELECT COUNT(*) FROM "{name}" WHERE status = 'pending')
+            WHERE shard = 0
+            """
+        )
+        await conn.execute(f'DROP TABLE "{name}"')
+        month = partition_month(name)
+        if month is not None:
+            # Idempotency-Key задач секции больше некуда вести
+            await conn.execute(
+                """
+                DELETE FROM moderation_idempotency_keys
+                WHERE task_created_at >= $1 AND task_created_at < $1 + INTERVAL '1 month'
+                """,
+                month,
+            )
+    return target
+
+
+async def run(*, months_ahead: int, retention_months: int, archive_dir: Path, dry_run: bool) -> None:
+    async with get_connection() as conn:
+        if dry_run:
+            logger.info("Dry run: would ensure partitions %s months ahead", months_ahead)
+        else:
+            stray = await count_default_rows(conn)
+            if stray:
+                logger.warning(
+                    "%s moderation_results rows are in the default partition, moving them to monthly partitions",
+                    stray,
+                )
+            created = await ensure_partitions(conn, months_ahead)
+            logger.info("Created %s moderation_results partitions", created)
+
+        expired = partitions_to_archive(await list_partitions(conn), date.today(), retention_months)
+        for name in expired:
+            if dry_run:
+                logger.info("Dry run: would archive and drop %s", name)
+                continue
+            path = await archive_partition(conn, name, archive_dir)
+            logger.info("Archived %s to %s and dropped it", name, path)
+
+
+async def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain moderation_results partitions")
+    parser.add_argument("--months-ahead", type=int, default=PARTITIONS_AHEAD_MONTHS)
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    await init_db()
+    try:
+        await run(
+            months_ahead=args.months_ahead,
+            retention_months=args.retention_months,
+            archive_dir=args.archive_dir,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await close_db()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""
+Пересчет модерации по всему каталогу новой моделью без Kafka и воркеров.
+
+Диапазон id открытых объявлений делится на части, каждую обрабатывает отдельный процесс:
+серверный курсор (с реплики, если она есть) -> пачка признаков -> один вызов модели ->
+COPY во временную staging-таблицу. В конце диапазона результаты одним запросом
+переносятся в moderation_results.
+
+    python -m app.jobs.rescore --processes 4 --batch-size 20000 --model-path model.pkl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.logging_config import setup_logging, shutdown_logging
+from db import close_db, get_connection, init_db
+from model import MODEL_PATH, load_model
+from repositories.ads import AdRepository
+from repositories.moderation_results import ModerationResultRepository
+from services.moderation import predict_proba_rows
+
+
+logger = logging.getLogger(__name__)
+
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", "20000"))
+
+
+@dataclass(frozen=True)
+class IdRange:
+    after_id: int
+    up_to_id: int
+
+
+def split_id_range(lo: int, hi: int, parts: int) -> list[IdRange]:
+    """Делит [lo, hi] на parts непересекающихся полуинтервалов (after_id, up_to_id]."""
+    parts = max(1, min(parts, hi - lo + 1))
+    step = (hi - lo + 1) / parts
+    bounds = [lo - 1 + round(step * index) for index in range(parts + 1)]
+    return [IdRange(after_id=bounds[index], up_to_id=bounds[index + 1]) for index in range(parts)]
+
+
+async def rescore_range(id_range: IdRange, model, batch_size: int) -> dict[str, Any]:
+    started = time.perf_counter()
+    scored = 0
+
+    # читающее соединение берем первым: после primary чтения в этом контексте тоже ушли бы в primary
+    async with get_connection(readonly=True) as read_conn, get_connection() as write_conn:
+        results_repo = ModerationResultRepository(write_conn)
+        await results_repo.create_rescore_staging()
+
+        async with read_conn.transaction(readonly=True):
+            batches = AdRepository(read_conn).iter_open_with_sellers(
+                id_range.after_id,
+                batch_size,
+                up_to_id=id_range.up_to_id,
+            )
+            async for rows in batches:
+                item_ids, probabilities = predict_proba_rows(model, rows)
+                await results_repo.copy_rescore_results(
+                    [
+                        (item_id, probability > 0.5, probability)
+                        for item_id, probability in zip(item_ids, probabilities)
+                    ]
+                )
+                scored += len(item_ids)
+
+        async with write_conn.transaction():
+            completed, inserted = await results_repo.merge_rescore_staging()
+        await write_conn.execute("DISCARD TEMP")
+
+    elapsed = time.perf_counter() - started
+    logger.info("Rescored ids (%s, %s]: %s items", id_range.after_id, id_range.up_to_id, scored)
+    return {
+        "after_id": id_range.after_id,
+        "up_to_id": id_range.up_to_id,
+        "items": scored,
+        "completed_pending": completed,
+        "inserted": inserted,
+        "seconds": round(elapsed, 3),
+    }
+
+
+async def _rescore_in_process(id_range: IdRange, model_path: str, batch_size: int) -> dict[str, Any]:
+    await init_db()
+    try:
+        return await rescore_range(id_range, load_model(model_path), batch_size)
+    finally:
+        await close_db()
+
+
+def _process_entrypoint(id_range: IdRange, model_path: str, batch_size: int) -> dict[str, Any]:
+    return asyncio.run(_rescore_in_process(id_range, model_path, batch_size))
+
+
+async def _open_id_bounds() -> Optional[tuple[int, int]]:
+    async with get_connection(readonly=True) as conn:
+        return await AdRepository(conn).get_open_id_bounds()
+
+
+def run(*, processes: int, ranges: int, batch_size: int, model_path: str) -> dict[str, Any]:
+    started = time.perf_counter()
+
+    async def bounds() -> Optional[tuple[int, int]]:
+        await init_db()
+        try:
+            return await _open_id_bounds()
+        finally:
+            await close_db()
+
+    id_bounds = asyncio.run(bounds())
+    if id_bounds is None:
+        return {"items": 0, "seconds": 0.0, "items_per_sec": None, "ranges": []}
+
+    id_ranges = split_id_range(*id_bounds, parts=ranges)
+    if processes <= 1:
+        range_reports = [_process_entrypoint(id_range, model_path, batch_size) for id_range in id_ranges]
+    else:
+        # spawn: у каждого процесса свой event loop и свой пул соединений
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            futures = [executor.submit(_process_entrypoint, id_range, model_path, batch_size) for id_range in id_ranges]
+            range_reports = [future.result() for future in futures]
+
+    elapsed = time.perf_counter() - started
+    items = sum(report["items"] for report in range_reports)
+    return {
+        "items": items,
+        "completed_pending": sum(report["completed_pending"] for report in range_reports),
+        "inserted": sum(report["inserted"] for report in range_reports),
+        "seconds": round(elapsed, 3),
+        "items_per_sec": round(items / elapsed) if elapsed else None,
+        "processes": processes,
+        "ranges": range_reports,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Rescore all open ads with a model and store results")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--ranges", type=int, help="id ranges to split the catalog into, defaults to --processes")
+    parser.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    try:
+        report = run(
+            processes=args.processes,
+            ranges=args.ranges or args.processes,
+            batch_size=args.batch_size,
+            model_path=args.model_path,
+        )
+    finally:
+        shutdown_logging()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Неблокирующее логирование: записи кладутся в очередь, форматирование и запись
+в stderr выполняются фоновым потоком QueueListener.
+"""
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+
+def parse_level(name: str) -> int:
+    """Числовой уровень по имени без учета регистра; неизвестное имя — ValueError."""
+    level = logging.getLevelNamesMapping().get(name.strip().upper())
+    if level is None:
+        raise ValueError(f"Unknown log level: {name!r}")
+    return level
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# доля запросов, для которых пишутся per-request логи; ошибки пишутся всегда
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "1.0"))
+# DEBUG — per-request логи видны только при LOG_LEVEL=DEBUG
+REQUEST_LOG_LEVEL = parse_level(os.getenv("REQUEST_LOG_LEVEL", "INFO"))
+
+LOG_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке
+    и не блокируется на переполненной очереди (запись отбрасывается).
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # msg % args посчитает поток listener-а, и только если запись реально пишется
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampledLogger:
+    """Per-request логи горячего пути: сэмплирование решается один раз на запрос через enabled()."""
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        *,
+        sample_rate: float = REQUEST_LOG_SAMPLE_RATE,
+        level: int = REQUEST_LOG_LEVEL,
+    ) -> None:
+        self._logger = logger
+        self._sample_rate = sample_rate
+        self._level = level
+
+    def enabled(self) -> bool:
+        if not self._logger.isEnabledFor(self._level):
+            return False
+        return self._sample_rate >= 1.0 or random.random() < self._sample_rate
+
+    def log(self, msg: str, *args: Any) -> None:
+        self._logger.log(self._level, msg, *args)
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[DeferredQueueHandler] = None
+_stream_handler: Optional[logging.Handler] = None
+
+
+def _get_stream_handler() -> logging.Handler:
+    global _stream_handler
+
+    if _stream_handler is None:
+        _stream_handler = logging.StreamHandler(sys.stderr)
+        _stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return _stream_handler
+
+
+def _replace_root_handler(handler: logging.Handler) -> None:
+    root = logging.getLogger()
+    for existing in (_queue_handler, _stream_handler):
+        if existing is not None and existing in root.handlers:
+            root.removeHandler(existing)
+    root.addHandler(handler)
+
+
+def setup_logging(level: str = LOG_LEVEL) -> None:
+    """Переводит root-логгер на очередь и запускает фоновый поток записи. Повторный вызов безопасен."""
+    global _listener, _queue_handler
+
+    logging.getLogger().setLevel(level)
+    if _listener is not None:
+        return
+
+    if _queue_handler is None:
+        _queue_handler = DeferredQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _listener = QueueListener(_queue_handler.queue, _get_stream_handler(), respect_handler_level=True)
+    _listener.start()
+    _replace_root_handler(_queue_handler)
+
+
+def setup_sync_logging(level: str = LOG_LEVEL) -> None:
+    """Синхронная запись без фонового потока — для процесса, который потом форкается."""
+    logging.getLogger().setLevel(level)
+    _replace_root_handler(_get_stream_handler())
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и возвращает синхронную запись, чтобы не терять логи после остановки."""
+    global _listener
+
+    if _listener is None:
+        return
+    _replace_root_handler(_get_stream_handler())
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,3 @@
+"""
+ASGI-middleware приложения (тайминги запросов и т.п.).
+"""
@@ -0,0 +1,312 @@
+"""
+Admission control: ограничение числа одновременно обрабатываемых запросов по классам маршрутов.
+
+Без него при перегрузке все запросы принимаются и копятся в ожидании соединения из пула
+и Redis, пока клиенты не отвалятся по таймауту, — полезная пропускная способность падает.
+Здесь у каждого класса свой лимит in-flight запросов, который подстраивается по наблюдаемой
+латентности (AIMD относительно целевой латентности класса). Сверх лимита запрос недолго ждет в очереди с дедлайном, а потом получает
+503 с Retry-After.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+from app.middleware.server_timing import stage
+from app.responses import dumps_json
+
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# начальные лимиты in-flight запросов по классам, дальше они подстраиваются сами
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "cache=50,compute=20,db=20,async=10")
+# латентность (от допуска до ответа), выше которой лимит класса снижается
+ADMISSION_TARGET_LATENCY_MS = os.getenv("ADMISSION_TARGET_LATENCY_MS", "cache=50,compute=100,db=200,async=200")
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "4"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "1000"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "100"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+OVERLOADED_DETAIL = "Сервис перегружен, повторите запрос позже"
+
+# /simple_predict принимается как дешевый cache hit; при промахе обработчик переводит его в db
+ROUTE_CLASSES = {
+    "/simple_predict": "cache",
+    "/predict": "compute",
+    "/async_predict": "async",
+    "/close": "db",
+    "/close_many": "db",
+}
+ROUTE_PREFIX_CLASSES = (("/moderation_result/", "db"),)
+
+
+def route_class_for(path: str) -> Optional[str]:
+    """Класс маршрута; None — запрос не ограничивается (например, /debug)."""
+    route_class = ROUTE_CLASSES.get(path)
+    if route_class is not None:
+        return route_class
+    for prefix, prefix_class in ROUTE_PREFIX_CLASSES:
+        if path.startswith(prefix):
+            return prefix_class
+    return None
+
+
+def parse_class_values(value: str) -> dict[str, float]:
+    """Разбирает "cache=50,db=20" в {"cache": 50.0, "db": 20.0}."""
+    values = {}
+    for item in value.split(","):
+        name, _, number = item.partition("=")
+        if name.strip():
+            values[name.strip()] = float(number)
+    return values
+
+
+class AdaptiveLimiter:
+    """
+    Лимит одновременных запросов класса по схеме AIMD, как окно перегрузки в TCP.
+
+    Ответ медленнее target_latency — лимит умножается на backoff, но не чаще раза за время
+    такого ответа: иначе все запросы одной медленной волны обрушили бы лимит до минимума.
+    Быстрый ответ — лимит растет на 1/limit (примерно +1 за «окно»), если он используется
+    хотя бы наполовину.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial_limit: int,
+        target_latency: float = 0.2,
+        min_limit: int = ADMISSION_MIN_LIMIT,
+        max_limit: int = ADMISSION_MAX_LIMIT,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_MS / 1000.0,
+        backoff: float = 0.9,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.target_latency = target_latency
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self._clock = clock
+
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = float("-inf")
+        self._latency: Optional[float] = None
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        """True — запрос допущен и должен вызвать release(); False — отказ."""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_size or self.queue_timeout <= 0:
+            self.shed += 1
+            return False
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        # свой таймер вместо wait_for: слот, переданный в момент таймаута, не должен потеряться
+        timer = loop.call_later(self.queue_timeout, self._expire, waiter)
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            timer.cancel()
+
+        if admitted:
+            self.admitted += 1
+        else:
+            self.shed += 1
+        return admitted
+
+    def release(self, latency: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._update_limit(latency)
+        self._wake_waiters()
+
+    def _expire(self, waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            self._discard(waiter)
+            waiter.set_result(False)
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def _update_limit(self, latency: float) -> None:
+        self._latency = latency if self._latency is None else self._latency + (latency - self._latency) * 0.1
+
+        if latency > self.target_latency:
+            now = self._clock()
+            if now - self._last_decrease >= latency:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif self.in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "target_latency_ms": round(self.target_latency * 1000.0, 3),
+            "latency_ms": round(self._latency * 1000.0, 3) if self._latency is not None else None,
+        }
+
+
+@dataclass
+class Ticket:
+    """Слот, занятый запросом; класс может смениться по ходу обработки (см. reclassify)."""
+
+    limiter: Optional[AdaptiveLimiter]
+    started: float
+
+
+_current_ticket: ContextVar[Optional[Ticket]] = ContextVar("admission_ticket", default=None)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limiters: dict[str, AdaptiveLimiter],
+        *,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.limiters = limiters
+        self.enabled = enabled
+        self.clock = clock
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        targets_ms = parse_class_values(ADMISSION_TARGET_LATENCY_MS)
+        limiters = {
+            name: AdaptiveLimiter(name, initial_limit=int(limit), target_latency=targets_ms.get(name, 200.0) / 1000.0)
+            for name, limit in parse_class_values(ADMISSION_LIMITS).items()
+        }
+        return cls(limiters, enabled=ADMISSION_ENABLED)
+
+    async def admit(self, route_class: str) -> Optional[Ticket]:
+        limiter = self.limiters[route_class]
+        with stage("admission_wait"):
+            if not await limiter.acquire():
+                return None
+        return Ticket(limiter=limiter, started=self.clock())
+
+    def finish(self, ticket: Ticket) -> None:
+        if ticket.limiter is not None:
+            ticket.limiter.release(self.clock() - ticket.started)
+            ticket.limiter = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "classes": {name: limiter.stats() for name, limiter in self.limiters.items()},
+        }
+
+
+admission = AdmissionController.from_env()
+
+
+def overloaded_exception() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=OVERLOADED_DETAIL,
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+async def reclassify(route_class: str, controller: Optional[AdmissionController] = None) -> None:
+    """
+    Переводит текущий запрос в другой класс, например cache -> db при промахе кэша.
+    Прежний слот освобождается без замера латентности; если новый класс перегружен — 503.
+    """
+    ticket = _current_ticket.get()
+    if ticket is None or ticket.limiter is None:
+        return
+    controller = controller if controller is not None else admission
+    limiter = controller.limiters.get(route_class)
+    if limiter is None or limiter is ticket.limiter:
+        return
+
+    ticket.limiter.release()
+    ticket.limiter = None
+    with stage("admission_wait"):
+        if not await limiter.acquire():
+            raise overloaded_exception()
+    ticket.limiter = limiter
+    ticket.started = controller.clock()
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, *, controller: Optional[AdmissionController] = None) -> None:
+        self.app = app
+        self.controller = controller if controller is not None else admission
+
+    async def __call__(self, scope, receive, send) -> None:
+        route_class = route_class_for(scope["path"]) if scope["type"] == "http" else None
+        if not self.controller.enabled or route_class not in self.controller.limiters:
+            await self.app(scope, receive, send)
+            return
+
+        ticket = await self.controller.admit(route_class)
+        if ticket is None:
+            await self._send_overloaded(send)
+            return
+
+        token = _current_ticket.set(ticket)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_ticket.reset(token)
+            self.controller.finish(ticket)
+
+    async def _send_overloaded(self, send) -> None:
+        body = dumps_json({"detail": OVERLOADED_DETAIL})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"retry-after", str(ADMISSION_RETRY_AFTER_SECONDS).encode("latin-1")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
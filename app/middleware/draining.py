@@ -0,0 +1,78 @@
+"""
+Учет запросов в обработке для плавной остановки.
+
+При остановке lifespan переводит трекер в режим draining: новые запросы сразу получают
+503 с Connection: close (балансировщик повторит их на другой реплике), а shutdown ждет,
+пока допишутся уже принятые, и только потом останавливает relay, Kafka producer и пулы.
+"""
+import asyncio
+import time
+
+from app.responses import dumps_json
+
+
+DRAINING_DETAIL = "Сервис останавливается, повторите запрос"
+# пробы оркестратора должны видеть настоящее состояние до конца остановки
+DRAIN_EXEMPT_PATHS = frozenset({"/livez", "/readyz"})
+
+
+class InFlightTracker:
+    def __init__(self) -> None:
+        self.count = 0
+        self.draining = False
+        self.rejected = 0
+
+    def resume(self) -> None:
+        self.draining = False
+
+    def start_draining(self) -> None:
+        self.draining = True
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """True — все запросы завершились до timeout."""
+        deadline = time.monotonic() + timeout
+        while self.count > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return self.count == 0
+
+
+in_flight = InFlightTracker()
+
+
+class InFlightMiddleware:
+    def __init__(self, app, tracker: InFlightTracker = in_flight) -> None:
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.tracker.draining and scope["path"] not in DRAIN_EXEMPT_PATHS:
+            self.tracker.rejected += 1
+            await _send_draining(send)
+            return
+
+        self.tracker.count += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.count -= 1
+
+
+async def _send_draining(send) -> None:
+    body = dumps_json({"detail": DRAINING_DETAIL})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", b"1"),
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
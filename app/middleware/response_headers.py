@@ -0,0 +1,44 @@
+from contextvars import ContextVar
+from typing import Optional
+
+
+_extra_headers: ContextVar[Optional[list[tuple[bytes, bytes]]]] = ContextVar("extra_response_headers", default=None)
+
+
+def add_response_header(name: str, value: str) -> None:
+    """
+    Заголовок к ответу текущего запроса из зависимости или сервиса.
+    Работает и для обработчиков, которые возвращают готовый Response (JSONBytesResponse):
+    заголовки sub-response FastAPI в такой ответ не переносит.
+    """
+    headers = _extra_headers.get()
+    if headers is not None:
+        headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+
+
+class ResponseHeadersMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers: list[tuple[bytes, bytes]] = []
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start" and headers:
+                existing = {name for name, _ in message.get("headers", [])}
+                message = {
+                    **message,
+                    # HTTPException уже мог выставить те же заголовки — их не дублируем
+                    "headers": [*message.get("headers", []), *(h for h in headers if h[0] not in existing)],
+                }
+            await send(message)
+
+        token = _extra_headers.set(headers)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _extra_headers.reset(token)
@@ -0,0 +1,148 @@
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") == "1"
+TIMING_SAMPLE_RATE = float(os.getenv("TIMING_SAMPLE_RATE", "0.1"))
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "500"))
+SLOW_REQUEST_BUFFER_SIZE = int(os.getenv("SLOW_REQUEST_BUFFER_SIZE", "200"))
+
+
+@dataclass
+class RequestTimings:
+    route: str
+    # разбивка по стадиям и заголовок — только для запросов из выборки
+    sampled: bool = True
+    stages: dict[str, float] = field(default_factory=dict)
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+    def add(self, name: str, duration_ms: float) -> None:
+        # одна и та же стадия может встречаться несколько раз (например, два checkout из пула)
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def header_value(self, total_ms: float) -> str:
+        parts = [f"{name};dur={duration:.2f}" for name, duration in self.stages.items()]
+        parts.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(parts)
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Замеряет стадию обработки запроса. Если запрос не попал в выборку — ничего не делает."""
+    timings = _current_timings.get()
+    if timings is None or not timings.sampled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000.0)
+
+
+def set_attr(key: str, value: Any) -> None:
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.attrs[key] = value
+
+
+class SlowRequestLog:
+    """Кольцевой буфер последних медленных запросов."""
+
+    def __init__(self, maxlen: int = SLOW_REQUEST_BUFFER_SIZE) -> None:
+        self._entries: deque[dict[str, Any]] = deque(maxlen=maxlen)
+
+    def record(self, timings: RequestTimings, total_ms: float, status_code: Optional[int]) -> None:
+        self._entries.append(
+            {
+                "route": timings.route,
+                "status_code": status_code,
+                "total_ms": round(total_ms, 2),
+                "sampled": timings.sampled,
+                "stages_ms": {name: round(duration, 2) for name, duration in timings.stages.items()},
+                **timings.attrs,
+                "captured_at": time.time(),
+            }
+        )
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return list(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+slow_requests = SlowRequestLog()
+
+
+class ServerTimingMiddleware:
+    """
+    Собирает тайминги стадий запроса в request-scoped контексте.
+
+    Общее время меряется у каждого запроса, поэтому в кольцевой буфер попадают все медленные,
+    а не только попавшие в выборку; у остальных там нет разбивки по стадиям.
+
+    - header_enabled: отдавать разбивку в заголовке Server-Timing
+    - sample_rate: доля запросов, для которых собирается разбивка по стадиям
+    - threshold_ms: запросы дольше порога попадают в кольцевой буфер
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        header_enabled: bool = SERVER_TIMING_ENABLED,
+        sample_rate: float = TIMING_SAMPLE_RATE,
+        threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS,
+        log: Optional[SlowRequestLog] = None,
+    ) -> None:
+        self.app = app
+        self.header_enabled = header_enabled
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.log = log if log is not None else slow_requests
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = RequestTimings(route=scope["path"], sampled=self._sampled())
+        status_code: Optional[int] = None
+
+        async def send_with_timing(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.header_enabled and timings.sampled:
+                    total_ms = (time.perf_counter() - start) * 1000.0
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.header_value(total_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_timings.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timings.reset(token)
+            total_ms = (time.perf_counter() - start) * 1000.0
+            if total_ms >= self.threshold_ms:
+                # после роутинга в scope лежит шаблон пути, а не конкретный URL
+                route = scope.get("route")
+                timings.route = getattr(route, "path", None) or scope["path"]
+                self.log.record(timings, total_ms, status_code)
+
+    def _sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
@@ -0,0 +1,42 @@
+import json
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson опционален, без него работаем на stdlib json
+    orjson = None
+
+
+def dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_prediction(is_violation: bool, probability: float) -> bytes:
+    """Тело ответа PredictResponse в финальном (wire) виде."""
+    return dumps_json({"is_violation": is_violation, "probability": probability})
+
+
+class JSONBytesResponse(Response):
+    """
+    Ответ из уже сериализованного JSON.
+
+    FastAPI не валидирует и не пересериализует Response против response_model,
+    поэтому горячие эндпоинты отдают байты напрямую.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps_json(content)
@@ -0,0 +1,400 @@
+"""
+Production-запуск API: pre-fork воркеры uvicorn с общей моделью.
+
+Родительский процесс один раз импортирует приложение и загружает модель, замораживает
+кучу (gc.freeze) и форкает воркеров: модель и импортированные модули остаются общими
+страницами copy-on-write. Пулы БД, Redis и Kafka создаются в каждом воркере после fork
+(в lifespan), их размер считается из общего бюджета соединений на все воркеры.
+
+Воркер перезапускается после max-requests запросов (с разбросом, чтобы не все разом)
+или когда его RSS вырос больше чем на max-rss-growth-mb от значения после старта.
+
+По SIGTERM воркер сначала только роняет /readyz и еще drain-delay секунд принимает запросы,
+чтобы балансировщик успел убрать его из ротации, и лишь потом закрывает сокет и дожидается
+принятых запросов (повторный сигнал — останавливаться сразу).
+
+SIGHUP родителю перезагружает модель: родитель читает model.pkl сам (ее получат воркеры,
+запущенные позже) и пересылает SIGHUP воркерам, каждый из них подменяет свою модель.
+
+    python -m app.server --workers 4 --port 8000 --db-connection-budget 80
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import importlib.util
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.logging_config import setup_sync_logging
+
+
+logger = logging.getLogger(__name__)
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+# общий бюджет соединений на все воркеры (0 — размеры пулов не трогаем)
+SERVER_DB_CONNECTION_BUDGET = int(os.getenv("SERVER_DB_CONNECTION_BUDGET", "0"))
+SERVER_REDIS_CONNECTION_BUDGET = int(os.getenv("SERVER_REDIS_CONNECTION_BUDGET", "0"))
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "0"))
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "0"))
+WORKER_MAX_RSS_GROWTH_MB = float(os.getenv("WORKER_MAX_RSS_GROWTH_MB", "0"))
+WORKER_MEMORY_CHECK_SECONDS = float(os.getenv("WORKER_MEMORY_CHECK_SECONDS", "5"))
+WORKER_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+SERVER_DRAIN_DELAY_SECONDS = float(os.getenv("SERVER_DRAIN_DELAY_SECONDS", "5"))
+
+
+def per_worker(budget: int, workers: int) -> int:
+    return max(1, budget // max(1, workers))
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """RSS процесса из /proc; None, если /proc недоступен."""
+    try:
+        with open(f"/proc/{pid}/statm", "r", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def event_loop_implementation() -> tuple[str, str]:
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return loop, http
+
+
+def load_app(app_path: str) -> Any:
+    module_name, _, attr = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "app")
+
+
+def apply_connection_budget(workers: int, db_budget: int, redis_budget: int) -> None:
+    """Выставляет размеры пулов до fork: воркеры наследуют значения модулей."""
+    import db
+    from app.clients import redis as redis_client
+
+    if db_budget > 0:
+        db.DB_POOL_MAX_SIZE = per_worker(db_budget, workers)
+        db.DB_POOL_MIN_SIZE = min(db.DB_POOL_MIN_SIZE, db.DB_POOL_MAX_SIZE)
+    if redis_budget > 0:
+        redis_client.REDIS_MAX_CONNECTIONS = per_worker(redis_budget, workers)
+    logger.info(
+        "Per-worker pools: db=%s..%s, redis=%s",
+        db.DB_POOL_MIN_SIZE,
+        db.DB_POOL_MAX_SIZE,
+        redis_client.REDIS_MAX_CONNECTIONS,
+    )
+
+
+def preload(app: Any) -> None:
+    """Модель в родителе: после fork воркеры читают те же страницы памяти."""
+    from model import get_model_version, get_or_train_model
+
+    if getattr(app.state, "model", None) is None:
+        app.state.model = get_or_train_model()
+        app.state.model_version = get_model_version()
+    # объекты, созданные до fork, уходят из-под сборщика: его проходы не трогают их страницы
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _draining_server_class():
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        def __init__(self, config: uvicorn.Config, drain_delay: float) -> None:
+            super().__init__(config)
+            self.drain_delay = drain_delay
+            self.drain_deadline: Optional[float] = None
+            self.reload_requested = False
+            self._reload_task: Optional[asyncio.Task] = None
+
+        def request_reload(self, sig: int, frame: Any) -> None:
+            # из обработчика сигнала только флаг: перезагрузку запускает on_tick в event loop
+            self.reload_requested = True
+
+        def handle_exit(self, sig: int, frame: Any) -> None:
+            if self.drain_delay <= 0 or self.drain_deadline is not None:
+                super().handle_exit(sig, frame)
+                return
+            monitor = getattr(self.config.app.state, "health_monitor", None)
+            if monitor is not None:
+                monitor.start_draining()
+            self.drain_deadline = time.monotonic() + self.drain_delay
+
+        async def on_tick(self, counter: int) -> bool:
+            if self.drain_deadline is not None and time.monotonic() >= self.drain_deadline:
+                self.should_exit = True
+            if self.reload_requested and (self._reload_task is None or self._reload_task.done()):
+                self.reload_requested = False
+                self._reload_task = asyncio.create_task(self._reload_model())
+            return await super().on_tick(counter)
+
+        async def _reload_model(self) -> None:
+            from services.model_reload import reload_model
+
+            try:
+                await reload_model(self.config.app)
+            except Exception:
+                logger.exception("Model reload failed")
+
+    return DrainingServer
+
+
+def _run_worker(app: Any, sock: socket.socket, max_requests: Optional[int], drain_delay: float) -> None:
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # POST /debug/reload_model шлет SIGHUP родителю, а тот — всем воркерам
+    app.state.arbiter_pid = os.getppid()
+    loop, http = event_loop_implementation()
+    config = uvicorn.Config(
+        app,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        limit_max_requests=max_requests,
+        # логирование настраивает lifespan приложения, access log на горячем пути не нужен
+        log_config=None,
+        access_log=False,
+    )
+    server = _draining_server_class()(config, drain_delay)
+    signal.signal(signal.SIGHUP, server.request_reload)
+    server.run(sockets=[sock])
+
+
+@dataclass
+class WorkerProcess:
+    pid: int
+    started_at: float = field(default_factory=time.monotonic)
+    baseline_rss: Optional[int] = None
+    stopping: bool = False
+
+
+class Arbiter:
+    def __init__(
+        self,
+        app: Any,
+        sock: socket.socket,
+        *,
+        workers: int,
+        max_requests: int = WORKER_MAX_REQUESTS,
+        max_requests_jitter: int = WORKER_MAX_REQUESTS_JITTER,
+        max_rss_growth_mb: float = WORKER_MAX_RSS_GROWTH_MB,
+        memory_check_seconds: float = WORKER_MEMORY_CHECK_SECONDS,
+        shutdown_timeout: float = WORKER_SHUTDOWN_TIMEOUT_SECONDS,
+        drain_delay: float = SERVER_DRAIN_DELAY_SECONDS,
+    ) -> None:
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss_growth = int(max_rss_growth_mb * 1024 * 1024)
+        self.memory_check_seconds = memory_check_seconds
+        self.shutdown_timeout = shutdown_timeout
+        self.drain_delay = drain_delay
+        self.children: dict[int, WorkerProcess] = {}
+        self._stopping = False
+        self._reload_requested = False
+        # воркер, упавший сразу после старта (например, БД недоступна), не перезапускаем в цикле без паузы
+        self._next_spawn_at = 0.0
+
+    def spawn(self) -> None:
+        max_requests = None
+        if self.max_requests > 0:
+            max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(self.app, self.sock, max_requests, self.drain_delay)
+            except BaseException:
+                logger.exception("Worker crashed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        self.children[pid] = WorkerProcess(pid=pid)
+        logger.info("Worker %s started (max_requests=%s)", pid, max_requests)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        for _ in range(self.workers):
+            self.spawn()
+
+        next_memory_check = time.monotonic() + self.memory_check_seconds
+        while not self._stopping:
+            self._reap()
+            if self._reload_requested:
+                self._reload_requested = False
+                self.reload_model()
+            while not self._stopping and len(self.children) < self.workers and time.monotonic() >= self._next_spawn_at:
+                self.spawn()
+            if self.max_rss_growth > 0 and time.monotonic() >= next_memory_check:
+                self._check_memory()
+                next_memory_check = time.monotonic() + self.memory_check_seconds
+            time.sleep(0.5)
+
+        self._shutdown()
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame) -> None:
+        self._reload_requested = True
+
+    def reload_model(self) -> None:
+        """Новая модель в родителе для будущих воркеров и SIGHUP работающим."""
+        from model import MODEL_PATH, load_model, model_file_version
+
+        try:
+            model = load_model(MODEL_PATH)
+        except Exception:
+            # воркеры прочитали бы тот же файл с той же ошибкой: остаются на старой модели
+            logger.exception("Model reload failed, workers keep the current model")
+            return
+        self.app.state.model = model
+        self.app.state.model_version = model_file_version(MODEL_PATH)
+        # как в preload: новые воркеры делят модель copy-on-write
+        gc.freeze()
+        logger.info(
+            "Model reloaded in arbiter: %s, signalling %s workers",
+            self.app.state.model_version,
+            len(self.children),
+        )
+        for child in self.children.values():
+            if child.stopping:
+                continue
+            try:
+                os.kill(child.pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None or child.stopping:
+                continue
+            exit_code = os.waitstatus_to_exitcode(status)
+            # код 0 — воркер сам вышел после limit_max_requests
+            logger.info("Worker %s exited with status %s", pid, exit_code)
+            if exit_code != 0 and time.monotonic() - child.started_at < 5:
+                self._next_spawn_at = time.monotonic() + 1.0
+
+    def _check_memory(self) -> None:
+        # _stop_child сразу запускает замену, поэтому обходим копию
+        for child in list(self.children.values()):
+            if child.stopping:
+                continue
+            rss = read_rss_bytes(child.pid)
+            if rss is None:
+                continue
+            # базовая линия — первый замер после старта, когда пулы и кэши уже созданы
+            if child.baseline_rss is None:
+                child.baseline_rss = rss
+                continue
+            if rss - child.baseline_rss > self.max_rss_growth:
+                logger.warning(
+                    "Worker %s RSS grew from %s MB to %s MB, recycling",
+                    child.pid,
+                    child.baseline_rss // (1024 * 1024),
+                    rss // (1024 * 1024),
+                )
+                self._stop_child(child)
+
+    def _stop_child(self, child: WorkerProcess) -> None:
+        child.stopping = True
+        try:
+            # SIGTERM — uvicorn дорабатывает текущие запросы и выполняет shutdown lifespan
+            os.kill(child.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        # замену запускаем сразу, не дожидаясь, пока старый воркер допишет ответы
+        self.spawn()
+
+    def _shutdown(self) -> None:
+        logger.info("Stopping %s workers", len(self.children))
+        for child in self.children.values():
+            try:
+                os.kill(child.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning("Worker %s did not stop in time, killing", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked uvicorn workers")
+    parser.add_argument("--app", default="main:app", help="ASGI app import path")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--db-connection-budget", type=int, default=SERVER_DB_CONNECTION_BUDGET)
+    parser.add_argument("--redis-connection-budget", type=int, default=SERVER_REDIS_CONNECTION_BUDGET)
+    parser.add_argument("--max-requests", type=int, default=WORKER_MAX_REQUESTS, help="0 = never recycle")
+    parser.add_argument("--max-requests-jitter", type=int, default=WORKER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=WORKER_MAX_RSS_GROWTH_MB, help="0 = no memory check")
+    parser.add_argument("--drain-delay", type=float, default=SERVER_DRAIN_DELAY_SECONDS, help="seconds to keep serving after SIGTERM")
+    args = parser.parse_args(argv)
+
+    setup_sync_logging()
+    app = load_app(args.app)
+    apply_connection_budget(args.workers, args.db_connection_budget, args.redis_connection_budget)
+    preload(app)
+    sock = bind_socket(args.host, args.port)
+
+    loop, http = event_loop_implementation()
+    logger.info("Serving %s on %s:%s with %s workers (%s, %s)", args.app, args.host, args.port, args.workers, loop, http)
+    Arbiter(
+        app,
+        sock,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        max_rss_growth_mb=args.max_rss_growth_mb,
+        drain_delay=args.drain_delay,
+    ).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
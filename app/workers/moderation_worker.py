@@ -1,45 +1,77 @@
 import asyncio
 import json
 import logging
-from typing import Any, Dict
+import os
+import signal
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
 
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener, TopicPartition
+from aiokafka.errors import CommitFailedError
 
 from db import close_db, get_connection, init_db
 from model import get_or_train_model
 from repositories.ads import AdRepository
 from repositories.moderation_results import ModerationResultRepository
+from repositories.negative_cache import NegativeCacheRepository
 from repositories.users import UserRepository
 from schemas.models import AdRequest
 from services.moderation import prepare_features
-from app.clients.kafka import KafkaModerationClient, MODERATION_TOPIC
+from app.clients.kafka import DEFAULT_BOOTSTRAP_SERVERS, KafkaModerationClient, MODERATION_TOPIC
+from app.clients.redis import RedisClient
+from app.logging_config import setup_logging, shutdown_logging
+from app.workers.telemetry import TelemetryPublisher, WorkerTelemetry
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "100"))
+WORKER_POLL_TIMEOUT_MS = int(os.getenv("WORKER_POLL_TIMEOUT_MS", "1000"))
+# сколько после SIGTERM дорабатывать уже полученную пачку
+WORKER_DRAIN_TIMEOUT_SECONDS = float(os.getenv("WORKER_DRAIN_TIMEOUT_SECONDS", "20"))
+# сколько последних завершенных task_id помнить, чтобы повторы отсекать без похода в БД
+WORKER_RECENT_TASKS_SIZE = int(os.getenv("WORKER_RECENT_TASKS_SIZE", "10000"))
 
-async def handle_message(message: Dict[str, Any], model) -> None:
+
+async def handle_message(message: Dict[str, Any], model, kafka_client: KafkaModerationClient) -> bool:
+    """
+    False — задача уже была завершена (повторная доставка): результат в БД не перезаписан,
+    в DLQ ничего не отправлено.
+    """
     item_id = int(message["item_id"])
     task_id = int(message["task_id"])
+    # ключ секции задачи; в сообщениях из старых строк outbox его нет
+    task_created_at = _parse_timestamp(message.get("task_created_at"))
 
-    await init_db()
+    negative_cache = NegativeCacheRepository(RedisClient.get_binary_client())
 
     async with get_connection() as conn:
         ad_repo = AdRepository(conn)
         user_repo = UserRepository(conn)
         mod_repo = ModerationResultRepository(conn)
 
-        kafka_client = KafkaModerationClient()
-        await kafka_client.start()
+        # LRU видит только задачи этого воркера: повтор, пришедший после ребаланса,
+        # отсекается здесь, до загрузки объявления и модели
+        status = await mod_repo.get_status(task_id, task_created_at)
+        if status != "pending":
+            logger.info("Moderation task %s is not pending (%s), skipped", task_id, status)
+            return False
 
         try:
+            missing_reason = await negative_cache.get_reason(item_id)
+            if missing_reason == NegativeCacheRepository.AD_NOT_FOUND:
+                raise ValueError(f"Ad with id={item_id} not found")
+
             ad = await ad_repo.get(item_id)
             if ad is None:
+                await negative_cache.mark_missing(item_id, NegativeCacheRepository.AD_NOT_FOUND)
                 raise ValueError(f"Ad with id={item_id} not found")
 
             user = await user_repo.get(ad.seller_id)
             if user is None:
+                await negative_cache.mark_missing(item_id, NegativeCacheRepository.SELLER_NOT_FOUND)
                 raise ValueError(f"User with id={ad.seller_id} not found")
 
             ad_request = AdRequest(
@@ -56,13 +88,17 @@ async def handle_message(message: Dict[str, Any], model) -> None:
             probability = float(model.predict_proba(features)[0][1])
             is_violation = probability > 0.5
 
-            await mod_repo.update_result(
+            applied = await mod_repo.complete_if_pending(
                 task_id,
+                created_at=task_created_at,
                 status="completed",
                 is_violation=is_violation,
                 probability=probability,
                 error_message=None,
             )
+            if not applied:
+                logger.info("Moderation task %s is already finished, result kept", task_id)
+                return False
 
             logger.info(
                 "Moderation completed: task_id=%s, item_id=%s, is_violation=%s, probability=%s",
@@ -71,55 +107,217 @@ async def handle_message(message: Dict[str, Any], model) -> None:
                 is_violation,
                 probability,
             )
+            return True
         except Exception as exc:
             error_msg = str(exc)
             logger.exception("Error while processing moderation task %s: %s", task_id, error_msg)
 
-            await mod_repo.update_result(
+            applied = await mod_repo.complete_if_pending(
                 task_id,
+                created_at=task_created_at,
                 status="failed",
                 is_violation=None,
                 probability=None,
                 error_message=error_msg,
             )
+            # повторная доставка уже завершенной задачи не должна плодить сообщения в DLQ
+            if applied:
+                await kafka_client.send_to_dlq(message, error_msg, retry_count=0)
+            return applied
+
+
+class RecentTasks:
+    """
+    LRU завершенных этим воркером task_id. Отсекает повторы, которые приходят этому же воркеру:
+    дубли от relay (at-least-once) и сообщения после неудачного коммита offset'ов.
+    После ребаланса повтор обычно достается другому воркеру — там его отсекает проверка статуса в БД.
+    """
+
+    def __init__(self, max_size: int = WORKER_RECENT_TASKS_SIZE) -> None:
+        self._max_size = max_size
+        self._tasks: OrderedDict[int, None] = OrderedDict()
+
+    def __contains__(self, task_id: int) -> bool:
+        if task_id not in self._tasks:
+            return False
+        self._tasks.move_to_end(task_id)
+        return True
+
+    def add(self, task_id: int) -> None:
+        self._tasks[task_id] = None
+        self._tasks.move_to_end(task_id)
+        if len(self._tasks) > self._max_size:
+            self._tasks.popitem(last=False)
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _CommitOnRevoke(ConsumerRebalanceListener):
+    """Перед тем как партиции уйдут другому воркеру, фиксируем все, что по ним уже обработано."""
+
+    def __init__(self, worker: "ModerationWorker") -> None:
+        self._worker = worker
+
+    async def on_partitions_revoked(self, revoked) -> None:
+        await self._worker.commit(partitions=set(revoked))
+
+    async def on_partitions_assigned(self, assigned) -> None:
+        return None
+
+
+class ModerationWorker:
+    """
+    Читает задачи пачками и коммитит offset'ы вручную, только после обработки.
 
-            await kafka_client.send_to_dlq(message, error_msg, retry_count=0)
-        finally:
-            await kafka_client.stop()
+    По stop_event новые пачки не запрашиваются, текущая дорабатывается до drain_timeout.
+    Что не успело — не коммитится и после выхода из группы достается другому воркеру
+    с того же места: без потерь и без повторной обработки уже сделанного.
+    """
 
+    def __init__(
+        self,
+        consumer: AIOKafkaConsumer,
+        kafka_client: KafkaModerationClient,
+        model,
+        *,
+        batch_size: int = WORKER_BATCH_SIZE,
+        poll_timeout_ms: int = WORKER_POLL_TIMEOUT_MS,
+        drain_timeout: float = WORKER_DRAIN_TIMEOUT_SECONDS,
+        telemetry: Optional[WorkerTelemetry] = None,
+        recent_tasks: Optional[RecentTasks] = None,
+    ) -> None:
+        self._consumer = consumer
+        self._kafka_client = kafka_client
+        self._model = model
+        self._batch_size = batch_size
+        self._poll_timeout_ms = poll_timeout_ms
+        self._drain_timeout = drain_timeout
+        # следующий offset к коммиту по партиции: обработано, но еще не зафиксировано
+        self._pending: dict[TopicPartition, int] = {}
+        self._drain_deadline: Optional[float] = None
+        self.telemetry = telemetry or WorkerTelemetry()
+        self.recent_tasks = recent_tasks if recent_tasks is not None else RecentTasks()
 
-async def main() -> None:
+        self.processed = 0
+        self.handed_back = 0
+
+    @property
+    def rebalance_listener(self) -> ConsumerRebalanceListener:
+        return _CommitOnRevoke(self)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            batches = await self._consumer.getmany(timeout_ms=self._poll_timeout_ms, max_records=self._batch_size)
+            received = sum(len(messages) for messages in batches.values())
+            processed_before = self.processed
+            for tp, messages in batches.items():
+                if not await self._process_partition(tp, messages, stop_event):
+                    break
+            self.handed_back += received - (self.processed - processed_before)
+            await self.commit()
+
+    async def _process_partition(self, tp: TopicPartition, messages, stop_event: asyncio.Event) -> bool:
+        """False — дедлайн остановки истек, остаток пачки отдается обратно."""
+        for msg in messages:
+            remaining = self._remaining(stop_event)
+            if remaining is not None and remaining <= 0:
+                return False
+            started = time.perf_counter()
+            try:
+                enqueued_at = await asyncio.wait_for(self._handle(msg), timeout=remaining)
+            except asyncio.TimeoutError:
+                logger.warning("Drain deadline hit while processing offset %s of %s, handing it back", msg.offset, tp)
+                return False
+            self._pending[tp] = msg.offset + 1
+            self.processed += 1
+            self.telemetry.record(tp, msg.offset, enqueued_at, time.perf_counter() - started)
+        return True
+
+    def _remaining(self, stop_event: asyncio.Event) -> Optional[float]:
+        if not stop_event.is_set():
+            return None
+        if self._drain_deadline is None:
+            self._drain_deadline = time.monotonic() + self._drain_timeout
+        return self._drain_deadline - time.monotonic()
+
+    async def _handle(self, msg) -> Optional[datetime]:
+        """Время создания задачи из сообщения — для сквозной задержки."""
+        try:
+            payload = json.loads(msg.value.decode("utf-8"))
+            task_id = int(payload["task_id"])
+            int(payload["item_id"])
+        except (UnicodeDecodeError, KeyError, TypeError, ValueError):
+            # битое сообщение не повторяем и воркер из-за него не падает: offset двигается дальше
+            logger.exception("Invalid moderation message, skipping: %s", msg.value)
+            return None
+        logger.info("Received message from Kafka: %s", payload)
+        enqueued_at = _parse_timestamp(payload.get("timestamp"))
+        if task_id in self.recent_tasks:
+            # дешевая проверка; окончательная — условный UPDATE в handle_message
+            self.telemetry.record_duplicate("recent_tasks")
+            return enqueued_at
+        if not await handle_message(payload, self._model, self._kafka_client):
+            self.telemetry.record_duplicate("db")
+        self.recent_tasks.add(task_id)
+        return enqueued_at
+
+    async def commit(self, partitions: Optional[set[TopicPartition]] = None) -> None:
+        offsets = {tp: offset for tp, offset in self._pending.items() if partitions is None or tp in partitions}
+        if not offsets:
+            return
+        try:
+            await self._consumer.commit(offsets)
+        except CommitFailedError:
+            # партиции уже у другого воркера: он начнет с последнего зафиксированного offset'а
+            logger.warning("Offset commit failed after rebalance: %s", offsets, exc_info=True)
+        for tp in offsets:
+            self._pending.pop(tp, None)
+
+
+async def main(stop_event: Optional[asyncio.Event] = None) -> None:
+    setup_logging()
     logger.info("Starting moderation worker...")
 
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
     # один раз при старте воркера
     model = get_or_train_model()
 
     consumer = AIOKafkaConsumer(
-        MODERATION_TOPIC,
-        bootstrap_servers="localhost:9092",
+        bootstrap_servers=DEFAULT_BOOTSTRAP_SERVERS,
         group_id="moderation-workers",
-        enable_auto_commit=True,
+        enable_auto_commit=False,
     )
+    # один producer на воркер для DLQ вместо нового на каждое сообщение
+    kafka_client = KafkaModerationClient()
 
     await init_db()
+    await kafka_client.start()
+    worker = ModerationWorker(consumer, kafka_client, model)
+    consumer.subscribe([MODERATION_TOPIC], listener=worker.rebalance_listener)
     await consumer.start()
+    telemetry_task = asyncio.create_task(TelemetryPublisher(consumer, worker.telemetry).run(stop_event))
     try:
-        async for msg in consumer:
-            try:
-                payload = json.loads(msg.value.decode("utf-8"))
-                logger.info("Received message from Kafka: %s", payload)
-                await handle_message(payload, model)
-            except json.JSONDecodeError:
-                logger.exception("Failed to decode Kafka message: %s", msg.value)
+        await worker.run(stop_event)
+        await telemetry_task
+        logger.info("Moderation worker drained: processed=%s, handed_back=%s", worker.processed, worker.handed_back)
     finally:
+        # порядок важен: сначала выходим из группы (партиции сразу уходят другим воркерам),
+        # затем дописываем DLQ, и только потом закрываем Redis и пул БД
         await consumer.stop()
+        await kafka_client.stop()
+        await RedisClient.close()
         await close_db()
+        shutdown_logging()
 
 
 if __name__ == "__main__":
     asyncio.run(main())
-
-
-
-
-
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Optional
+
+from app.clients.kafka import KafkaModerationClient
+from app.logging_config import setup_logging, shutdown_logging
+from db import close_db, get_connection, init_db
+from repositories.moderation_outbox import ModerationOutboxRepository
+
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "0.2"))
+# отправленные строки храним сутки для разборов, потом чистим
+OUTBOX_RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS", "86400"))
+OUTBOX_PURGE_EVERY_SECONDS = float(os.getenv("OUTBOX_PURGE_EVERY_SECONDS", "300"))
+
+
+class OutboxRelay:
+    """
+    Переносит задачи модерации из moderation_outbox в Kafka.
+
+    Пачка блокируется через FOR UPDATE SKIP LOCKED, отправляется одним батчем
+    и помечается отправленной в той же транзакции. Если продюсер упал,
+    транзакция откатывается и пачка уйдет на следующей итерации (at-least-once).
+    """
+
+    def __init__(
+        self,
+        kafka_client: KafkaModerationClient,
+        *,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL_SECONDS,
+    ) -> None:
+        self._kafka_client = kafka_client
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._last_purge = 0.0
+
+    async def relay_once(self) -> int:
+        async with get_connection() as conn:
+            repo = ModerationOutboxRepository(conn)
+            async with conn.transaction():
+                messages = await repo.fetch_unsent(self._batch_size)
+                if not messages:
+                    return 0
+
+                await self._kafka_client.send_moderation_requests(
+                    (message.item_id, message.task_id, message.task_created_at, message.created_at)
+                    for message in messages
+                )
+                await repo.mark_sent([message.id for message in messages])
+
+        logger.debug("Relayed %s moderation tasks", len(messages))
+        return len(messages)
+
+    async def purge_if_due(self) -> None:
+        now = asyncio.get_running_loop().time()
+        if now - self._last_purge < OUTBOX_PURGE_EVERY_SECONDS:
+            return
+        self._last_purge = now
+
+        async with get_connection() as conn:
+            purged = await ModerationOutboxRepository(conn).purge_sent(OUTBOX_RETENTION_SECONDS)
+        if purged:
+            logger.info("Purged %s sent outbox rows", purged)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                sent = await self.relay_once()
+                await self.purge_if_due()
+            except Exception:
+                logger.exception("Outbox relay iteration failed")
+                sent = 0
+
+            # полная пачка — в outbox, скорее всего, есть еще, не ждем
+            if sent < self._batch_size:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        # задачи, созданные последними запросами перед остановкой, не ждут следующего запуска
+        try:
+            await self.relay_once()
+        except Exception:
+            logger.exception("Final outbox relay failed")
+
+
+async def main(stop_event: Optional[asyncio.Event] = None) -> None:
+    setup_logging()
+    logger.info("Starting outbox relay...")
+
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await init_db()
+    kafka_client = KafkaModerationClient()
+    await kafka_client.start()
+    try:
+        await OutboxRelay(kafka_client).run(stop_event)
+    finally:
+        await kafka_client.stop()
+        await close_db()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
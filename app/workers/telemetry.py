@@ -0,0 +1,154 @@
+"""
+Метрики воркера модерации для автоскейлинга.
+
+Воркер считает по скользящему окну скорость обработки, время обработки одного сообщения
+и сквозную задержку задачи (от timestamp в сообщении — времени создания задачи — до конца
+обработки), а lag по партициям — как highwater минус следующий необработанный offset.
+Раз в WORKER_TELEMETRY_INTERVAL_SECONDS снимок уходит в Redis, откуда его собирает
+GET /debug/moderation_workers.
+"""
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from aiokafka import TopicPartition
+from redis.exceptions import RedisError
+
+from app.clients.redis import RedisClient
+from repositories.worker_telemetry import WorkerTelemetryRepository
+
+
+logger = logging.getLogger(__name__)
+
+WORKER_TELEMETRY_INTERVAL_SECONDS = float(os.getenv("WORKER_TELEMETRY_INTERVAL_SECONDS", "5"))
+WORKER_TELEMETRY_WINDOW_SECONDS = float(os.getenv("WORKER_TELEMETRY_WINDOW_SECONDS", "60"))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class WorkerTelemetry:
+    def __init__(
+        self,
+        *,
+        window_seconds: float = WORKER_TELEMETRY_WINDOW_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._window = window_seconds
+        self._clock = clock
+        self._started_at = clock()
+        # (время окончания, сквозная задержка или None, время обработки)
+        self._events: deque[tuple[float, Optional[float], float]] = deque()
+        self.next_offsets: dict[TopicPartition, int] = {}
+        self.processed_total = 0
+        # повторные доставки уже завершенных задач, по месту, где их отсекли
+        self.duplicates_skipped: dict[str, int] = {"recent_tasks": 0, "db": 0}
+
+    def record(self, tp: TopicPartition, offset: int, enqueued_at: Optional[datetime], service_time: float) -> None:
+        now = self._clock()
+        latency = None
+        if enqueued_at is not None:
+            if enqueued_at.tzinfo is None:
+                enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+            latency = max(0.0, now - enqueued_at.timestamp())
+        self._events.append((now, latency, service_time))
+        self.next_offsets[tp] = offset + 1
+        self.processed_total += 1
+        self._trim(now)
+
+    def record_duplicate(self, source: str) -> None:
+        self.duplicates_skipped[source] = self.duplicates_skipped.get(source, 0) + 1
+
+    def _trim(self, now: float) -> None:
+        while self._events and now - self._events[0][0] > self._window:
+            self._events.popleft()
+
+    def snapshot(self, lag: dict[TopicPartition, Optional[int]]) -> dict[str, Any]:
+        now = self._clock()
+        self._trim(now)
+        # первую минуту после старта делим на фактически прошедшее время, иначе скорость занижена
+        elapsed = max(1e-9, min(self._window, now - self._started_at))
+        latencies = sorted(latency for _, latency, _ in self._events if latency is not None)
+        service_times = [service_time for _, _, service_time in self._events]
+        mean_service = statistics.fmean(service_times) if service_times else None
+        return {
+            "processed_total": self.processed_total,
+            "duplicates_skipped": dict(self.duplicates_skipped),
+            "processing_rps": round(len(self._events) / elapsed, 3),
+            "service_time_ms": round(mean_service * 1000, 3) if mean_service is not None else None,
+            # один воркер обрабатывает сообщения по одному: его потолок — 1 / время обработки
+            "capacity_rps": round(1 / mean_service, 3) if mean_service else None,
+            "e2e_latency_ms": {
+                "p50": round(_percentile(latencies, 0.5) * 1000, 1),
+                "p95": round(_percentile(latencies, 0.95) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1),
+            }
+            if latencies
+            else None,
+            "lag": {f"{tp.topic}:{tp.partition}": value for tp, value in sorted(lag.items())},
+            "total_lag": sum(value for value in lag.values() if value is not None),
+        }
+
+
+async def partition_lag(consumer, telemetry: WorkerTelemetry) -> dict[TopicPartition, Optional[int]]:
+    """highwater — из последнего fetch; None — по партиции еще ничего не пришло."""
+    lag = {}
+    for tp in consumer.assignment():
+        highwater = consumer.highwater(tp)
+        next_offset = telemetry.next_offsets.get(tp)
+        if next_offset is None:
+            next_offset = await consumer.committed(tp)
+        lag[tp] = max(0, highwater - next_offset) if highwater is not None and next_offset is not None else None
+    return lag
+
+
+class TelemetryPublisher:
+    def __init__(
+        self,
+        consumer,
+        telemetry: WorkerTelemetry,
+        *,
+        worker_id: Optional[str] = None,
+        repository_factory: Optional[Callable[[], WorkerTelemetryRepository]] = None,
+        interval: float = WORKER_TELEMETRY_INTERVAL_SECONDS,
+    ) -> None:
+        self._consumer = consumer
+        self._telemetry = telemetry
+        self.worker_id = worker_id or default_worker_id()
+        self._repository_factory = repository_factory or (
+            lambda: WorkerTelemetryRepository(RedisClient.get_binary_client())
+        )
+        self._interval = interval
+
+    async def publish_once(self) -> None:
+        snapshot = self._telemetry.snapshot(await partition_lag(self._consumer, self._telemetry))
+        await self._repository_factory().publish(self.worker_id, snapshot)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                await self.publish_once()
+            except Exception:
+                # метрики не должны мешать обработке: пропускаем цикл
+                logger.warning("Worker telemetry publish failed", exc_info=True)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+
+        # остановленный воркер не должен учитываться в рекомендации
+        try:
+            await self._repository_factory().remove(self.worker_id)
+        except RedisError:
+            logger.warning("Worker telemetry cleanup failed", exc_info=True)
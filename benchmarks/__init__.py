@@ -0,0 +1,3 @@
+"""
+Бенчмарки сервиса: нагрузочный прогон и заглушки внешних зависимостей.
+"""
@@ -0,0 +1,408 @@
+"""
+Генератор синтетических данных и загрузка через COPY.
+
+Строки генерируются детерминированно по (seed, таблица, начало чанка), поэтому
+чанки можно генерировать параллельно в процессах и получать одинаковые данные
+при одинаковых параметрах. Генераторы строк переиспользуются заглушками бенчмарков.
+
+    python -m benchmarks.datagen --users 100000 --ads 2000000 --accounts 10000 --moderation-results 5000000
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Optional
+
+import asyncpg
+
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+VERIFIED_SELLER_RATIO = 0.3
+CLOSED_AD_RATIO = 0.05
+BLOCKED_ACCOUNT_RATIO = 0.01
+NUM_CATEGORIES = 100
+
+# длина описания ~ логнормальная: медиана ~200 символов, длинный хвост
+DESCRIPTION_MEDIAN = 200
+DESCRIPTION_SIGMA = 0.9
+DESCRIPTION_MIN_LEN = 10
+DESCRIPTION_MAX_LEN = 4000
+
+# количество картинок: чаще всего 1-5, без картинок и больше 5 — реже
+IMAGES_QTY_WEIGHTS = (0.08, 0.15, 0.17, 0.16, 0.13, 0.1, 0.07, 0.05, 0.04, 0.03, 0.02)
+
+STATUS_WEIGHTS = {"completed": 0.9, "failed": 0.07}
+# у объявления не больше одной задачи в работе: pending — каждая PENDING_EVERY-я задача,
+# и объявление для нее выбирается по номеру такой задачи, без повторов
+PENDING_EVERY = 33
+
+WORDS = (
+    "продам отдам куплю новый б/у отличное состояние срочно торг доставка самовывоз "
+    "диван стол шкаф велосипед телефон ноутбук куртка коляска кресло холодильник "
+    "гарантия оригинал недорого подарок коробка документы чек комплект запчасти "
+    "garage sale vintage iphone samsung bike sofa table lamp camera"
+).split()
+
+TABLE_COLUMNS = {
+    "users": ("id", "is_verified_seller"),
+    "ads": ("id", "seller_id", "title", "description", "category", "images_qty", "is_closed"),
+    "account": ("id", "login", "password", "is_blocked"),
+    "moderation_results": (
+        "id",
+        "item_id",
+        "status",
+        "is_violation",
+        "probability",
+        "error_message",
+        "created_at",
+        "processed_at",
+    ),
+}
+# порядок загрузки учитывает внешние ключи
+LOAD_ORDER = ("users", "ads", "account", "moderation_results")
+
+
+def _zipf_cum_weights(n: int, exponent: float = 1.1) -> list[float]:
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+_CATEGORY_CUM_WEIGHTS = _zipf_cum_weights(NUM_CATEGORIES)
+_IMAGES_CUM_WEIGHTS = list(itertools.accumulate(IMAGES_QTY_WEIGHTS))
+_STATUS_NAMES = tuple(STATUS_WEIGHTS)
+_STATUS_CUM_WEIGHTS = list(itertools.accumulate(STATUS_WEIGHTS.values()))
+
+
+def _weighted_index(rng: random.Random, cum_weights: list[float]) -> int:
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+def _text_corpus(length: int = 1 << 16) -> str:
+    rng = random.Random(0)
+    words = []
+    size = 0
+    while size < length + DESCRIPTION_MAX_LEN:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+_CORPUS = _text_corpus()
+
+
+def chunk_rng(seed: int, table: str, start_id: int) -> random.Random:
+    return random.Random(f"{seed}:{table}:{start_id}")
+
+
+def _pending_item_id(task_id: int, ids: range) -> Optional[int]:
+    """Объявление pending-задачи; None — задача не pending или объявления без задачи в работе кончились."""
+    ordinal, rest = divmod(task_id, PENDING_EVERY)
+    if rest or ordinal >= len(ids):
+        return None
+    # умножение на простое перемешивает объявления и остается биекцией по модулю len(ids)
+    return ids[(ordinal * 2654435761) % len(ids)]
+
+
+def _skewed_id(rng: random.Random, ids: range) -> int:
+    # половина ссылок — по log-uniform рангу (длинный хвост «популярности»), половина — равномерно;
+    # ранги перемешаны по id, чтобы активные продавцы/объявления не шли сплошь в начале таблицы
+    n = len(ids)
+    if rng.random() < 0.5:
+        return ids[rng.randrange(n)]
+    rank = min(int(n ** rng.random()) - 1, n - 1)
+    return ids[(rank * 2654435761) % n]
+
+
+def user_rows(start_id: int, count: int, rng: random.Random) -> Iterator[tuple]:
+    for user_id in range(start_id, start_id + count):
+        yield (user_id, rng.random() < VERIFIED_SELLER_RATIO)
+
+
+def ad_rows(
+    start_id: int,
+    count: int,
+    rng: random.Random,
+    seller_ids: range,
+    closed_ratio: float = CLOSED_AD_RATIO,
+) -> Iterator[tuple]:
+    corpus_len = len(_CORPUS) - DESCRIPTION_MAX_LEN
+    for ad_id in range(start_id, start_id + count):
+        length = int(rng.lognormvariate(0, DESCRIPTION_SIGMA) * DESCRIPTION_MEDIAN)
+        length = max(DESCRIPTION_MIN_LEN, min(length, DESCRIPTION_MAX_LEN))
+        offset = rng.randrange(corpus_len)
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+        yield (
+            ad_id,
+            _skewed_id(rng, seller_ids),
+            title,
+            _CORPUS[offset:offset + length],
+            _weighted_index(rng, _CATEGORY_CUM_WEIGHTS),
+            _weighted_index(rng, _IMAGES_CUM_WEIGHTS),
+            rng.random() < closed_ratio,
+        )
+
+
+def account_rows(start_id: int, count: int, rng: random.Random) -> Iterator[tuple]:
+    # логин/пароль выводятся из id, чтобы бенчмарки могли логиниться
+    for account_id in range(start_id, start_id + count):
+        yield (account_id, f"user{account_id}", f"password{account_id}", rng.random() < BLOCKED_ACCOUNT_RATIO)
+
+
+def moderation_result_rows(
+    start_id: int,
+    count: int,
+    rng: random.Random,
+    item_ids: range,
+    now: datetime,
+    history_days: int,
+) -> Iterator[tuple]:
+    history_seconds = history_days * 86400
+    for task_id in range(start_id, start_id + count):
+        created_at = now - timedelta(seconds=rng.randrange(history_seconds))
+        status = _STATUS_NAMES[_weighted_index(rng, _STATUS_CUM_WEIGHTS)]
+        item_id = _skewed_id(rng, item_ids)
+        pending_item_id = _pending_item_id(task_id, item_ids)
+        if pending_item_id is not None:
+            status, item_id = "pending", pending_item_id
+        is_violation = probability = error_message = processed_at = None
+        if status == "completed":
+            probability = rng.betavariate(0.5, 4)
+            is_violation = probability >= 0.5
+            processed_at = created_at + timedelta(seconds=rng.expovariate(1 / 2.0))
+        elif status == "failed":
+            error_message = "Ad not found"
+            processed_at = created_at + timedelta(seconds=rng.expovariate(1 / 2.0))
+        yield (
+            task_id,
+            item_id,
+            status,
+            is_violation,
+            probability,
+            error_message,
+            created_at,
+            processed_at,
+        )
+
+
+@dataclass(frozen=True)
+class ChunkTask:
+    table: str
+    start_id: int
+    count: int
+    seed: int
+    params: dict[str, Any]
+
+
+def generate_chunk(task: ChunkTask) -> list[tuple]:
+    rng = chunk_rng(task.seed, task.table, task.start_id)
+    if task.table == "users":
+        rows = user_rows(task.start_id, task.count, rng)
+    elif task.table == "ads":
+        rows = ad_rows(task.start_id, task.count, rng, **task.params)
+    elif task.table == "account":
+        rows = account_rows(task.start_id, task.count, rng)
+    elif task.table == "moderation_results":
+        rows = moderation_result_rows(task.start_id, task.count, rng, **task.params)
+    else:
+        raise ValueError(f"Unknown table: {task.table}")
+    return list(rows)
+
+
+def plan_chunks(
+    table: str,
+    start_id: int,
+    count: int,
+    chunk_size: int,
+    seed: int,
+    params: Optional[dict[str, Any]] = None,
+) -> list[ChunkTask]:
+    return [
+        ChunkTask(
+            table=table,
+            start_id=chunk_start,
+            count=min(chunk_size, start_id + count - chunk_start),
+            seed=seed,
+            params=params or {},
+        )
+        for chunk_start in range(start_id, start_id + count, chunk_size)
+    ]
+
+
+async def _id_range(conn: asyncpg.Connection, table: str) -> range:
+    row = await conn.fetchrow(f"SELECT MIN(id) AS lo, MAX(id) AS hi, COUNT(*) AS n FROM {table}")
+    if row["n"] == 0:
+        return range(0)
+    if row["hi"] - row["lo"] + 1 != row["n"]:
+        raise RuntimeError(f"{table} ids are not contiguous, generate new rows for it or use --truncate")
+    return range(row["lo"], row["hi"] + 1)
+
+
+async def _next_id(conn: asyncpg.Connection, table: str) -> int:
+    return await conn.fetchval(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+
+
+async def fix_sequences(conn: asyncpg.Connection, tables: tuple[str, ...] = LOAD_ORDER) -> None:
+    for table in tables:
+        await conn.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+        )
+
+
+async def truncate(conn: asyncpg.Connection) -> None:
+    async with conn.transaction():
+        await conn.execute(
+            "TRUNCATE moderation_outbox, moderation_idempotency_keys, moderation_results, ads, users, account "
+            "RESTART IDENTITY CASCADE"
+        )
+        # TRUNCATE не вызывает построчные триггеры: счетчик pending-задач (V009) обнуляем сами,
+        # строки шардов остаются — их обновляет триггер
+        await conn.execute("UPDATE moderation_pending_counters SET pending = 0")
+
+
+async def _copy_chunk(pool: asyncpg.Pool, loop, executor, task: ChunkTask) -> int:
+    rows = await loop.run_in_executor(executor, generate_chunk, task)
+    async with pool.acquire() as conn:
+        await conn.copy_records_to_table(task.table, records=rows, columns=TABLE_COLUMNS[task.table])
+    return len(rows)
+
+
+async def load_table(
+    pool: asyncpg.Pool,
+    executor: ProcessPoolExecutor,
+    chunks: list[ChunkTask],
+    concurrency: int,
+) -> int:
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(task: ChunkTask) -> int:
+        async with semaphore:
+            return await _copy_chunk(pool, loop, executor, task)
+
+    return sum(await asyncio.gather(*(run(task) for task in chunks)))
+
+
+async def populate(
+    pool: asyncpg.Pool,
+    *,
+    users: int = 0,
+    ads: int = 0,
+    accounts: int = 0,
+    moderation_results: int = 0,
+    seed: int = 42,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    concurrency: int = 4,
+    processes: Optional[int] = None,
+    history_days: int = 90,
+    reset: bool = False,
+) -> dict[str, Any]:
+    """Догружает строки поверх существующих данных (или после TRUNCATE при reset) и возвращает отчет."""
+    from app.jobs.moderation_partitions import PARTITIONS_AHEAD_MONTHS, ensure_partitions
+
+    counts = {"users": users, "ads": ads, "account": accounts, "moderation_results": moderation_results}
+    now = datetime.now().replace(microsecond=0)
+    report: dict[str, Any] = {"tables": {}}
+    started = time.perf_counter()
+
+    async with pool.acquire() as conn:
+        if reset:
+            await truncate(conn)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for table in LOAD_ORDER:
+            count = counts[table]
+            if count <= 0:
+                continue
+
+            async with pool.acquire() as conn:
+                start_id = await _next_id(conn, table)
+                params: dict[str, Any] = {}
+                if table == "ads":
+                    params["seller_ids"] = await _id_range(conn, "users")
+                elif table == "moderation_results":
+                    params.update(item_ids=await _id_range(conn, "ads"), now=now, history_days=history_days)
+                    # секции под всю историю, иначе строки осядут в default-секции
+                    history_start = (now - timedelta(days=history_days)).date().replace(day=1)
+                    await ensure_partitions(conn, PARTITIONS_AHEAD_MONTHS, history_start)
+            parent = params.get("seller_ids", params.get("item_ids"))
+            if parent is not None and len(parent) == 0:
+                raise RuntimeError(f"Nothing to reference from {table}, generate parent rows first")
+
+            table_started = time.perf_counter()
+            chunks = plan_chunks(table, start_id, count, chunk_size, seed, params)
+            loaded = await load_table(pool, executor, chunks, concurrency)
+            elapsed = time.perf_counter() - table_started
+            report["tables"][table] = {
+                "rows": loaded,
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(loaded / elapsed) if elapsed else None,
+            }
+
+    async with pool.acquire() as conn:
+        await fix_sequences(conn)
+        await conn.execute("ANALYZE")
+
+    elapsed = time.perf_counter() - started
+    total = sum(t["rows"] for t in report["tables"].values())
+    report.update(rows=total, seconds=round(elapsed, 3), rows_per_sec=round(total / elapsed) if elapsed else None)
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate synthetic data and bulk-load it with COPY")
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--ads", type=int, default=0)
+    parser.add_argument("--accounts", type=int, default=0)
+    parser.add_argument("--moderation-results", type=int, default=0)
+    parser.add_argument("--history-days", type=int, default=90, help="spread of moderation_results.created_at")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel COPY connections")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="row generator processes")
+    parser.add_argument("--truncate", action="store_true", help="wipe tables before loading")
+    parser.add_argument("--output", help="write JSON report to this file")
+    return parser
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    from db import _load_pg_config
+
+    pool = await asyncpg.create_pool(**_load_pg_config(), min_size=1, max_size=args.concurrency + 1)
+    try:
+        return await populate(
+            pool,
+            users=args.users,
+            ads=args.ads,
+            accounts=args.accounts,
+            moderation_results=args.moderation_results,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+            processes=args.processes,
+            history_days=args.history_days,
+            reset=args.truncate,
+        )
+    finally:
+        await pool.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    report = json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,306 @@
+"""
+Нагрузочный прогон API в одном процессе.
+
+По умолчанию Postgres, Redis и Kafka подменяются in-memory заглушками
+(см. benchmarks/stubs.py), с флагом --real используются настоящие сервисы
+из docker-compose. Результат (RPS и p50/p95/p99) печатается в JSON,
+чтобы прогоны можно было сравнивать между коммитами:
+
+    python -m benchmarks.load --duration 10 --concurrency 64 \
+        --mix simple_predict=6,predict=2,async_predict=1,moderation_result=1 \
+        --output bench_output.txt
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+import warnings
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+
+from benchmarks.stubs import InMemoryStore, install_stubs
+
+
+DEFAULT_MIX = "simple_predict=6,predict=2,async_predict=1,moderation_result=1"
+BENCH_LOGIN = "bench"
+BENCH_PASSWORD = "bench"
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    status_codes: Counter = field(default_factory=Counter)
+    errors: int = 0
+    # успешные ответы, уложившиеся в --slo-ms
+    good: int = 0
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "count": len(latencies),
+            "errors": self.errors,
+            "status_codes": {str(code): n for code, n in sorted(self.status_codes.items())},
+            "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "goodput_rps": round(self.good / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": _latency_summary(latencies),
+        }
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _latency_summary(sorted_values: list[float]) -> dict[str, float]:
+    if not sorted_values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    return {
+        "p50": round(_percentile(sorted_values, 0.50), 3),
+        "p95": round(_percentile(sorted_values, 0.95), 3),
+        "p99": round(_percentile(sorted_values, 0.99), 3),
+        "mean": round(sum(sorted_values) / len(sorted_values), 3),
+        "max": round(sorted_values[-1], 3),
+    }
+
+
+def parse_mix(raw: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.task_ids: list[int] = []
+        self.stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    def random_item_id(self) -> int:
+        # --hot-items: весь трафик идет в небольшой набор объявлений (много дублей)
+        upper = self.args.hot_items or self.args.num_ads
+        return self.rng.randint(1, min(upper, self.args.num_ads))
+
+    def build_request(self, endpoint: str) -> tuple[str, str, Optional[dict[str, Any]]]:
+        if endpoint == "predict":
+            return "POST", "/predict", {
+                "seller_id": self.rng.randint(1, self.args.num_users),
+                "is_verified_seller": self.rng.random() < 0.3,
+                "item_id": self.random_item_id(),
+                "name": "bench",
+                "description": "x" * self.rng.randint(10, 1000),
+                "category": self.rng.randint(0, 99),
+                "images_qty": self.rng.randint(0, 10),
+            }
+        if endpoint == "simple_predict":
+            return "POST", "/simple_predict", {"item_id": self.random_item_id()}
+        if endpoint == "async_predict":
+            return "POST", "/async_predict", {"item_id": self.random_item_id()}
+        task_id = self.rng.choice(self.task_ids) if self.task_ids else self.rng.randint(1, self.args.num_ads)
+        return "GET", f"/moderation_result/{task_id}", None
+
+    async def worker(self, client: httpx.AsyncClient, endpoints: list[str], weights: list[float], deadline: float, record_from: float) -> None:
+        while time.perf_counter() < deadline:
+            endpoint = self.rng.choices(endpoints, weights)[0]
+            method, url, body = self.build_request(endpoint)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+            except Exception:
+                if start >= record_from:
+                    self.stats[endpoint].errors += 1
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+            if endpoint == "async_predict" and response.status_code == 200:
+                self.task_ids.append(response.json()["task_id"])
+            if start >= record_from:
+                stats = self.stats[endpoint]
+                stats.latencies_ms.append(elapsed_ms)
+                stats.status_codes[response.status_code] += 1
+                if response.status_code >= 500:
+                    stats.errors += 1
+                elif response.status_code < 400 and elapsed_ms <= self.args.slo_ms:
+                    stats.good += 1
+
+            # как нормальный клиент: после отказа по перегрузке ждем Retry-After, а не повторяем сразу
+            retry_after = response.headers.get("retry-after")
+            if response.status_code == 503 and retry_after is not None:
+                await asyncio.sleep(min(float(retry_after), max(0.0, deadline - time.perf_counter())))
+
+    async def run(self, client: httpx.AsyncClient) -> dict[str, Any]:
+        mix = self.args.mix
+        endpoints, weights = list(mix), list(mix.values())
+
+        started = time.perf_counter()
+        record_from = started + self.args.warmup
+        deadline = record_from + self.args.duration
+        await asyncio.gather(
+            *(
+                self.worker(client, endpoints, weights, deadline, record_from)
+                for _ in range(self.args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - record_from
+
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.latencies_ms.extend(stats.latencies_ms)
+            total.status_codes.update(stats.status_codes)
+            total.errors += stats.errors
+            total.good += stats.good
+
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "total": total.report(elapsed),
+            "endpoints": {name: self.stats[name].report(elapsed) for name in endpoints},
+        }
+
+
+ENDPOINTS = ("predict", "simple_predict", "async_predict", "moderation_result")
+
+
+async def _ensure_real_account(login: str, password: str) -> None:
+    from db import get_connection
+    from repositories.accounts import AccountRepository
+
+    async with get_connection() as conn:
+        repo = AccountRepository(conn)
+        if await repo.get_by_login_password(login, password) is None:
+            await repo.create(login=login, password=password)
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
+    if args.base_url:
+        return await _run_against_server(args)
+
+    stubs = None
+    if not args.real:
+        store = InMemoryStore()
+        store.seed(num_users=args.num_users, num_ads=args.num_ads, seed=args.seed)
+        stubs = install_stubs(
+            store,
+            worker_delay=args.worker_delay_ms / 1000.0,
+            db_pool_size=args.db_pool_size,
+            db_latency=args.db_latency_ms / 1000.0,
+        )
+        stubs.store.accounts[1] = _bench_account()
+
+    from app.middleware.admission import AdmissionController, admission
+    from main import app
+
+    # каждый прогон начинает с начальных лимитов, а не с подстроенных предыдущим
+    admission.limiters = AdmissionController.from_env().limiters
+    admission.enabled = not args.no_admission
+    try:
+        async with app.router.lifespan_context(app):
+            # lifespan сам настраивает логирование, уровень для прогона задаем после него
+            logging.getLogger().setLevel(args.log_level)
+            if args.real:
+                # в отдельной задаче: запись в primary не должна «прилипнуть» к контексту,
+                # из которого стартуют запросы, иначе чтения не пойдут на реплики
+                await asyncio.create_task(_ensure_real_account(BENCH_LOGIN, BENCH_PASSWORD))
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                response = await client.post("/login", json={"login": BENCH_LOGIN, "password": BENCH_PASSWORD})
+                response.raise_for_status()
+
+                result = await LoadGenerator(args).run(client)
+    finally:
+        if stubs is not None:
+            stubs.patcher.undo()
+
+    result["config"] = _config(args, "real" if args.real else "stubs")
+    result["admission"] = admission.stats()
+    if stubs is not None:
+        # нагрузка на воркеры модерации: сколько задач реально ушло в очередь
+        result["kafka_messages"] = stubs.kafka.sent_messages
+    return result
+
+
+async def _run_against_server(args: argparse.Namespace) -> dict[str, Any]:
+    """Нагрузка на уже запущенный сервер по HTTP: стабы и lifespan — забота сервера."""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30.0) as client:
+        response = await client.post("/login", json={"login": BENCH_LOGIN, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+
+        result = await LoadGenerator(args).run(client)
+    result["config"] = _config(args, args.base_url)
+    return result
+
+
+def _config(args: argparse.Namespace, mode: str) -> dict[str, Any]:
+    return {
+        "mode": mode,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "mix": args.mix,
+        "num_ads": args.num_ads,
+        "num_users": args.num_users,
+        "hot_items": args.hot_items,
+        "slo_ms": args.slo_ms,
+        "admission": not args.no_admission,
+        "db_pool_size": args.db_pool_size,
+        "db_latency_ms": args.db_latency_ms,
+    }
+
+
+def _bench_account():
+    from repositories.accounts import Account
+
+    return Account(id=1, login=BENCH_LOGIN, password=BENCH_PASSWORD, is_blocked=False)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test for the moderation API")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds excluded from stats")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--num-ads", type=int, default=10_000)
+    parser.add_argument("--num-users", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--hot-items", type=int, default=0, help="draw item ids only from the first N ads")
+    parser.add_argument("--worker-delay-ms", type=float, default=0.0, help="stub worker processing time")
+    parser.add_argument("--db-pool-size", type=int, default=0, help="stub DB pool size, 0 = unbounded")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="stub time a connection is held per checkout")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="successful responses faster than this count as goodput")
+    parser.add_argument("--no-admission", action="store_true", help="disable admission control")
+    parser.add_argument("--real", action="store_true", help="use real Postgres/Redis/Kafka")
+    parser.add_argument("--base-url", help="load an already running server over HTTP instead of the in-process app")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="write JSON report to this file")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    # в новых PyJWT короткий ключ дает warning на каждый decode — в отчете он не нужен
+    warnings.filterwarnings("ignore", module=r"jwt\.")
+
+    result = asyncio.run(run_benchmark(args))
+    report = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+"""
+Стоимость per-request логов /predict для event loop при заданном RPS.
+
+Сравнивает синхронный StreamHandler (как было с logging.basicConfig) с очередью
+и фоновым потоком, с сэмплированием и без:
+
+    python -m benchmarks.logging_overhead --rps 5000 --requests 50000
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueListener
+from typing import Any, Optional
+
+import numpy as np
+
+from app.logging_config import LOG_FORMAT, DeferredQueueHandler, SampledLogger
+
+
+FEATURES = np.array([[1.0, 0.4, 0.3, 0.12]])
+
+
+def _emit_predict_logs(request_log: SampledLogger) -> None:
+    # те же две записи, что пишет /predict
+    if request_log.enabled():
+        request_log.log("Request: seller_id=%s, item_id=%s, features=%s", 1, 10, FEATURES.tolist())
+        request_log.log("Result: is_violation=%s, probability=%s", True, 0.8731)
+
+
+def _run(name: str, *, queued: bool, sample_rate: float, requests: int, rps: int) -> dict[str, Any]:
+    logger = logging.getLogger(f"bench.logging.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    devnull = open(os.devnull, "w")
+    stream_handler = logging.StreamHandler(devnull)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    listener: Optional[QueueListener] = None
+    if queued:
+        handler = DeferredQueueHandler(queue.Queue(maxsize=100_000))
+        listener = QueueListener(handler.queue, stream_handler)
+        listener.start()
+        logger.addHandler(handler)
+    else:
+        logger.addHandler(stream_handler)
+
+    request_log = SampledLogger(logger, sample_rate=sample_rate, level=logging.INFO)
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for _ in range(requests):
+        _emit_predict_logs(request_log)
+    caller_elapsed = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()
+    cpu_elapsed = time.process_time() - cpu_start
+
+    logger.handlers.clear()
+    devnull.close()
+
+    caller_us = caller_elapsed / requests * 1e6
+    return {
+        "config": name,
+        "caller_us_per_request": round(caller_us, 3),
+        "process_cpu_us_per_request": round(cpu_elapsed / requests * 1e6, 3),
+        # доля одного ядра, которую event loop тратит на логи при заданном RPS
+        "event_loop_share_at_rps": round(caller_us * rps / 1e6, 4),
+        "dropped": handler.dropped if queued else 0,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Per-request logging overhead")
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--rps", type=int, default=5000)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    configs = [
+        ("sync_stream_handler", False, 1.0),
+        ("queued", True, 1.0),
+        (f"queued_sampled_{args.sample_rate}", True, args.sample_rate),
+    ]
+    results = [
+        _run(name, queued=queued, sample_rate=rate, requests=args.requests, rps=args.rps)
+        for name, queued, rate in configs
+    ]
+    print(json.dumps({"rps": args.rps, "requests": args.requests, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Микробенчмарки горячих функций на пути запроса.
+
+    python -m benchmarks.micro                        # прогон и сравнение с baseline
+    python -m benchmarks.micro --save-baseline        # записать текущие цифры как baseline
+    python -m benchmarks.micro --threshold 15 -k auth # порог регрессии 15%, только кейсы с "auth"
+
+Baseline хранится в benchmarks/baselines/micro.json. Если функция стала медленнее
+baseline больше чем на --threshold процентов, скрипт завершается с кодом 1 — как и когда
+baseline (файла или замера для функции) нет, а --save-baseline не передан.
+"""
+import argparse
+import json
+import sys
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.responses import JSONBytesResponse, encode_prediction
+from model import train_model
+from repositories.accounts import Account, AccountRepository
+from repositories.ads import AdRepository
+from repositories.moderation_results import ModerationResultRepository
+from repositories.prediction_cache import PredictionCacheRepository
+from repositories.users import UserRepository
+from schemas.models import AdRequest, PredictResponse
+from dependencies.auth import get_current_account
+from services.auth import AuthService, VerifiedTokenCache
+from services.moderation import prepare_features
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "micro.json"
+DEFAULT_THRESHOLD_PCT = 10.0
+
+Case = Callable[[], Any]
+CASES: dict[str, Callable[[], Case]] = {}
+
+
+def case(name: str) -> Callable[[Callable[[], Case]], Callable[[], Case]]:
+    """Регистрирует фабрику кейса: она готовит данные и возвращает замеряемую функцию."""
+
+    def decorator(factory: Callable[[], Case]) -> Callable[[], Case]:
+        CASES[name] = factory
+        return factory
+
+    return decorator
+
+
+def run_coroutine(coro) -> Any:
+    """Прогоняет корутину, которая не уходит в event loop (in-memory заглушки), без накладных расходов asyncio."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("coroutine suspended; use an event loop for this case")
+
+
+AD_PAYLOAD = {
+    "seller_id": 1,
+    "is_verified_seller": True,
+    "item_id": 10,
+    "name": "Garage sale",
+    "description": "x" * 300,
+    "category": 12,
+    "images_qty": 4,
+}
+
+_model = None
+
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = train_model()
+    return _model
+
+
+@case("prepare_features")
+def _prepare_features() -> Case:
+    ad = AdRequest(**AD_PAYLOAD)
+    return lambda: prepare_features(ad)
+
+
+@case("predict_proba_1_row")
+def _predict_proba_one() -> Case:
+    model = get_model()
+    features = prepare_features(AdRequest(**AD_PAYLOAD))
+    return lambda: model.predict_proba(features)
+
+
+@case("predict_proba_1000_rows")
+def _predict_proba_batch() -> Case:
+    model = get_model()
+    features = np.random.default_rng(0).random((1000, 4))
+    return lambda: model.predict_proba(features)
+
+
+@case("prediction_cache_encode")
+def _cache_encode() -> Case:
+    prediction = {"is_violation": True, "probability": 0.8731}
+    return lambda: PredictionCacheRepository._encode(prediction)
+
+
+@case("prediction_cache_decode")
+def _cache_decode() -> Case:
+    data = PredictionCacheRepository._encode({"is_violation": True, "probability": 0.8731})
+    return lambda: PredictionCacheRepository._decode(data)
+
+
+def _auth_service() -> AuthService:
+    return AuthService(None, secret_key="bench-secret", token_ttl_seconds=3600)  # type: ignore[arg-type]
+
+
+BENCH_ACCOUNT = Account(id=1, login="bench", password="bench", is_blocked=False)
+
+
+@case("auth_issue_token")
+def _issue_token() -> Case:
+    service = _auth_service()
+    return lambda: service.issue_token(BENCH_ACCOUNT)
+
+
+@case("auth_decode_token")
+def _decode_token() -> Case:
+    service = _auth_service()
+    token = service.issue_token(BENCH_ACCOUNT)
+    return lambda: service.decode_token(token)
+
+
+class _StaticAccountRepo:
+    async def get_by_id(self, account_id: int) -> Account:
+        return BENCH_ACCOUNT
+
+
+def _auth_dependency_case(token_cache: Optional[VerifiedTokenCache]) -> Case:
+    service = AuthService(
+        _StaticAccountRepo(),  # type: ignore[arg-type]
+        secret_key="bench-secret",
+        token_ttl_seconds=3600,
+        token_cache=token_cache,
+    )
+    token = service.issue_token(BENCH_ACCOUNT)
+    return lambda: run_coroutine(get_current_account(access_token=token, auth_service=service))
+
+
+@case("auth_dependency_uncached")
+def _auth_dependency_uncached() -> Case:
+    return _auth_dependency_case(None)
+
+
+@case("auth_dependency_cached")
+def _auth_dependency_cached() -> Case:
+    return _auth_dependency_case(VerifiedTokenCache())
+
+
+@case("pydantic_ad_request")
+def _ad_request() -> Case:
+    return lambda: AdRequest(**AD_PAYLOAD)
+
+
+@case("pydantic_predict_response")
+def _predict_response() -> Case:
+    return lambda: PredictResponse(is_violation=True, probability=0.8731)
+
+
+def _pydantic_response(prediction: dict[str, Any]) -> JSONResponse:
+    # то, что делал FastAPI для response_model: модель -> dict -> валидация -> jsonable_encoder -> json.dumps
+    response = PredictResponse(**prediction)
+    validated = PredictResponse.model_validate(response.model_dump())
+    return JSONResponse(content=jsonable_encoder(validated))
+
+
+@case("response_computed_pydantic")
+def _response_computed_pydantic() -> Case:
+    return lambda: _pydantic_response({"is_violation": True, "probability": 0.8731})
+
+
+@case("response_computed_fast")
+def _response_computed_fast() -> Case:
+    return lambda: JSONBytesResponse(encode_prediction(True, 0.8731))
+
+
+@case("response_cache_hit_pydantic")
+def _response_cache_hit_pydantic() -> Case:
+    cached = PredictionCacheRepository._encode({"is_violation": True, "probability": 0.8731})
+    return lambda: _pydantic_response(PredictionCacheRepository._decode(cached))
+
+
+@case("response_cache_hit_fast")
+def _response_cache_hit_fast() -> Case:
+    cached = encode_prediction(True, 0.8731)
+    return lambda: JSONBytesResponse(cached)
+
+
+@case("row_to_model_ad")
+def _ad_row() -> Case:
+    row = {"id": 10, "seller_id": 1, "title": "t", "description": "d" * 300, "category": 12, "images_qty": 4}
+    return lambda: AdRepository._row_to_model(row)
+
+
+@case("row_to_model_user")
+def _user_row() -> Case:
+    row = {"id": 1, "is_verified_seller": True}
+    return lambda: UserRepository._row_to_model(row)
+
+
+@case("row_to_model_account")
+def _account_row() -> Case:
+    row = {"id": 1, "login": "bench", "password": "bench", "is_blocked": False}
+    return lambda: AccountRepository._row_to_model(row)
+
+
+@case("row_to_model_moderation_result")
+def _moderation_row() -> Case:
+    now = datetime.now()
+    row = {
+        "id": 1,
+        "item_id": 10,
+        "status": "completed",
+        "is_violation": False,
+        "probability": 0.1,
+        "error_message": None,
+        "created_at": now,
+        "processed_at": now,
+    }
+    return lambda: ModerationResultRepository._row_to_model(row)
+
+
+def measure(fn: Case, *, repeat: int, min_time: float) -> float:
+    """Возвращает лучшее время одного вызова в наносекундах."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best * 1e9
+
+
+def load_baseline(path: Path) -> dict[str, float]:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)["results_ns"]
+
+
+def save_baseline(path: Path, results: dict[str, float]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({"results_ns": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for request hot path")
+    parser.add_argument("-k", "--filter", help="run only cases containing this substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PCT, help="allowed regression, %%")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    warnings.filterwarnings("ignore", module=r"jwt\.")
+
+    # без baseline сравнивать не с чем: молча пройти проверку нельзя
+    if not args.save_baseline and not args.baseline.exists():
+        print(f"Baseline {args.baseline} not found, run with --save-baseline first", file=sys.stderr)
+        return 1
+
+    names = [name for name in CASES if not args.filter or args.filter in name]
+    results = {name: measure(CASES[name](), repeat=args.repeat, min_time=args.min_time) for name in names}
+
+    if args.save_baseline:
+        merged = {**load_baseline(args.baseline), **results}
+        save_baseline(args.baseline, merged)
+
+    baseline = load_baseline(args.baseline)
+    regressions = []
+    missing = []
+    report = []
+    for name, ns in results.items():
+        base = baseline.get(name)
+        if base is None:
+            missing.append(name)
+        change = (ns / base - 1.0) * 100.0 if base else None
+        regressed = change is not None and change > args.threshold
+        if regressed:
+            regressions.append(name)
+        report.append({"case": name, "ns_per_op": round(ns, 1), "baseline_ns": base, "change_pct": change, "regressed": regressed})
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'case':40} {'ns/op':>14} {'baseline':>14} {'change':>9}")
+        for row in report:
+            base = f"{row['baseline_ns']:.1f}" if row["baseline_ns"] else "-"
+            change = f"{row['change_pct']:+.1f}%" if row["change_pct"] is not None else "-"
+            mark = "  REGRESSION" if row["regressed"] else ""
+            print(f"{row['case']:40} {row['ns_per_op']:>14.1f} {base:>14} {change:>9}{mark}")
+
+    if missing:
+        print(f"\nNo baseline for {len(missing)} case(s): {', '.join(missing)}", file=sys.stderr)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold}%: {', '.join(regressions)}", file=sys.stderr)
+    return 1 if missing or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
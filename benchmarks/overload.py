@@ -0,0 +1,79 @@
+"""
+Прогон за точкой насыщения: одна и та же нагрузка с admission control и без него
+на растущем числе одновременных клиентов.
+
+По умолчанию работает на заглушках с ограниченным пулом соединений к БД (--db-pool-size)
+и временем удержания соединения (--db-latency-ms), чтобы перегрузка наступала как в проде:
+запросы копятся в ожидании пула. Для каждого уровня печатается RPS, goodput (успешные
+ответы быстрее --slo-ms), p50/p99 и доля 503:
+
+    python -m benchmarks.overload --levels 16,128,512,1024 --duration 5 --output overload.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import warnings
+from typing import Any, Optional
+
+from benchmarks.load import build_parser as build_load_parser
+from benchmarks.load import run_benchmark
+
+
+def _summary(result: dict[str, Any]) -> dict[str, Any]:
+    total = result["total"]
+    shed = total["status_codes"].get("503", 0)
+    return {
+        "rps": total["rps"],
+        "goodput_rps": total["goodput_rps"],
+        "p50_ms": total["latency_ms"]["p50"],
+        "p99_ms": total["latency_ms"]["p99"],
+        "shed_ratio": round(shed / total["count"], 3) if total["count"] else 0.0,
+    }
+
+
+async def run_levels(args: argparse.Namespace) -> list[dict[str, Any]]:
+    rows = []
+    for concurrency in args.levels:
+        row: dict[str, Any] = {"concurrency": concurrency}
+        for admission_enabled in (True, False):
+            load_argv = [
+                "--duration", str(args.duration),
+                "--warmup", str(args.warmup),
+                "--concurrency", str(concurrency),
+                "--db-pool-size", str(args.db_pool_size),
+                "--db-latency-ms", str(args.db_latency_ms),
+                "--slo-ms", str(args.slo_ms),
+                "--mix", args.mix,
+            ]
+            if not admission_enabled:
+                load_argv.append("--no-admission")
+            result = await run_benchmark(build_load_parser().parse_args(load_argv))
+            row["admission" if admission_enabled else "no_admission"] = _summary(result)
+        print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+        rows.append(row)
+    return rows
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare API goodput with and without admission control")
+    parser.add_argument("--levels", type=lambda raw: [int(x) for x in raw.split(",")], default=[16, 128, 512, 1024])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--db-pool-size", type=int, default=10)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--slo-ms", type=float, default=300.0)
+    parser.add_argument("--mix", default="simple_predict=6,predict=2,async_predict=1,moderation_result=1")
+    parser.add_argument("--output", help="write JSON report to this file")
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore", module=r"jwt\.")
+
+    report = json.dumps(asyncio.run(run_levels(args)), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,170 @@
+"""
+Память и пропускная способность app.server против обычного `uvicorn --workers`.
+
+Оба сервера запускаются на одном приложении на заглушках (benchmarks.stub_app), под одну
+и ту же нагрузку benchmarks.load --base-url. Память считается по всему дереву процессов:
+сумма RSS (общие copy-on-write страницы учтены в каждом процессе) и сумма PSS (общие
+страницы поделены между процессами — честная оценка занятой памяти):
+
+    python -m benchmarks.server_compare --workers 2 --duration 10 --output server_compare.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+import httpx
+
+from benchmarks.load import build_parser as build_load_parser
+from benchmarks.load import run_benchmark
+
+
+STUB_APP = "benchmarks.stub_app:app"
+
+
+def _server_commands(workers: int, port: int) -> dict[str, list[str]]:
+    return {
+        "uvicorn": [
+            sys.executable, "-m", "uvicorn", STUB_APP,
+            "--port", str(port), "--workers", str(workers), "--no-access-log", "--log-level", "warning",
+        ],
+        "app.server": [
+            sys.executable, "-m", "app.server", "--app", STUB_APP,
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        ],
+    }
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="ascii") as f:
+                # поле comm может содержать пробелы, ppid — второе после закрывающей скобки
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def _process_tree(pid: int) -> list[int]:
+    tree = [pid]
+    for child in _children(pid):
+        tree.extend(_process_tree(child))
+    return tree
+
+
+def _memory_kb(pid: int) -> dict[str, int]:
+    memory = {"rss_kb": 0, "pss_kb": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r", encoding="ascii") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    memory[f"{name.lower()}_kb"] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+def tree_memory(pid: int) -> dict[str, Any]:
+    processes = _process_tree(pid)
+    per_process = [_memory_kb(p) for p in processes]
+    return {
+        "processes": len(processes),
+        "rss_mb": round(sum(m["rss_kb"] for m in per_process) / 1024, 1),
+        "pss_mb": round(sum(m["pss_kb"] for m in per_process) / 1024, 1),
+    }
+
+
+async def _wait_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=1.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"server at {base_url} did not start in {timeout}s")
+
+
+async def measure(name: str, command: list[str], args: argparse.Namespace) -> dict[str, Any]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(command, start_new_session=True)
+    try:
+        await _wait_ready(base_url, args.startup_timeout)
+        # все воркеры должны успеть пройти lifespan, иначе память первого замера занижена
+        await asyncio.sleep(args.settle)
+        idle = tree_memory(process.pid)
+
+        load_argv = [
+            "--base-url", base_url,
+            "--duration", str(args.duration),
+            "--warmup", str(args.warmup),
+            "--concurrency", str(args.concurrency),
+            "--mix", args.mix,
+        ]
+        result = await run_benchmark(build_load_parser().parse_args(load_argv))
+        loaded = tree_memory(process.pid)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+    total = result["total"]
+    row = {
+        "server": name,
+        "workers": args.workers,
+        "idle": idle,
+        "loaded": loaded,
+        "rps": total["rps"],
+        "p50_ms": total["latency_ms"]["p50"],
+        "p99_ms": total["latency_ms"]["p99"],
+        "errors": total["errors"],
+    }
+    print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+    return row
+
+
+async def run_comparison(args: argparse.Namespace) -> list[dict[str, Any]]:
+    commands = _server_commands(args.workers, args.port)
+    return [await measure(name, commands[name], args) for name in args.servers]
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare app.server with plain uvicorn workers")
+    parser.add_argument("--servers", type=lambda raw: raw.split(","), default=["uvicorn", "app.server"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mix", default="simple_predict=6,predict=2,async_predict=1,moderation_result=1")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds to wait after the first 200")
+    parser.add_argument("--output", help="write JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = json.dumps(asyncio.run(run_comparison(args)), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,23 @@
+"""
+main.app на in-memory заглушках для запуска настоящим HTTP-сервером без Postgres, Redis и Kafka:
+
+    python -m app.server --app benchmarks.stub_app:app --workers 2
+    uvicorn benchmarks.stub_app:app --workers 2
+"""
+import os
+
+from benchmarks.load import BENCH_LOGIN, BENCH_PASSWORD
+from benchmarks.stubs import InMemoryStore, install_stubs
+from main import app
+from repositories.accounts import Account
+
+
+STUB_NUM_ADS = int(os.getenv("STUB_NUM_ADS", "10000"))
+STUB_NUM_USERS = int(os.getenv("STUB_NUM_USERS", "1000"))
+
+store = InMemoryStore()
+store.seed(num_users=STUB_NUM_USERS, num_ads=STUB_NUM_ADS)
+store.accounts[1] = Account(id=1, login=BENCH_LOGIN, password=BENCH_PASSWORD, is_blocked=False)
+stubs = install_stubs(store)
+
+__all__ = ["app"]
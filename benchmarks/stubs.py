@@ -0,0 +1,488 @@
+"""
+In-memory заглушки Postgres-репозиториев, Redis и Kafka для нагрузочных прогонов.
+"""
+import asyncio
+import importlib
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Optional
+
+from benchmarks import datagen
+from repositories.accounts import Account
+from repositories.ads import Ad
+from repositories.moderation_outbox import OutboxMessage
+from repositories.moderation_results import ModerationResult
+from repositories.users import User
+
+
+@dataclass
+class InMemoryStore:
+    users: dict[int, User] = field(default_factory=dict)
+    ads: dict[int, Ad] = field(default_factory=dict)
+    closed_ad_ids: set[int] = field(default_factory=set)
+    accounts: dict[int, Account] = field(default_factory=dict)
+    moderation_results: dict[int, ModerationResult] = field(default_factory=dict)
+    pending_by_item: dict[int, int] = field(default_factory=dict)
+    latest_completed_by_item: dict[int, int] = field(default_factory=dict)
+    idempotency_keys: dict[str, int] = field(default_factory=dict)
+    outbox: dict[int, OutboxMessage] = field(default_factory=dict)
+    _sequences: dict[int, int] = field(default_factory=dict)
+
+    def seed(self, *, num_users: int, num_ads: int, seed: int = 42) -> None:
+        # те же распределения, что и при загрузке в настоящий Postgres; закрытых объявлений нет,
+        # чтобы прогоны не упирались в 404
+        for user_id, is_verified_seller in datagen.user_rows(1, num_users, datagen.chunk_rng(seed, "users", 1)):
+            self.users[user_id] = User(id=user_id, is_verified_seller=is_verified_seller)
+        ad_rows = datagen.ad_rows(
+            1,
+            num_ads,
+            datagen.chunk_rng(seed, "ads", 1),
+            seller_ids=range(1, num_users + 1),
+            closed_ratio=0.0,
+        )
+        for ad_id, seller_id, title, description, category, images_qty, _ in ad_rows:
+            self.ads[ad_id] = Ad(
+                id=ad_id,
+                seller_id=seller_id,
+                title=title,
+                description=description,
+                category=category,
+                images_qty=images_qty,
+            )
+
+    def next_id(self, table: dict[int, Any]) -> int:
+        # аналог SERIAL: последовательность на каждую «таблицу»
+        key = id(table)
+        if key not in self._sequences:
+            self._sequences[key] = max(table, default=0)
+        self._sequences[key] += 1
+        return self._sequences[key]
+
+
+class InMemoryAdRepository:
+    def __init__(self, store: InMemoryStore) -> None:
+        self._store = store
+
+    async def create(self, seller_id: int, title: str, description: str, category: int, images_qty: int) -> Ad:
+        ad = Ad(
+            id=self._store.next_id(self._store.ads),
+            seller_id=seller_id,
+            title=title,
+            description=description,
+            category=category,
+            images_qty=images_qty,
+        )
+        self._store.ads[ad.id] = ad
+        return ad
+
+    async def get(self, ad_id: int) -> Optional[Ad]:
+        if ad_id in self._store.closed_ad_ids:
+            return None
+        return self._store.ads.get(ad_id)
+
+    async def close(self, ad_id: int) -> None:
+        if ad_id in self._store.ads:
+            self._store.closed_ad_ids.add(ad_id)
+
+    async def close_many(self, ad_ids: list[int]) -> list[int]:
+        closed = [ad_id for ad_id in ad_ids if ad_id in self._store.ads and ad_id not in self._store.closed_ad_ids]
+        self._store.closed_ad_ids.update(closed)
+        return closed
+
+
+class InMemoryUserRepository:
+    def __init__(self, store: InMemoryStore) -> None:
+        self._store = store
+
+    async def create(self, is_verified_seller: bool) -> User:
+        user = User(id=self._store.next_id(self._store.users), is_verified_seller=is_verified_seller)
+        self._store.users[user.id] = user
+        return user
+
+    async def get(self, user_id: int) -> Optional[User]:
+        return self._store.users.get(user_id)
+
+
+class InMemoryAccountRepository:
+    def __init__(self, store: InMemoryStore) -> None:
+        self._store = store
+
+    async def create(self, login: str, password: str) -> Account:
+        account = Account(
+            id=self._store.next_id(self._store.accounts),
+            login=login,
+            password=password,
+            is_blocked=False,
+        )
+        self._store.accounts[account.id] = account
+        return account
+
+    async def get_by_id(self, account_id: int) -> Optional[Account]:
+        return self._store.accounts.get(account_id)
+
+    async def get_by_login_password(self, login: str, password: str) -> Optional[Account]:
+        for account in self._store.accounts.values():
+            if account.login == login and account.password == password:
+                return account
+        return None
+
+
+class InMemoryModerationResultRepository:
+    def __init__(self, store: InMemoryStore) -> None:
+        self._store = store
+
+    async def create_pending(self, item_id: int) -> ModerationResult:
+        result = ModerationResult(
+            id=self._store.next_id(self._store.moderation_results),
+            item_id=item_id,
+            status="pending",
+            is_violation=None,
+            probability=None,
+            error_message=None,
+            created_at=datetime.now(),
+            processed_at=None,
+        )
+        self._store.moderation_results[result.id] = result
+        return result
+
+    async def get_or_create_pending(
+        self,
+        item_id: int,
+        idempotency_key: Optional[str] = None,
+        *,
+        pending_timeout_seconds: Optional[int] = None,
+    ) -> tuple[ModerationResult, bool]:
+        if idempotency_key is not None:
+            existing = await self.get_by_idempotency_key(idempotency_key)
+            if existing is not None:
+                return existing, False
+
+        pending = await self.get_pending_by_item_id(item_id)
+        if pending is not None:
+            expired = pending_timeout_seconds is not None and pending.created_at < datetime.now() - timedelta(
+                seconds=pending_timeout_seconds
+            )
+            if not expired:
+                if idempotency_key is not None:
+                    self._store.idempotency_keys[idempotency_key] = pending.id
+                return pending, False
+            await self.set_result(
+                pending.id, status="failed", is_violation=None, probability=None, error_message="pending task expired"
+            )
+
+        result = await self.create_pending(item_id)
+        self._store.pending_by_item[item_id] = result.id
+        if idempotency_key is not None:
+            self._store.idempotency_keys[idempotency_key] = result.id
+        return result, True
+
+    async def get_pending_by_item_id(self, item_id: int) -> Optional[ModerationResult]:
+        task_id = self._store.pending_by_item.get(item_id)
+        return self._store.moderation_results.get(task_id) if task_id is not None else None
+
+    async def get_by_idempotency_key(self, idempotency_key: str) -> Optional[ModerationResult]:
+        task_id = self._store.idempotency_keys.get(idempotency_key)
+        return self._store.moderation_results.get(task_id) if task_id is not None else None
+
+    async def get_latest_completed(self, item_id: int, max_age_seconds: int) -> Optional[ModerationResult]:
+        task_id = self._store.latest_completed_by_item.get(item_id)
+        result = self._store.moderation_results.get(task_id) if task_id is not None else None
+        if result is None or result.processed_at is None:
+            return None
+        if result.processed_at < datetime.now() - timedelta(seconds=max_age_seconds):
+            return None
+        return result
+
+    async def set_result(
+        self,
+        task_id: int,
+        *,
+        status: str,
+        is_violation: Optional[bool],
+        probability: Optional[float],
+        error_message: Optional[str],
+    ) -> None:
+        """Результат задачи, как его записывает воркер (complete_if_pending)."""
+        result = self._store.moderation_results.get(task_id)
+        if result is None:
+            return
+        result.status = status
+        result.is_violation = is_violation
+        result.probability = probability
+        result.error_message = error_message
+        result.processed_at = datetime.now()
+        if self._store.pending_by_item.get(result.item_id) == task_id:
+            del self._store.pending_by_item[result.item_id]
+        if status == "completed":
+            self._store.latest_completed_by_item[result.item_id] = task_id
+
+    async def get(self, task_id: int, created_at: Optional[datetime] = None) -> Optional[ModerationResult]:
+        return self._store.moderation_results.get(task_id)
+
+    async def delete_by_item_id(self, item_id: int) -> None:
+        await self.delete_by_item_ids([item_id])
+
+    async def delete_by_item_ids(self, item_ids: list[int]) -> None:
+        ids = set(item_ids)
+        for task_id in [r.id for r in self._store.moderation_results.values() if r.item_id in ids]:
+            del self._store.moderation_results[task_id]
+
+
+class InMemoryOutboxRepository:
+    def __init__(self, store: InMemoryStore) -> None:
+        self._store = store
+
+    async def add(self, task_id: int, item_id: int, task_created_at: datetime) -> None:
+        message_id = self._store.next_id(self._store.outbox)
+        self._store.outbox[message_id] = OutboxMessage(
+            id=message_id,
+            task_id=task_id,
+            item_id=item_id,
+            created_at=datetime.now(timezone.utc),
+            task_created_at=task_created_at,
+        )
+
+    async def fetch_unsent(self, limit: int) -> list[OutboxMessage]:
+        return list(self._store.outbox.values())[:limit]
+
+    async def mark_sent(self, message_ids: list[int]) -> None:
+        # в памяти отправленные строки хранить незачем
+        for message_id in message_ids:
+            self._store.outbox.pop(message_id, None)
+
+    async def purge_sent(self, older_than_seconds: int) -> int:
+        return 0
+
+
+class InMemoryRedis:
+    """Подмножество команд redis.asyncio.Redis, которое использует сервис."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[Any, Optional[float]]] = {}
+
+    async def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def unlink(self, *keys: str) -> int:
+        return await self.delete(*keys)
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def aclose(self) -> None:
+        return None
+
+    close = aclose
+
+
+class InMemoryPipeline:
+    def __init__(self, redis: InMemoryRedis) -> None:
+        self._redis = redis
+        self._commands: list[tuple[str, tuple[Any, ...], dict[str, Any]]] = []
+
+    async def __aenter__(self) -> "InMemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.reset()
+
+    async def reset(self) -> None:
+        self._commands.clear()
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __getattr__(self, name: str):
+        def queue_command(*args: Any, **kwargs: Any) -> "InMemoryPipeline":
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue_command
+
+    async def execute(self) -> list[Any]:
+        commands, self._commands = self._commands, []
+        return [await getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+
+class FakeKafkaModerationClient:
+    """
+    Заглушка продюсера. При simulate_worker=True «обрабатывает» задачу
+    (сразу или через worker_delay секунд), чтобы /moderation_result
+    возвращал завершенные результаты.
+    """
+
+    def __init__(self, store: InMemoryStore, *, simulate_worker: bool = True, worker_delay: float = 0.0) -> None:
+        self._store = store
+        self._simulate_worker = simulate_worker
+        self._worker_delay = worker_delay
+        self._pending_tasks: set[asyncio.Task] = set()
+        self.sent_messages = 0
+
+    @property
+    def is_started(self) -> bool:
+        return True
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    async def send_moderation_request(
+        self,
+        item_id: int,
+        task_id: int,
+        task_created_at: Optional[datetime] = None,
+    ) -> None:
+        self.sent_messages += 1
+        if not self._simulate_worker:
+            return
+        if self._worker_delay <= 0:
+            await self._complete(task_id)
+            return
+        task = asyncio.create_task(self._complete(task_id, delay=self._worker_delay))
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def send_moderation_requests(self, messages) -> None:
+        for item_id, task_id, task_created_at, _ in messages:
+            await self.send_moderation_request(item_id, task_id, task_created_at)
+
+    async def _complete(self, task_id: int, delay: float = 0.0) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        await InMemoryModerationResultRepository(self._store).set_result(
+            task_id,
+            status="completed",
+            is_violation=False,
+            probability=0.1,
+            error_message=None,
+        )
+
+    async def send_to_dlq(self, message: dict, error: str, retry_count: int = 0) -> None:
+        return None
+
+
+class FakeConnection:
+    """Заглушка asyncpg.Connection: репозитории подменены, нужны только транзакции."""
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        yield None
+
+
+@asynccontextmanager
+async def _fake_connection(*args, **kwargs) -> AsyncIterator[FakeConnection]:
+    yield FakeConnection()
+
+
+def fake_pool_connection(pool_size: int, latency: float):
+    """
+    get_connection с ограниченным пулом: не больше pool_size соединений одновременно,
+    каждое удерживается latency секунд (время запросов). Нужен, чтобы воспроизвести перегрузку.
+    """
+    semaphore = asyncio.Semaphore(pool_size)
+
+    @asynccontextmanager
+    async def get_connection(*args, **kwargs) -> AsyncIterator[FakeConnection]:
+        async with semaphore:
+            if latency > 0:
+                await asyncio.sleep(latency)
+            yield FakeConnection()
+
+    return get_connection
+
+
+async def _noop_async() -> None:
+    return None
+
+
+class Patcher:
+    """Минимальный аналог pytest monkeypatch для запуска вне pytest."""
+
+    def __init__(self) -> None:
+        self._undo: list[tuple[Any, str, Any]] = []
+
+    def setattr(self, target: str, value: Any) -> None:
+        module_name, attr = target.rsplit(".", 1)
+        owner: Any = importlib.import_module(module_name.split(":")[0])
+        if ":" in module_name:
+            owner = getattr(owner, module_name.split(":")[1])
+        self._undo.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, value)
+
+    def undo(self) -> None:
+        while self._undo:
+            owner, attr, value = self._undo.pop()
+            setattr(owner, attr, value)
+
+
+@dataclass
+class Stubs:
+    store: InMemoryStore
+    redis: InMemoryRedis
+    kafka: FakeKafkaModerationClient
+    patcher: Patcher
+
+
+def install_stubs(
+    store: InMemoryStore,
+    *,
+    simulate_worker: bool = True,
+    worker_delay: float = 0.0,
+    db_pool_size: int = 0,
+    db_latency: float = 0.0,
+) -> Stubs:
+    """
+    Подменяет Postgres, Redis и Kafka in-memory заглушками для main.app.
+    db_pool_size > 0 — соединения выдаются из пула такого размера с задержкой db_latency.
+    """
+    from model import train_model
+
+    patcher = Patcher()
+    connection = fake_pool_connection(db_pool_size, db_latency) if db_pool_size > 0 else _fake_connection
+    redis = InMemoryRedis()
+    kafka = FakeKafkaModerationClient(store, simulate_worker=simulate_worker, worker_delay=worker_delay)
+
+    patcher.setattr("main.init_db", _noop_async)
+    patcher.setattr("main.close_db", _noop_async)
+    patcher.setattr("app.health._db_probe", _noop_async)
+    patcher.setattr("main.KafkaModerationClient", lambda: kafka)
+    patcher.setattr("main.get_or_train_model", train_model)
+
+    patcher.setattr("routers.predict.get_connection", connection)
+    patcher.setattr("routers.predict.AdRepository", lambda conn: InMemoryAdRepository(store))
+    patcher.setattr("routers.predict.UserRepository", lambda conn: InMemoryUserRepository(store))
+    patcher.setattr(
+        "routers.predict.ModerationResultRepository",
+        lambda conn: InMemoryModerationResultRepository(store),
+    )
+    patcher.setattr("routers.predict.ModerationOutboxRepository", lambda conn: InMemoryOutboxRepository(store))
+    patcher.setattr("app.workers.outbox_relay.get_connection", connection)
+    patcher.setattr("app.workers.outbox_relay.ModerationOutboxRepository", lambda conn: InMemoryOutboxRepository(store))
+    patcher.setattr("dependencies.auth.get_connection", connection)
+    patcher.setattr("dependencies.auth.AccountRepository", lambda conn: InMemoryAccountRepository(store))
+
+    patcher.setattr("app.clients.redis:RedisClient._instance", redis)
+    patcher.setattr("app.clients.redis:RedisClient._binary_instance", redis)
+
+    return Stubs(store=store, redis=redis, kafka=kafka, patcher=patcher)
@@ -1,3 +1,10 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, AsyncIterator, Optional
 
@@ -5,14 +12,63 @@ import asyncpg
 import yaml
 from contextlib import asynccontextmanager
 
+from app.middleware.server_timing import set_attr, stage
+
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 PGMIGRATE_CONFIG_PATH = BASE_DIR / "pgmigrate.yml"
 
+# размер пула на процесс (и для primary, и для каждой реплики); app/server.py делит общий бюджет между воркерами
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# реплики для чтения: "host:port,host:port"; пусто — все запросы идут в primary.
+# Для локальной проверки репликой может выступать тот же инстанс: DB_REPLICAS=localhost:5435
+DB_REPLICAS = os.getenv("DB_REPLICAS", "")
+# на сколько секунд реплика выводится из ротации после ошибки соединения
+DB_REPLICA_EJECT_SECONDS = float(os.getenv("DB_REPLICA_EJECT_SECONDS", "30"))
+DB_REPLICA_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("DB_REPLICA_ACQUIRE_TIMEOUT_SECONDS", "1"))
+# после записи в рамках запроса чтения тоже идут в primary, чтобы не увидеть отставшую реплику
+DB_READ_YOUR_WRITES = os.getenv("DB_READ_YOUR_WRITES", "1") == "1"
+
+# ошибки, после которых реплика считается недоступной
+REPLICA_FAILURE_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+
 _pool: Optional[asyncpg.pool.Pool] = None
 _pg_config: Optional[dict[str, Any]] = None
 
 
+@dataclass
+class Replica:
+    host: str
+    port: int
+    pool: Optional[asyncpg.pool.Pool] = None
+    ejected_until: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def eject(self, reason: BaseException) -> None:
+        self.ejected_until = time.monotonic() + DB_REPLICA_EJECT_SECONDS
+        logger.warning("Replica %s ejected for %ss: %r", self.name, DB_REPLICA_EJECT_SECONDS, reason)
+
+
+_replicas: list[Replica] = []
+_replica_cursor = itertools.count()
+_wrote_in_context: ContextVar[bool] = ContextVar("db_wrote_in_context", default=False)
+
+
 def _load_pg_config() -> dict[str, Any]:
     global _pg_config
 
@@ -32,28 +88,132 @@ def _load_pg_config() -> dict[str, Any]:
     return _pg_config
 
 
+def _pool_size() -> dict[str, int]:
+    return {"min_size": min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE), "max_size": DB_POOL_MAX_SIZE}
+
+
+def parse_replicas(value: str, default_port: int = 5432) -> list[Replica]:
+    replicas = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":") if ":" in item else (item, "", "")
+        replicas.append(Replica(host=host, port=int(port) if port else default_port))
+    return replicas
+
+
+async def _open_replica(replica: Replica) -> bool:
+    config = {**_load_pg_config(), "host": replica.host, "port": replica.port}
+    try:
+        replica.pool = await asyncpg.create_pool(**config, **_pool_size())
+    except REPLICA_FAILURE_ERRORS as exc:
+        replica.eject(exc)
+        return False
+    return True
+
+
 async def init_db() -> None:
-    global _pool
+    global _pool, _replicas
 
     if _pool is None:
         config = _load_pg_config()
-        _pool = await asyncpg.create_pool(**config)
+        _pool = await asyncpg.create_pool(**config, **_pool_size())
+
+        # недоступная на старте реплика не мешает запуску, ее пул создастся после cooldown
+        _replicas = parse_replicas(DB_REPLICAS, default_port=config.get("port", 5432))
+        for replica in _replicas:
+            await _open_replica(replica)
 
 
 async def close_db() -> None:
-    global _pool
+    global _pool, _replicas
 
     if _pool is not None:
         await _pool.close()
         _pool = None
 
+    for replica in _replicas:
+        if replica.pool is not None:
+            await replica.pool.close()
+    _replicas = []
+
+
+def pool_stats() -> Optional[dict[str, int]]:
+    """Заполненность пула primary; None — пул еще не создан."""
+    if _pool is None:
+        return None
+    return {"size": _pool.get_size(), "idle": _pool.get_idle_size(), "max_size": _pool.get_max_size()}
+
+
+async def check_primary(timeout: float) -> None:
+    """
+    SELECT 1 на primary без ожидания в общей очереди пула дольше timeout:
+    asyncio.TimeoutError на acquire значит, что все соединения заняты.
+    """
+    if _pool is None:
+        raise RuntimeError("DB pool is not initialized")
+    async with _pool.acquire(timeout=timeout) as conn:
+        await conn.fetchval("SELECT 1", timeout=timeout)
+
+
+def replicas_configured() -> bool:
+    return bool(_replicas)
+
+
+async def _acquire_replica() -> Optional[tuple[Replica, asyncpg.Connection]]:
+    """Round-robin по доступным репликам; None, если ни одна не ответила."""
+    count = len(_replicas)
+    start = next(_replica_cursor)
+    for offset in range(count):
+        replica = _replicas[(start + offset) % count]
+        if not replica.is_available(time.monotonic()):
+            continue
+        if replica.pool is None and not await _open_replica(replica):
+            continue
+        try:
+            conn = await replica.pool.acquire(timeout=DB_REPLICA_ACQUIRE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            # пул реплики занят — это перегрузка, а не отказ: идем дальше, но не выводим из ротации
+            continue
+        except REPLICA_FAILURE_ERRORS as exc:
+            replica.eject(exc)
+            continue
+        return replica, conn
+    return None
+
 
 @asynccontextmanager
-async def get_connection() -> AsyncIterator[asyncpg.Connection]:
+async def get_connection(readonly: bool = False) -> AsyncIterator[asyncpg.Connection]:
+    """
+    readonly=True — соединение с реплики (если они настроены и доступны), иначе с primary.
+    Запросы через readonly-соединение не должны ничего писать.
+    """
     if _pool is None:
         await init_db()
 
     assert _pool is not None
 
-    async with _pool.acquire() as conn:
+    acquired = None
+    with stage("db_acquire"):
+        if readonly and _replicas and not (DB_READ_YOUR_WRITES and _wrote_in_context.get()):
+            acquired = await _acquire_replica()
+        if acquired is None:
+            pool = _pool
+            conn = await _pool.acquire()
+        else:
+            replica, conn = acquired
+            pool = replica.pool
+            set_attr("db_replica", replica.name)
+
+    if not readonly:
+        _wrote_in_context.set(True)
+
+    try:
         yield conn
+    except REPLICA_FAILURE_ERRORS as exc:
+        if acquired is not None and not isinstance(exc, asyncio.TimeoutError):
+            replica.eject(exc)
+        raise
+    finally:
+        await pool.release(conn)
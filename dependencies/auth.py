@@ -1,37 +1,54 @@
-from typing import AsyncIterator, Optional
+from typing import Optional
 
-import asyncpg
 from fastapi import Cookie, Depends, HTTPException, status
 
+from app.middleware.server_timing import stage
 from db import get_connection
 from repositories.accounts import Account, AccountRepository
-from services.auth import AccountBlockedError, AuthService, InvalidTokenError
+from services.auth import AccountBlockedError, AuthService, InvalidTokenError, VerifiedTokenCache
 
 JWT_COOKIE_NAME = "access_token"
 JWT_SECRET_KEY = "super-service-secret"
 JWT_ALGORITHM = "HS256"
 JWT_TTL_SECONDS = 3600
+JWT_CACHE_MAX_SIZE = 10_000
 
+# общий на процесс: AuthService создается на каждый запрос
+_verified_token_cache = VerifiedTokenCache(max_size=JWT_CACHE_MAX_SIZE)
 
-async def get_db_connection() -> AsyncIterator[asyncpg.Connection]:
-    async with get_connection() as conn:
-        yield conn
 
+class PooledAccountRepository:
+    """
+    Чтение аккаунтов с соединением из пула только на время одного запроса к БД.
 
-def get_account_repository(
-    conn: asyncpg.Connection = Depends(get_db_connection),
-) -> AccountRepository:
-    return AccountRepository(conn)
+    Соединение, полученное через yield-зависимость, держалось бы до конца обработки запроса,
+    а обработчику нужно свое: когда пул занят такими «авторизационными» соединениями,
+    запросы ждут друг друга бесконечно.
+    """
+
+    async def get_by_id(self, account_id: int) -> Optional[Account]:
+        # аккаунты только читаются: проверка токена и логин
+        async with get_connection(readonly=True) as conn:
+            return await AccountRepository(conn).get_by_id(account_id)
+
+    async def get_by_login_password(self, login: str, password: str) -> Optional[Account]:
+        async with get_connection(readonly=True) as conn:
+            return await AccountRepository(conn).get_by_login_password(login=login, password=password)
+
+
+def get_account_repository() -> PooledAccountRepository:
+    return PooledAccountRepository()
 
 
 def get_auth_service(
-    account_repo: AccountRepository = Depends(get_account_repository),
+    account_repo: PooledAccountRepository = Depends(get_account_repository),
 ) -> AuthService:
     return AuthService(
         account_repo,
         secret_key=JWT_SECRET_KEY,
         algorithm=JWT_ALGORITHM,
         token_ttl_seconds=JWT_TTL_SECONDS,
+        token_cache=_verified_token_cache,
     )
 
 
@@ -46,7 +63,8 @@ async def get_current_account(
         )
 
     try:
-        return await auth_service.get_account_from_token(access_token)
+        with stage("auth"):
+            return await auth_service.get_account_from_token(access_token)
     except (InvalidTokenError, AccountBlockedError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
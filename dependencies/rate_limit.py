@@ -0,0 +1,222 @@
+"""
+Лимит запросов на аккаунт и маршрут: token bucket в Redis, один вызов Lua-скрипта на запрос.
+
+Чтобы не ходить в Redis на каждый запрос заведомо «тихих» клиентов, процесс берет у ведра
+сразу несколько токенов (lease) и какое-то время тратит их локально. Lease берется, только
+если в ведре оставалось не меньше половины burst, и живет недолго, поэтому перерасход
+ограничен размером lease на процесс. Получивший отказ клиент до Retry-After отсекается
+тоже локально: раньше токены в ведре не появятся.
+"""
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, status
+from redis.exceptions import RedisError
+
+from app.clients.redis import RedisClient
+from app.middleware.response_headers import add_response_header
+from dependencies.auth import get_current_account
+from repositories.accounts import Account
+from repositories.rate_limits import RateLimitRepository
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+# квоты по маршрутам: "route=rate/burst", rate — токенов в секунду
+RATE_LIMIT_QUOTAS = os.getenv("RATE_LIMIT_QUOTAS", "simple_predict=50/100,async_predict=5/20")
+# персональные квоты: "account_id:route=rate/burst;..."
+RATE_LIMIT_ACCOUNT_QUOTAS = os.getenv("RATE_LIMIT_ACCOUNT_QUOTAS", "")
+# доля burst, которую процесс забирает за один поход в Redis (не больше RATE_LIMIT_LEASE_MAX)
+RATE_LIMIT_LEASE_FRACTION = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.05"))
+RATE_LIMIT_LEASE_MAX = int(os.getenv("RATE_LIMIT_LEASE_MAX", "10"))
+RATE_LIMIT_LEASE_TTL_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_TTL_SECONDS", "1.0"))
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
+
+
+@dataclass(frozen=True)
+class Quota:
+    rate: float
+    burst: int
+
+    @property
+    def lease_size(self) -> int:
+        return max(1, min(RATE_LIMIT_LEASE_MAX, int(self.burst * RATE_LIMIT_LEASE_FRACTION)))
+
+
+def _parse_quota(value: str) -> Quota:
+    rate, _, burst = value.partition("/")
+    return Quota(rate=float(rate), burst=int(burst or math.ceil(float(rate))))
+
+
+def parse_quotas(value: str) -> dict[str, Quota]:
+    quotas = {}
+    for item in value.split(","):
+        route, _, quota = item.partition("=")
+        if route.strip():
+            quotas[route.strip()] = _parse_quota(quota.strip())
+    return quotas
+
+
+def parse_account_quotas(value: str) -> dict[tuple[int, str], Quota]:
+    quotas = {}
+    for item in value.split(";"):
+        target, _, quota = item.partition("=")
+        account_id, _, route = target.partition(":")
+        if account_id.strip():
+            quotas[(int(account_id), route.strip())] = _parse_quota(quota.strip())
+    return quotas
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float = 0.0
+
+
+@dataclass
+class _Lease:
+    tokens: int
+    expires_at: float
+    # остаток в Redis на момент выдачи lease
+    remaining: int
+    reset_after: float
+    denied_until: float = 0.0
+
+
+def _redis_repository() -> RateLimitRepository:
+    return RateLimitRepository(RedisClient.get_binary_client())
+
+
+class AccountRateLimiter:
+    def __init__(
+        self,
+        quotas: dict[str, Quota],
+        account_quotas: Optional[dict[tuple[int, str], Quota]] = None,
+        *,
+        repository_factory: Optional[Callable[[], RateLimitRepository]] = None,
+        lease_ttl: float = RATE_LIMIT_LEASE_TTL_SECONDS,
+        max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._quotas = quotas
+        self._account_quotas = account_quotas or {}
+        self._repository_factory = repository_factory or _redis_repository
+        self._lease_ttl = lease_ttl
+        self._max_keys = max_keys
+        self._clock = clock
+        self._leases: OrderedDict[str, _Lease] = OrderedDict()
+
+        self.redis_calls = 0
+        self.local_hits = 0
+
+    def quota_for(self, account_id: int, route: str) -> Optional[Quota]:
+        return self._account_quotas.get((account_id, route)) or self._quotas.get(route)
+
+    async def check(self, account_id: int, route: str) -> Optional[Decision]:
+        """None — для маршрута нет квоты."""
+        quota = self.quota_for(account_id, route)
+        if quota is None:
+            return None
+
+        key = RateLimitRepository.bucket_key(account_id, route)
+        now = self._clock()
+        lease = self._leases.get(key)
+        if lease is not None and now < lease.denied_until:
+            self.local_hits += 1
+            return Decision(
+                allowed=False,
+                limit=quota.burst,
+                remaining=0,
+                reset_after=lease.reset_after,
+                retry_after=lease.denied_until - now,
+            )
+        if lease is not None and lease.tokens > 0 and now < lease.expires_at:
+            lease.tokens -= 1
+            self.local_hits += 1
+            return Decision(
+                allowed=True,
+                limit=quota.burst,
+                remaining=lease.remaining + lease.tokens,
+                reset_after=lease.reset_after,
+            )
+
+        # большой lease — только тем, у кого по последним данным ведро наполовину полное
+        requested = quota.lease_size if lease is None or lease.remaining * 2 >= quota.burst else 1
+        self.redis_calls += 1
+        state = await self._repository_factory().take(key, rate=quota.rate, burst=quota.burst, requested=requested)
+
+        self._store_lease(
+            key,
+            _Lease(
+                tokens=max(0, state.granted - 1),
+                expires_at=now + self._lease_ttl,
+                remaining=state.remaining,
+                reset_after=state.reset_after,
+                denied_until=now + state.retry_after if state.granted == 0 else 0.0,
+            ),
+        )
+        return Decision(
+            allowed=state.granted > 0,
+            limit=quota.burst,
+            remaining=state.remaining + max(0, state.granted - 1),
+            reset_after=state.reset_after,
+            retry_after=state.retry_after,
+        )
+
+    def _store_lease(self, key: str, lease: _Lease) -> None:
+        self._leases[key] = lease
+        self._leases.move_to_end(key)
+        if len(self._leases) > self._max_keys:
+            self._leases.popitem(last=False)
+
+
+account_rate_limiter = AccountRateLimiter(
+    parse_quotas(RATE_LIMIT_QUOTAS),
+    parse_account_quotas(RATE_LIMIT_ACCOUNT_QUOTAS),
+)
+
+
+def _headers(decision: Decision) -> dict[str, str]:
+    return {
+        "RateLimit-Limit": str(decision.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(math.ceil(decision.reset_after)),
+    }
+
+
+def rate_limit(route: str):
+    """Зависимость для маршрута: rate_limit("simple_predict")."""
+
+    async def check_rate_limit(current_account: Account = Depends(get_current_account)) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        try:
+            decision = await account_rate_limiter.check(current_account.id, route)
+        except RedisError:
+            # недоступный Redis не должен останавливать сервис: пропускаем без лимита
+            logger.warning("Rate limit check failed: account_id=%s, route=%s", current_account.id, route, exc_info=True)
+            return
+        if decision is None:
+            return
+
+        headers = _headers(decision)
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов",
+                headers=headers,
+            )
+        for name, value in headers.items():
+            add_response_header(name, value)
+
+    return check_rate_limit
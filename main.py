@@ -1,13 +1,38 @@
+import asyncio
+import logging
+import os
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
 from app.clients.kafka import KafkaModerationClient
 from app.clients.redis import RedisClient
+from app.health import create_health_monitor
+from app.logging_config import setup_logging, shutdown_logging
+from app.middleware.admission import AdmissionMiddleware
+from app.middleware.draining import InFlightMiddleware, in_flight
+from app.middleware.response_headers import ResponseHeadersMiddleware
+from app.middleware.server_timing import ServerTimingMiddleware
+from app.workers.outbox_relay import OutboxRelay
 from db import close_db, init_db
-from model import get_or_train_model
+from model import get_model_version, get_or_train_model
+from repositories.prediction_cache import CacheNamespace
 from routers.auth import router as auth_router
+from routers.debug import router as debug_router
+from routers.health import router as health_router
 from routers.predict import router
+from services.shadow import create_shadow_scorer
+
+logger = logging.getLogger(__name__)
+
+# relay outbox -> Kafka внутри API; можно выключить и запускать отдельно (python -m app.workers.outbox_relay)
+OUTBOX_RELAY_ENABLED = os.getenv("OUTBOX_RELAY_ENABLED", "1") == "1"
+# версия модели, из кэша которой можно читать, пока кэш текущей модели прогревается
+PREDICTION_CACHE_FALLBACK_VERSION = os.getenv("PREDICTION_CACHE_FALLBACK_VERSION") or None
+PREDICTION_CACHE_FALLBACK_SECONDS = float(os.getenv("PREDICTION_CACHE_FALLBACK_SECONDS", "900"))
+# сколько при остановке ждать запросы, которые уже в обработке
+API_DRAIN_TIMEOUT_SECONDS = float(os.getenv("API_DRAIN_TIMEOUT_SECONDS", "20"))
 
 
 @asynccontextmanager
@@ -15,10 +40,14 @@ async def lifespan(app: FastAPI):
     """
     Жизненный цикл:
     - при старте инициализируем пул подключений к БД (PostgreSQL через asyncpg)
-    - поднимаем Kafka producer для задач модерации
+    - поднимаем Kafka producer и relay задач модерации из outbox
     - загружаем/обучаем модель и сохраняем её в app.state.model
-    - при остановке закрываем пул подключений и Kafka producer
+    - запускаем фоновые проверки зависимостей для /livez и /readyz
+    - при остановке перестаем принимать запросы и дожидаемся принятых, досылаем outbox,
+      останавливаем relay, закрываем Kafka producer и пул подключений
     """
+    setup_logging()
+    in_flight.resume()
     await init_db()
     kafka_client = KafkaModerationClient()
     await kafka_client.start()
@@ -27,20 +56,67 @@ async def lifespan(app: FastAPI):
     redis_client = RedisClient.get_client()
     app.state.redis_client = redis_client
 
-    app.state.model = get_or_train_model()
+    # app/server.py загружает модель в родительском процессе до fork, воркеры делят ее copy-on-write
+    if getattr(app.state, "model", None) is None:
+        app.state.model = get_or_train_model()
+    # версию вместе с моделью выставляет и родитель: после SIGHUP это хэш нового файла, а не MODEL_VERSION
+    if getattr(app.state, "model_version", None) is None:
+        app.state.model_version = get_model_version()
+    app.state.prediction_cache_namespace = CacheNamespace(
+        version=app.state.model_version,
+        fallback_version=PREDICTION_CACHE_FALLBACK_VERSION,
+        fallback_until=time.monotonic() + PREDICTION_CACHE_FALLBACK_SECONDS,
+    )
     app.state.kafka_client = kafka_client
 
+    relay_stop = asyncio.Event()
+    relay_task = None
+    if OUTBOX_RELAY_ENABLED:
+        relay_task = asyncio.create_task(OutboxRelay(kafka_client).run(relay_stop))
+
+    # модель-кандидат скорит сэмпл трафика в фоне, ответы отдает только основная модель
+    app.state.shadow_scorer = create_shadow_scorer()
+    shadow_task = None
+    if app.state.shadow_scorer is not None:
+        shadow_task = asyncio.create_task(app.state.shadow_scorer.run(relay_stop))
+
+    # первый цикл проверок до приема трафика: /readyz сразу отвечает по делу
+    app.state.health_monitor = create_health_monitor(app, kafka_client)
+    await app.state.health_monitor.probe()
+    health_task = asyncio.create_task(app.state.health_monitor.run(relay_stop))
+
     try:
         yield
     finally:
+        app.state.health_monitor.start_draining()
+        in_flight.start_draining()
+        if not await in_flight.wait_idle(API_DRAIN_TIMEOUT_SECONDS):
+            logger.warning("Shutdown with %s requests still in flight", in_flight.count)
+
+        # relay досылает outbox последней пачкой, producer закрывается только после него
+        relay_stop.set()
+        await health_task
+        if relay_task is not None:
+            await relay_task
+        if shadow_task is not None:
+            await shadow_task
         await kafka_client.stop()
         await close_db()
         await RedisClient.close()
+        shutdown_logging()
 
 
 app = FastAPI(lifespan=lifespan)
+# admission внутри ServerTiming: ожидание в очереди попадает в тайминги стадией admission_wait
+app.add_middleware(ResponseHeadersMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+# снаружи всех: во время остановки новые запросы отбиваются до любой работы
+app.add_middleware(InFlightMiddleware)
 app.include_router(router)
 app.include_router(auth_router)
+app.include_router(debug_router)
+app.include_router(health_router)
 
 
 @app.get("/")
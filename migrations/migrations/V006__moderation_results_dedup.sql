@@ -0,0 +1,30 @@
+-- Дубли pending-задач по одному объявлению, накопившиеся до дедупликации:
+-- оставляем самую раннюю, остальные помечаем как failed.
+UPDATE moderation_results mr
+SET status = 'failed',
+    error_message = 'duplicate pending task',
+    processed_at = NOW()
+WHERE mr.status = 'pending'
+  AND EXISTS (
+      SELECT 1
+      FROM moderation_results older
+      WHERE older.item_id = mr.item_id
+        AND older.status = 'pending'
+        AND older.id < mr.id
+  );
+
+ALTER TABLE moderation_results ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+-- не больше одной задачи в работе на объявление
+CREATE UNIQUE INDEX IF NOT EXISTS moderation_results_pending_item_uidx
+    ON moderation_results (item_id)
+    WHERE status = 'pending';
+
+CREATE UNIQUE INDEX IF NOT EXISTS moderation_results_idempotency_key_uidx
+    ON moderation_results (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+
+-- поиск свежего завершенного результата по объявлению
+CREATE INDEX IF NOT EXISTS moderation_results_completed_item_idx
+    ON moderation_results (item_id, processed_at DESC)
+    WHERE status = 'completed';
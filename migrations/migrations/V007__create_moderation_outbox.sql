@@ -0,0 +1,17 @@
+-- Outbox задач модерации: строка пишется в одной транзакции с pending-задачей,
+-- в Kafka ее отправляет relay (app/workers/outbox_relay.py).
+CREATE TABLE IF NOT EXISTS moderation_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS moderation_outbox_unsent_idx
+    ON moderation_outbox (id)
+    WHERE sent_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS moderation_outbox_sent_at_idx
+    ON moderation_outbox (sent_at)
+    WHERE sent_at IS NOT NULL;
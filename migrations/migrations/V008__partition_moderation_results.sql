@@ -0,0 +1,93 @@
+-- moderation_results -> секционирование по месяцам created_at.
+-- Старые секции отцепляются и архивируются джобой app/jobs/moderation_partitions.py
+-- вместо построчного DELETE.
+
+ALTER TABLE moderation_results RENAME TO moderation_results_legacy;
+ALTER TABLE moderation_results_legacy RENAME CONSTRAINT moderation_results_pkey TO moderation_results_legacy_pkey;
+ALTER TABLE moderation_results_legacy DROP CONSTRAINT IF EXISTS moderation_results_item_id_fkey;
+DROP INDEX IF EXISTS moderation_results_pending_item_uidx;
+DROP INDEX IF EXISTS moderation_results_idempotency_key_uidx;
+DROP INDEX IF EXISTS moderation_results_completed_item_idx;
+ALTER SEQUENCE moderation_results_id_seq OWNED BY NONE;
+
+-- Уникальность по секционированной таблице возможна только с ключом секционирования,
+-- поэтому PK (id, created_at), а единственность pending-задачи на объявление
+-- обеспечивает advisory lock в ModerationResultRepository.get_or_create_pending.
+CREATE TABLE moderation_results (
+    id INTEGER NOT NULL DEFAULT nextval('moderation_results_id_seq'),
+    item_id INTEGER NOT NULL REFERENCES ads(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL,
+    is_violation BOOLEAN,
+    probability DOUBLE PRECISION,
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMP,
+    idempotency_key TEXT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE moderation_results_id_seq OWNED BY moderation_results.id;
+
+-- страховка: если джоба давно не создавала секции, вставки не должны падать
+CREATE TABLE moderation_results_default PARTITION OF moderation_results DEFAULT;
+
+CREATE INDEX moderation_results_item_id_idx
+    ON moderation_results (item_id);
+
+CREATE INDEX moderation_results_pending_item_idx
+    ON moderation_results (item_id)
+    WHERE status = 'pending';
+
+CREATE INDEX moderation_results_idempotency_key_idx
+    ON moderation_results (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+
+CREATE INDEX moderation_results_completed_item_idx
+    ON moderation_results (item_id, processed_at DESC)
+    WHERE status = 'completed';
+
+-- Создает месячные секции с from_month по текущий месяц + months_ahead.
+-- Возвращает количество созданных секций.
+CREATE OR REPLACE FUNCTION create_moderation_results_partitions(
+    months_ahead INTEGER DEFAULT 3,
+    from_month DATE DEFAULT NULL
+) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start DATE := date_trunc('month', COALESCE(from_month, NOW()::date))::date;
+    last_month DATE := (date_trunc('month', NOW()) + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := format('moderation_results_p%s', to_char(month_start, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF moderation_results FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start,
+                (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT create_moderation_results_partitions(
+    3,
+    (SELECT MIN(created_at)::date FROM moderation_results_legacy)
+);
+
+INSERT INTO moderation_results (
+    id, item_id, status, is_violation, probability,
+    error_message, created_at, processed_at, idempotency_key
+)
+SELECT id, item_id, status, is_violation, probability,
+       error_message, created_at, processed_at, idempotency_key
+FROM moderation_results_legacy;
+
+DROP TABLE moderation_results_legacy;
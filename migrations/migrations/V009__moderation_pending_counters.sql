@@ -0,0 +1,55 @@
+-- Счетчик pending-задач для автоскейлинга воркеров без COUNT(*) по moderation_results.
+-- Триггер прибавляет/вычитает дельту в одну из 16 строк: строка выбирается по pid бэкенда,
+-- поэтому параллельные транзакции не ждут блокировку одной и той же строки.
+-- Текущее значение — SUM(pending) по всем строкам.
+CREATE TABLE IF NOT EXISTS moderation_pending_counters (
+    shard SMALLINT PRIMARY KEY,
+    pending BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO moderation_pending_counters (shard, pending)
+SELECT shard, 0 FROM generate_series(0, 15) AS shard
+ON CONFLICT (shard) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION moderation_pending_counter_trg() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        delta := (NEW.status = 'pending')::INTEGER;
+    ELSIF TG_OP = 'DELETE' THEN
+        delta := -(OLD.status = 'pending')::INTEGER;
+    ELSE
+        delta := (NEW.status = 'pending')::INTEGER - (OLD.status = 'pending')::INTEGER;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE moderation_pending_counters
+        SET pending = pending + delta
+        WHERE shard = pg_backend_pid() % 16;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- стартовое значение под блокировкой: вставки не проскочат между подсчетом и включением триггера
+LOCK TABLE moderation_results IN SHARE ROW EXCLUSIVE MODE;
+
+-- на секционированной таблице триггер создается и на всех текущих и будущих секциях
+DROP TRIGGER IF EXISTS moderation_pending_counter ON moderation_results;
+CREATE TRIGGER moderation_pending_counter
+    AFTER INSERT OR UPDATE OF status OR DELETE ON moderation_results
+    FOR EACH ROW EXECUTE FUNCTION moderation_pending_counter_trg();
+
+-- стартовое значение
+UPDATE moderation_pending_counters SET pending = 0;
+UPDATE moderation_pending_counters
+SET pending = (SELECT COUNT(*) FROM moderation_results WHERE status = 'pending')
+WHERE shard = 0;
+
+-- возраст самой старой pending-задачи: MIN(created_at) берется из начала индекса каждой секции
+CREATE INDEX IF NOT EXISTS moderation_results_pending_created_idx
+    ON moderation_results (created_at)
+    WHERE status = 'pending';
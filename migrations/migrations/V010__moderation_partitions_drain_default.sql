@@ -0,0 +1,78 @@
+-- Строки, попавшие в moderation_results_default (джоба давно не создавала секции),
+-- больше не ломают создание секций: CREATE TABLE ... PARTITION OF падает, если в DEFAULT
+-- уже есть строки этого диапазона. Такие строки переносятся в новую секцию до ее подключения.
+-- Секции создаются и для всех месяцев, застрявших в DEFAULT, чтобы их строки дошли до архивации.
+CREATE OR REPLACE FUNCTION create_moderation_results_partitions(
+    months_ahead INTEGER DEFAULT 3,
+    from_month DATE DEFAULT NULL
+) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    first_month DATE := date_trunc('month', COALESCE(from_month, NOW()::date))::date;
+    last_month DATE := (date_trunc('month', NOW()) + make_interval(months => months_ahead))::date;
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    moved_pending BIGINT;
+    created INTEGER := 0;
+BEGIN
+    -- месяцы окна плюс месяцы, чьи строки уже лежат в DEFAULT (в том числе за пределами окна)
+    FOR month_start IN
+        SELECT generate_series(first_month, last_month, INTERVAL '1 month')::date
+        UNION
+        SELECT DISTINCT date_trunc('month', created_at)::date
+        FROM moderation_results_default
+        ORDER BY 1
+    LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        partition_name := format('moderation_results_p%s', to_char(month_start, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (
+                SELECT 1 FROM moderation_results_default
+                WHERE created_at >= month_start AND created_at < month_end
+            ) THEN
+                -- секция собирается отдельной таблицей и подключается, когда в DEFAULT
+                -- не осталось строк ее диапазона
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE moderation_results INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                    partition_name
+                );
+                EXECUTE format(
+                    'WITH moved AS (
+                         DELETE FROM moderation_results_default
+                         WHERE created_at >= %L AND created_at < %L
+                         RETURNING *
+                     )
+                     INSERT INTO %I SELECT * FROM moved',
+                    month_start,
+                    month_end,
+                    partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE moderation_results ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    month_start,
+                    month_end
+                );
+                -- DELETE из DEFAULT вычел перенесенные pending-задачи из счетчика (V009),
+                -- а вставка в еще не подключенную таблицу их не прибавила
+                EXECUTE format('SELECT COUNT(*) FROM %I WHERE status = ''pending''', partition_name)
+                    INTO moved_pending;
+                IF moved_pending > 0 THEN
+                    UPDATE moderation_pending_counters SET pending = pending + moved_pending WHERE shard = 0;
+                END IF;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF moderation_results FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    month_start,
+                    month_end
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
@@ -0,0 +1,3 @@
+-- created_at задачи едет в сообщении Kafka: воркер находит задачу в ее секции
+-- moderation_results, а не проверяет индекс каждой. У старых строк NULL — поиск по всем секциям.
+ALTER TABLE moderation_outbox ADD COLUMN IF NOT EXISTS task_created_at TIMESTAMP;
@@ -0,0 +1,24 @@
+-- Уникальность Idempotency-Key: на секционированной moderation_results уникальный индекс
+-- без created_at невозможен, поэтому ключ живет в отдельной несекционированной таблице.
+-- task_created_at — ключ секции задачи, чтобы поиск по ключу шел в одну секцию.
+CREATE TABLE IF NOT EXISTS moderation_idempotency_keys (
+    idempotency_key TEXT PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    task_created_at TIMESTAMP NOT NULL
+);
+
+-- ключи уходят вместе с архивируемыми секциями
+CREATE INDEX IF NOT EXISTS moderation_idempotency_keys_task_created_at_idx
+    ON moderation_idempotency_keys (task_created_at);
+
+-- при дублях, накопившихся после V008, ключ остается за первой задачей
+INSERT INTO moderation_idempotency_keys (idempotency_key, task_id, item_id, task_created_at)
+SELECT DISTINCT ON (idempotency_key) idempotency_key, id, item_id, created_at
+FROM moderation_results
+WHERE idempotency_key IS NOT NULL
+ORDER BY idempotency_key, id
+ON CONFLICT (idempotency_key) DO NOTHING;
+
+DROP INDEX IF EXISTS moderation_results_idempotency_key_idx;
+ALTER TABLE moderation_results DROP COLUMN IF EXISTS idempotency_key;
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import pickle
 
@@ -6,6 +7,8 @@ from sklearn.linear_model import LogisticRegression
 
 
 MODEL_PATH = "model.pkl"
+# явная версия модели (например, тег релиза); по умолчанию — хэш файла модели
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
 
 
 def train_model():
@@ -39,3 +42,18 @@ def get_or_train_model():
     model = train_model()
     save_model(model, MODEL_PATH)
     return model
+
+
+def get_model_version(path: str = MODEL_PATH) -> str:
+    """Версия модели для неймспейса кэша: меняется вместе с файлом модели."""
+    if MODEL_VERSION and path == MODEL_PATH:
+        return MODEL_VERSION
+    return model_file_version(path)
+
+
+def model_file_version(path: str = MODEL_PATH) -> str:
+    """Хэш файла модели без учета MODEL_VERSION."""
+    if not os.path.exists(path):
+        return "dev"
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 import asyncpg
 
@@ -60,15 +60,13 @@ class AdRepository:
         )
         if row is None:
             return None
+        return self._row_to_model(row)
 
-        return Ad(
-            id=row["id"],
-            seller_id=row["seller_id"],
-            title=row["title"],
-            description=row["description"],
-            category=row["category"],
-            images_qty=row["images_qty"],
-        )
+    async def get_open_id_bounds(self) -> Optional[tuple[int, int]]:
+        row = await self._conn.fetchrow("SELECT MIN(id) AS lo, MAX(id) AS hi FROM ads WHERE is_closed = FALSE")
+        if row["lo"] is None:
+            return None
+        return row["lo"], row["hi"]
 
     async def close(self, ad_id: int) -> None:
         await self._conn.execute(
@@ -80,4 +78,53 @@ class AdRepository:
             ad_id,
         )
 
+    async def close_many(self, ad_ids: list[int]) -> list[int]:
+        """Закрывает открытые объявления из списка, возвращает id реально закрытых."""
+        rows = await self._conn.fetch(
+            """
+            UPDATE ads
+            SET is_closed = TRUE
+            WHERE id = ANY($1::int[]) AND is_closed = FALSE
+            RETURNING id
+            """,
+            ad_ids,
+        )
+        return [row["id"] for row in rows]
+
+    async def iter_open_with_sellers(
+        self,
+        after_id: int,
+        batch_size: int,
+        up_to_id: Optional[int] = None,
+    ) -> AsyncIterator[list[asyncpg.Record]]:
+        """
+        Открытые объявления с признаками продавца по возрастанию id (after_id, up_to_id],
+        пачками через серверный курсор. Вызывать внутри транзакции. Описание не передается, только его длина.
+        """
+        cursor = await self._conn.cursor(
+            """
+            SELECT a.id, u.is_verified_seller, a.images_qty, length(a.description) AS description_len, a.category
+            FROM ads a
+            JOIN users u ON u.id = a.seller_id
+            WHERE a.is_closed = FALSE AND a.id > $1 AND ($2::int IS NULL OR a.id <= $2)
+            ORDER BY a.id
+            """,
+            after_id,
+            up_to_id,
+        )
+        while True:
+            rows = await cursor.fetch(batch_size)
+            if not rows:
+                return
+            yield rows
 
+    @staticmethod
+    def _row_to_model(row: asyncpg.Record) -> Ad:
+        return Ad(
+            id=row["id"],
+            seller_id=row["seller_id"],
+            title=row["title"],
+            description=row["description"],
+            category=row["category"],
+            images_qty=row["images_qty"],
+        )
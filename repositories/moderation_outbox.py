@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import asyncpg
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    task_id: int
+    item_id: int
+    created_at: datetime
+    # created_at задачи в moderation_results — ключ секции
+    task_created_at: Optional[datetime] = None
+
+
+class ModerationOutboxRepository:
+    def __init__(self, conn: asyncpg.Connection) -> None:
+        self._conn = conn
+
+    async def add(self, task_id: int, item_id: int, task_created_at: datetime) -> None:
+        await self._conn.execute(
+            """
+            INSERT INTO moderation_outbox (task_id, item_id, task_created_at)
+            VALUES ($1, $2, $3)
+            """,
+            task_id,
+            item_id,
+            task_created_at,
+        )
+
+    async def fetch_unsent(self, limit: int) -> list[OutboxMessage]:
+        """
+        Блокирует пачку неотправленных сообщений до конца транзакции.
+        SKIP LOCKED позволяет нескольким relay разбирать outbox параллельно.
+        """
+        rows = await self._conn.fetch(
+            """
+            SELECT id, task_id, item_id, created_at, task_created_at
+            FROM moderation_outbox
+            WHERE sent_at IS NULL
+            ORDER BY id
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+            """,
+            limit,
+        )
+        return [self._row_to_model(row) for row in rows]
+
+    async def mark_sent(self, message_ids: list[int]) -> None:
+        await self._conn.execute(
+            """
+            UPDATE moderation_outbox
+            SET sent_at = NOW()
+            WHERE id = ANY($1::bigint[])
+            """,
+            message_ids,
+        )
+
+    async def purge_sent(self, older_than_seconds: int) -> int:
+        result = await self._conn.execute(
+            """
+            DELETE FROM moderation_outbox
+            WHERE sent_at < NOW() - make_interval(secs => $1)
+            """,
+            older_than_seconds,
+        )
+        return int(result.split()[-1])
+
+    @staticmethod
+    def _row_to_model(row: asyncpg.Record) -> OutboxMessage:
+        return OutboxMessage(
+            id=row["id"],
+            task_id=row["task_id"],
+            item_id=row["item_id"],
+            created_at=row["created_at"],
+            task_created_at=row["task_created_at"],
+        )
@@ -1,9 +1,57 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import MAXYEAR, MINYEAR, datetime
 from typing import Optional
 
 import asyncpg
 
+# первый ключ pg_advisory_xact_lock(int, int) для блокировок «создание pending-задачи»
+PENDING_TASK_LOCK_NAMESPACE = 1001
+# то же для Idempotency-Key: один ключ с разными item_id иначе проходит под разными блокировками
+IDEMPOTENCY_KEY_LOCK_NAMESPACE = 1002
+RESCORE_STAGING_TABLE = "moderation_rescore_staging"
+
+# Публичный task_id = (номер месяца created_at << 31) | id: по нему поиск сразу идет в секцию
+# нужного месяца. id — INTEGER, поэтому младший 31 бит; старые task_id без месяца ищутся по всем секциям.
+TASK_ID_MONTH_SHIFT = 31
+
+
+def encode_task_id(task_id: int, created_at: datetime) -> int:
+    return ((created_at.year * 12 + created_at.month - 1) << TASK_ID_MONTH_SHIFT) | task_id
+
+
+def decode_task_id(public_task_id: int) -> tuple[int, Optional[datetime]]:
+    """
+    (id, начало месяца секции); месяц None — task_id выдан до кодирования месяца.
+    ValueError — такой task_id не мог быть выдан (отрицательный или месяц вне 1..9999 года).
+    """
+    month_index = public_task_id >> TASK_ID_MONTH_SHIFT
+    task_id = public_task_id & ((1 << TASK_ID_MONTH_SHIFT) - 1)
+    if month_index == 0:
+        return task_id, None
+    year = month_index // 12
+    if not MINYEAR <= year <= MAXYEAR:
+        raise ValueError(f"Invalid task_id: {public_task_id}")
+    return task_id, datetime(year, month_index % 12 + 1, 1)
+
+
+def _month_bounds(created_at: datetime) -> tuple[datetime, datetime]:
+    start = created_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def _partition_filter(created_at: Optional[datetime], first_param: int) -> tuple[str, list[datetime]]:
+    """
+    Условие на месяц created_at для отсечения секций: PK (id, created_at), и поиск по одному id
+    без него проверяет индекс каждой секции.
+    """
+    if created_at is None:
+        return "", []
+    return (
+        f"AND created_at >= ${first_param} AND created_at < ${first_param + 1}",
+        list(_month_bounds(created_at)),
+    )
+
 
 @dataclass
 class ModerationResult:
@@ -32,17 +80,170 @@ class ModerationResultRepository:
         )
         return self._row_to_model(row)
 
-    async def update_result(
+    async def get_or_create_pending(
+        self,
+        item_id: int,
+        idempotency_key: Optional[str] = None,
+        *,
+        pending_timeout_seconds: Optional[int] = None,
+    ) -> tuple[ModerationResult, bool]:
+        """
+        Возвращает задачу в работе для объявления, создавая ее при необходимости.
+        Второй элемент — была ли задача создана этим вызовом.
+
+        Задача в работе дольше pending_timeout_seconds считается потерянной (битое сообщение,
+        истекшая retention в Kafka, строка без outbox): она помечается failed, и создается новая.
+
+        На секционированной таблице уникальный индекс по item_id невозможен,
+        поэтому создание сериализуется advisory lock-ом на объявление
+        (держится до конца внешней транзакции). Idempotency-Key берет свою блокировку
+        раньше блокировки объявления, а уникальность ключа держит moderation_idempotency_keys.
+        Задача по ключу может оказаться задачей другого объявления — это проверяет вызывающий.
+        """
+        async with self._conn.transaction():
+            if idempotency_key is not None:
+                await self._conn.execute(
+                    "SELECT pg_advisory_xact_lock($1, hashtext($2))",
+                    IDEMPOTENCY_KEY_LOCK_NAMESPACE,
+                    idempotency_key,
+                )
+                existing = await self.get_by_idempotency_key(idempotency_key)
+                if existing is not None:
+                    return existing, False
+
+            await self._conn.execute(
+                "SELECT pg_advisory_xact_lock($1, $2)",
+                PENDING_TASK_LOCK_NAMESPACE,
+                item_id,
+            )
+
+            pending = await self.get_pending_by_item_id(item_id)
+            if pending is not None and (
+                pending_timeout_seconds is None
+                or not await self._expire_stale_pending(pending, pending_timeout_seconds)
+            ):
+                task, created = pending, False
+            else:
+                row = await self._conn.fetchrow(
+                    """
+                    INSERT INTO moderation_results (item_id, status)
+                    VALUES ($1, 'pending')
+                    RETURNING id, item_id, status, is_violation, probability, error_message, created_at, processed_at
+                    """,
+                    item_id,
+                )
+                task, created = self._row_to_model(row), True
+
+            if idempotency_key is not None:
+                await self._remember_idempotency_key(idempotency_key, task)
+        return task, created
+
+    async def get_pending_by_item_id(self, item_id: int) -> Optional[ModerationResult]:
+        row = await self._conn.fetchrow(
+            """
+            SELECT id, item_id, status, is_violation, probability,
+                   error_message, created_at, processed_at
+            FROM moderation_results
+            WHERE item_id = $1 AND status = 'pending'
+            ORDER BY id
+            LIMIT 1
+            """,
+            item_id,
+        )
+        if row is None:
+            return None
+        return self._row_to_model(row)
+
+    async def _expire_stale_pending(self, task: ModerationResult, max_age_seconds: int) -> bool:
+        """True — задача была pending дольше max_age_seconds и помечена failed."""
+        expired = await self._conn.fetchval(
+            """
+            UPDATE moderation_results
+            SET status = 'failed',
+                error_message = 'pending task expired',
+                processed_at = NOW()
+            WHERE id = $1
+              AND created_at = $2
+              AND status = 'pending'
+              AND created_at < LOCALTIMESTAMP - make_interval(secs => $3)
+            RETURNING id
+            """,
+            task.id,
+            task.created_at,
+            max_age_seconds,
+        )
+        return expired is not None
+
+    async def _remember_idempotency_key(self, idempotency_key: str, task: ModerationResult) -> None:
+        # ключ мог остаться от задачи, которую уже удалили или заархивировали вместе с секцией:
+        # под блокировкой ключа он просто переходит к новой задаче
+        await self._conn.execute(
+            """
+            INSERT INTO moderation_idempotency_keys (idempotency_key, task_id, item_id, task_created_at)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (idempotency_key) DO UPDATE
+            SET task_id = EXCLUDED.task_id,
+                item_id = EXCLUDED.item_id,
+                task_created_at = EXCLUDED.task_created_at
+            """,
+            idempotency_key,
+            task.id,
+            task.item_id,
+            task.created_at,
+        )
+
+    async def get_by_idempotency_key(self, idempotency_key: str) -> Optional[ModerationResult]:
+        row = await self._conn.fetchrow(
+            """
+            SELECT mr.id, mr.item_id, mr.status, mr.is_violation, mr.probability,
+                   mr.error_message, mr.created_at, mr.processed_at
+            FROM moderation_idempotency_keys k
+            JOIN moderation_results mr ON mr.id = k.task_id AND mr.created_at = k.task_created_at
+            WHERE k.idempotency_key = $1
+            """,
+            idempotency_key,
+        )
+        if row is None:
+            return None
+        return self._row_to_model(row)
+
+    async def get_latest_completed(self, item_id: int, max_age_seconds: int) -> Optional[ModerationResult]:
+        row = await self._conn.fetchrow(
+            """
+            SELECT id, item_id, status, is_violation, probability,
+                   error_message, created_at, processed_at
+            FROM moderation_results
+            WHERE item_id = $1
+              AND status = 'completed'
+              AND processed_at >= NOW() - make_interval(secs => $2)
+            ORDER BY processed_at DESC
+            LIMIT 1
+            """,
+            item_id,
+            max_age_seconds,
+        )
+        if row is None:
+            return None
+        return self._row_to_model(row)
+
+    async def complete_if_pending(
         self,
         task_id: int,
         *,
+        created_at: Optional[datetime] = None,
         status: str,
         is_violation: Optional[bool],
         probability: Optional[float],
         error_message: Optional[str],
-    ) -> None:
-        await self._conn.execute(
-            """
+    ) -> bool:
+        """
+        Записывает результат, только если задача еще pending.
+        False — задачу уже завершил кто-то другой (повторная доставка из Kafka), результат не тронут.
+        created_at задачи (из сообщения) ограничивает UPDATE ее секцией.
+        """
+        partition_filter, partition_args = _partition_filter(created_at, 6)
+        task = await self._conn.fetchval(
+            f"""
             UPDATE moderation_results
             SET status = $2,
                 is_violation = $3,
@@ -50,29 +251,70 @@ class ModerationResultRepository:
                 error_message = $5,
                 processed_at = NOW()
             WHERE id = $1
+              AND status = 'pending'
+              {partition_filter}
+            RETURNING id
             """,
             task_id,
             status,
             is_violation,
             probability,
             error_message,
+            *partition_args,
+        )
+        return task is not None
+
+    async def get_status(self, task_id: int, created_at: Optional[datetime] = None) -> Optional[str]:
+        """Только статус, без остальных полей; None — задачи нет (удалена вместе с объявлением)."""
+        partition_filter, partition_args = _partition_filter(created_at, 2)
+        return await self._conn.fetchval(
+            f"""
+            SELECT status
+            FROM moderation_results
+            WHERE id = $1 {partition_filter}
+            """,
+            task_id,
+            *partition_args,
         )
 
-    async def get(self, task_id: int) -> Optional[ModerationResult]:
+    async def get(self, task_id: int, created_at: Optional[datetime] = None) -> Optional[ModerationResult]:
+        partition_filter, partition_args = _partition_filter(created_at, 2)
         row = await self._conn.fetchrow(
-            """
+            f"""
             SELECT id, item_id, status, is_violation, probability,
                    error_message, created_at, processed_at
             FROM moderation_results
-            WHERE id = $1
+            WHERE id = $1 {partition_filter}
             """,
             task_id,
+            *partition_args,
         )
         if row is None:
             return None
         return self._row_to_model(row)
 
+    async def count_pending(self) -> int:
+        """Из счетчика, который ведет триггер (миграция V009), без COUNT(*) по таблице."""
+        return await self._conn.fetchval(
+            """
+            SELECT COALESCE(SUM(pending), 0)
+            FROM moderation_pending_counters
+            """
+        )
+
+    async def oldest_pending_age_seconds(self) -> Optional[float]:
+        # created_at без зоны пишется через NOW(), поэтому и возраст считаем по часам БД
+        age = await self._conn.fetchval(
+            """
+            SELECT EXTRACT(EPOCH FROM LOCALTIMESTAMP - MIN(created_at))
+            FROM moderation_results
+            WHERE status = 'pending'
+            """
+        )
+        return float(age) if age is not None else None
+
     async def delete_by_item_id(self, item_id: int) -> None:
+        # история объявления лежит во всех месяцах: по индексу item_id в каждой секции
         await self._conn.execute(
             """
             DELETE FROM moderation_results
@@ -81,6 +323,67 @@ class ModerationResultRepository:
             item_id,
         )
 
+    async def delete_by_item_ids(self, item_ids: list[int]) -> None:
+        await self._conn.execute(
+            """
+            DELETE FROM moderation_results
+            WHERE item_id = ANY($1::int[])
+            """,
+            item_ids,
+        )
+
+    async def create_rescore_staging(self) -> None:
+        """Временная таблица сессии для пакетной записи результатов пересчета через COPY."""
+        await self._conn.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {RESCORE_STAGING_TABLE} (
+                item_id INTEGER NOT NULL,
+                is_violation BOOLEAN NOT NULL,
+                probability DOUBLE PRECISION NOT NULL
+            )
+            """
+        )
+        await self._conn.execute(f"TRUNCATE {RESCORE_STAGING_TABLE}")
+
+    async def copy_rescore_results(self, records: list[tuple[int, bool, float]]) -> None:
+        await self._conn.copy_records_to_table(
+            RESCORE_STAGING_TABLE,
+            records=records,
+            columns=("item_id", "is_violation", "probability"),
+        )
+
+    async def merge_rescore_staging(self) -> tuple[int, int]:
+        """
+        Одним запросом переносит результаты из staging в moderation_results:
+        задачи в работе по этим объявлениям завершаются, для остальных добавляется завершенная запись.
+        Возвращает (завершено pending-задач, добавлено записей).
+        """
+        row = await self._conn.fetchrow(
+            f"""
+            WITH completed_pending AS (
+                UPDATE moderation_results mr
+                SET status = 'completed',
+                    is_violation = s.is_violation,
+                    probability = s.probability,
+                    error_message = NULL,
+                    processed_at = NOW()
+                FROM {RESCORE_STAGING_TABLE} s
+                WHERE mr.item_id = s.item_id AND mr.status = 'pending'
+                RETURNING mr.item_id
+            ),
+            inserted AS (
+                INSERT INTO moderation_results (item_id, status, is_violation, probability, processed_at)
+                SELECT s.item_id, 'completed', s.is_violation, s.probability, NOW()
+                FROM {RESCORE_STAGING_TABLE} s
+                WHERE NOT EXISTS (SELECT 1 FROM completed_pending c WHERE c.item_id = s.item_id)
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM completed_pending) AS completed,
+                   (SELECT COUNT(*) FROM inserted) AS inserted
+            """
+        )
+        return row["completed"], row["inserted"]
+
     @staticmethod
     def _row_to_model(row: asyncpg.Record) -> ModerationResult:
         return ModerationResult(
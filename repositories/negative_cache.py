@@ -0,0 +1,56 @@
+import logging
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+
+class NegativeCacheRepository:
+    """
+    Короткоживущие записи «объявления/продавца нет» по item_id.
+    Ключи отдельные от кэша предсказаний, чтобы не путать отказ с результатом модели.
+
+    Отказ сбрасывается после коммита нового объявления (services.ads.create_ad); объявления,
+    созданные в обход него, находятся не позже чем через TTL_SECONDS.
+    Ошибки Redis не пробрасываются: недоступный кэш — это промах.
+    """
+
+    TTL_SECONDS = 30
+
+    AD_NOT_FOUND = "ad_not_found"
+    SELLER_NOT_FOUND = "seller_not_found"
+    REASONS = frozenset({AD_NOT_FOUND, SELLER_NOT_FOUND})
+
+    def __init__(self, redis_client: Redis) -> None:
+        self._redis = redis_client
+
+    async def get_reason(self, item_id: int) -> Optional[str]:
+        try:
+            data = await self._redis.get(self._get_key(item_id))
+        except RedisError:
+            logger.warning("Negative cache read failed: item_id=%s", item_id, exc_info=True)
+            return None
+        if not data:
+            return None
+        reason = data.decode("utf-8") if isinstance(data, bytes) else data
+        return reason if reason in self.REASONS else None
+
+    async def mark_missing(self, item_id: int, reason: str) -> None:
+        if reason not in self.REASONS:
+            raise ValueError(f"Unknown negative cache reason: {reason}")
+        try:
+            await self._redis.set(self._get_key(item_id), reason, ex=self.TTL_SECONDS)
+        except RedisError:
+            logger.warning("Negative cache write failed: item_id=%s", item_id, exc_info=True)
+
+    async def invalidate(self, item_id: int) -> None:
+        try:
+            await self._redis.unlink(self._get_key(item_id))
+        except RedisError:
+            logger.warning("Negative cache invalidation failed: item_id=%s", item_id, exc_info=True)
+
+    def _get_key(self, item_id: int) -> str:
+        return f"missing:{item_id}"
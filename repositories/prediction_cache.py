@@ -1,29 +1,119 @@
+import random
+import time
+from dataclasses import dataclass
 from typing import Any, Optional
-import json
 
 from redis.asyncio import Redis
+from redis.asyncio.cluster import RedisCluster
+
+from app.responses import dumps_json, loads_json
+
+
+@dataclass(frozen=True)
+class CacheNamespace:
+    """
+    Версия модели в ключах кэша: после смены модели старые записи просто перестают читаться и истекают по TTL.
+    fallback_version — предыдущая версия, из которой можно читать до fallback_until (time.monotonic()),
+    пока кэш новой версии прогревается.
+    """
+
+    version: str
+    fallback_version: Optional[str] = None
+    fallback_until: float = 0.0
+
+    def active_fallback(self) -> Optional[str]:
+        if self.fallback_version and self.fallback_version != self.version and time.monotonic() < self.fallback_until:
+            return self.fallback_version
+        return None
 
 
 class PredictionCacheRepository:
     TTL_SECONDS = 3600
+    # сколько ключей отправлять в одной команде UNLINK
+    DELETE_CHUNK_SIZE = 1000
 
-    def __init__(self, redis_client: Redis) -> None:
+    def __init__(self, redis_client: Redis, namespace: Optional[CacheNamespace] = None) -> None:
         self._redis = redis_client
+        self._namespace = namespace
 
     async def get_prediction(self, item_id: int) -> Optional[dict[str, Any]]:
-        key = self._get_key(item_id)
-        data = await self._redis.get(key)
+        data = await self.get_prediction_raw(item_id)
         if data:
-            return json.loads(data)
+            return self._decode(data)
         return None
 
+    async def get_prediction_raw(self, item_id: int) -> Optional[bytes]:
+        """Возвращает закэшированный ответ в том виде, в котором он уходит клиенту."""
+        data = await self._redis.get(self._get_key(item_id))
+        if not data:
+            fallback = self._namespace.active_fallback() if self._namespace else None
+            if fallback is None:
+                return None
+            data = await self._redis.get(self._get_key(item_id, fallback))
+            if not data:
+                return None
+        if isinstance(data, str):
+            return data.encode("utf-8")
+        return data
+
     async def set_prediction(self, item_id: int, prediction: dict[str, Any]) -> None:
+        await self.set_prediction_raw(item_id, self._encode(prediction))
+
+    async def set_prediction_raw(self, item_id: int, payload: bytes) -> None:
         key = self._get_key(item_id)
-        await self._redis.set(key, json.dumps(prediction, default=str), ex=self.TTL_SECONDS)
+        await self._redis.set(key, payload, ex=self.TTL_SECONDS)
+
+    async def set_predictions_raw(self, payloads: dict[int, bytes], ttl_jitter: float = 0.0) -> None:
+        """
+        Пишет пачку ответов одним pipeline. ttl_jitter — доля TTL, на которую срок жизни случайно укорачивается,
+        чтобы записи, созданные разом, не истекали одновременно.
+        """
+        if not payloads:
+            return
+        max_jitter = int(self.TTL_SECONDS * ttl_jitter)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for item_id, payload in payloads.items():
+                ttl = self.TTL_SECONDS - random.randint(0, max_jitter) if max_jitter else self.TTL_SECONDS
+                pipe.set(self._get_key(item_id), payload, ex=ttl)
+            await pipe.execute()
 
     async def delete_prediction(self, item_id: int) -> None:
-        key = self._get_key(item_id)
-        await self._redis.delete(key)
+        await self._redis.delete(*self._keys_for_delete(item_id))
+
+    async def delete_predictions(self, item_ids: list[int]) -> None:
+        """UNLINK пачками в одном pipeline: один round trip, память освобождается в фоне."""
+        if not item_ids:
+            return
+        keys = [key for item_id in item_ids for key in self._keys_for_delete(item_id)]
+        if isinstance(self._redis, RedisCluster):
+            # в кластере многоключевой UNLINK в pipeline упирается в CROSSSLOT,
+            # а сам клиент разбивает ключи по слотам и шлет на узлы параллельно
+            await self._redis.unlink(*keys)
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), self.DELETE_CHUNK_SIZE):
+                pipe.unlink(*keys[start:start + self.DELETE_CHUNK_SIZE])
+            await pipe.execute()
+
+    def _get_key(self, item_id: int, version: Optional[str] = None) -> str:
+        if version is None and self._namespace is not None:
+            version = self._namespace.version
+        if version is None:
+            return f"prediction:{item_id}"
+        return f"prediction:{version}:{item_id}"
+
+    def _keys_for_delete(self, item_id: int) -> list[str]:
+        # запись предыдущей версии тоже удаляем: иначе ее вернет чтение с fallback
+        keys = [self._get_key(item_id)]
+        fallback = self._namespace.active_fallback() if self._namespace else None
+        if fallback is not None:
+            keys.append(self._get_key(item_id, fallback))
+        return keys
+
+    @staticmethod
+    def _encode(prediction: dict[str, Any]) -> bytes:
+        return dumps_json(prediction)
 
-    def _get_key(self, item_id: int) -> str:
-        return f"prediction:{item_id}"
+    @staticmethod
+    def _decode(data: bytes | str) -> dict[str, Any]:
+        return loads_json(data)
@@ -0,0 +1,74 @@
+import hashlib
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from redis.exceptions import NoScriptError
+
+
+# Token bucket за один вызов: долив по времени Redis (одни часы на все инстансы API),
+# списание до requested токенов и TTL ключа до полного восстановления ведра.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = burst
+    ts = now
+end
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+
+local full_ms = math.ceil((burst - tokens) / rate * 1000)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], full_ms + 1000)
+
+local retry_after_ms = 0
+if granted == 0 then
+    retry_after_ms = math.ceil((1 - tokens) / rate * 1000)
+end
+return {granted, math.floor(tokens), retry_after_ms, full_ms}
+"""
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class BucketState:
+    granted: int
+    remaining: int
+    retry_after: float
+    reset_after: float
+
+
+class RateLimitRepository:
+    def __init__(self, redis_client: Redis) -> None:
+        self._redis = redis_client
+
+    async def take(self, key: str, *, rate: float, burst: int, requested: int = 1) -> BucketState:
+        """Списывает до requested токенов; granted == 0 — лимит исчерпан."""
+        args = (rate, burst, requested)
+        try:
+            result = await self._redis.evalsha(TOKEN_BUCKET_SHA, 1, key, *args)
+        except NoScriptError:
+            # EVAL заодно кеширует скрипт на сервере, дальше снова хватит EVALSHA
+            result = await self._redis.eval(TOKEN_BUCKET_SCRIPT, 1, key, *args)
+
+        granted, remaining, retry_after_ms, reset_ms = (int(value) for value in result)
+        return BucketState(
+            granted=granted,
+            remaining=remaining,
+            retry_after=retry_after_ms / 1000.0,
+            reset_after=reset_ms / 1000.0,
+        )
+
+    @staticmethod
+    def bucket_key(account_id: int, route: str) -> str:
+        return f"ratelimit:{account_id}:{route}"
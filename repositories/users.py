@@ -28,9 +28,11 @@ class UserRepository:
         )
         if row is None:
             return None
+        return self._row_to_model(row)
+
+    @staticmethod
+    def _row_to_model(row: asyncpg.Record) -> User:
         return User(
             id=row["id"],
             is_verified_seller=bool(row["is_verified_seller"]),
         )
-
-
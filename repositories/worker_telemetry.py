@@ -0,0 +1,39 @@
+import time
+from typing import Any, Optional
+
+from redis.asyncio import Redis
+
+from app.responses import dumps_json, loads_json
+
+
+class WorkerTelemetryRepository:
+    """
+    Последние снимки метрик воркеров модерации: один hash, поле — id воркера.
+    Воркер, который перестал отчитываться (упал без остановки), отбрасывается по возрасту снимка.
+    """
+
+    KEY = "moderation_workers:telemetry"
+
+    def __init__(self, redis_client: Redis) -> None:
+        self._redis = redis_client
+
+    async def publish(self, worker_id: str, snapshot: dict[str, Any]) -> None:
+        await self._redis.hset(self.KEY, worker_id, dumps_json({**snapshot, "reported_at": time.time()}))
+
+    async def remove(self, worker_id: str) -> None:
+        await self._redis.hdel(self.KEY, worker_id)
+
+    async def list_recent(self, max_age_seconds: float, now: Optional[float] = None) -> dict[str, dict[str, Any]]:
+        now = time.time() if now is None else now
+        snapshots = {}
+        stale = []
+        for field, value in (await self._redis.hgetall(self.KEY)).items():
+            worker_id = field.decode("utf-8") if isinstance(field, bytes) else field
+            snapshot = loads_json(value)
+            if now - snapshot.get("reported_at", 0) > max_age_seconds:
+                stale.append(worker_id)
+            else:
+                snapshots[worker_id] = snapshot
+        if stale:
+            await self._redis.hdel(self.KEY, *stale)
+        return snapshots
@@ -0,0 +1,84 @@
+import os
+import signal
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.clients.redis import RedisClient
+from app.middleware.admission import admission
+from app.middleware.server_timing import slow_requests
+from db import get_connection
+from dependencies.auth import get_current_account
+from model import MODEL_PATH
+from repositories.accounts import Account
+from repositories.moderation_results import ModerationResultRepository
+from repositories.worker_telemetry import WorkerTelemetryRepository
+from services.autoscaling import AUTOSCALE_WORKER_STALE_SECONDS, fleet_summary
+from services.model_reload import MODEL_RELOAD_ACCOUNTS, reload_model
+
+router = APIRouter(prefix="/debug")
+
+
+@router.get("/slow_requests")
+async def get_slow_requests(
+    _current_account: Annotated[Account, Depends(get_current_account)],
+) -> list[dict[str, Any]]:
+    return slow_requests.snapshot()
+
+
+@router.get("/shadow")
+async def get_shadow_stats(
+    request: Request,
+    _current_account: Annotated[Account, Depends(get_current_account)],
+) -> dict[str, Any]:
+    shadow_scorer = getattr(request.app.state, "shadow_scorer", None)
+    if shadow_scorer is None:
+        raise HTTPException(status_code=404, detail="Теневой скоринг выключен")
+    return shadow_scorer.stats()
+
+
+@router.get("/admission")
+async def get_admission_stats(
+    _current_account: Annotated[Account, Depends(get_current_account)],
+) -> dict[str, Any]:
+    return admission.stats()
+
+
+@router.post("/reload_model")
+async def post_reload_model(
+    request: Request,
+    current_account: Annotated[Account, Depends(get_current_account)],
+) -> Any:
+    if current_account.login not in MODEL_RELOAD_ACCOUNTS:
+        raise HTTPException(status_code=403, detail="Недостаточно прав для перезагрузки модели")
+    if not os.path.exists(MODEL_PATH):
+        raise HTTPException(status_code=404, detail="Файл модели не найден")
+
+    arbiter_pid = getattr(request.app.state, "arbiter_pid", None)
+    if arbiter_pid is not None:
+        # под app.server модель есть в каждом воркере: перезагрузку всем рассылает родитель
+        os.kill(arbiter_pid, signal.SIGHUP)
+        return JSONResponse(status_code=202, content={"status": "reload_scheduled"})
+
+    try:
+        version = await reload_model(request.app)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Файл модели не найден")
+    return {"model_version": version}
+
+
+@router.get("/moderation_workers")
+async def get_moderation_workers(
+    _current_account: Annotated[Account, Depends(get_current_account)],
+) -> dict[str, Any]:
+    """Lag, задержки и скорость воркеров модерации и рекомендуемое их число для автоскейлера."""
+    async with get_connection(readonly=True) as conn:
+        repo = ModerationResultRepository(conn)
+        pending = await repo.count_pending()
+        oldest_age = await repo.oldest_pending_age_seconds()
+
+    snapshots = await WorkerTelemetryRepository(RedisClient.get_binary_client()).list_recent(
+        AUTOSCALE_WORKER_STALE_SECONDS
+    )
+    return fleet_summary(snapshots, pending, oldest_age)
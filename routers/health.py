@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request, status
+
+from app.responses import JSONBytesResponse
+
+router = APIRouter()
+
+_ALIVE = b'{"status":"ok"}'
+_STALLED = b'{"status":"stalled"}'
+
+
+@router.get("/livez")
+async def livez(request: Request) -> JSONBytesResponse:
+    monitor = getattr(request.app.state, "health_monitor", None)
+    if monitor is not None and not monitor.alive():
+        return JSONBytesResponse(_STALLED, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return JSONBytesResponse(_ALIVE)
+
+
+@router.get("/readyz")
+async def readyz(request: Request) -> JSONBytesResponse:
+    monitor = getattr(request.app.state, "health_monitor", None)
+    if monitor is None:
+        return JSONBytesResponse(b'{"status":"starting"}', status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    ready, body = monitor.readiness()
+    return JSONBytesResponse(body, status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
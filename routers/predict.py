@@ -1,21 +1,37 @@
 import logging
-from typing import Annotated
+import os
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from redis.exceptions import RedisError
 
 from dependencies.auth import get_current_account
+from dependencies.rate_limit import rate_limit
 from repositories.accounts import Account
 
 from app.clients.redis import RedisClient
-from db import get_connection
+from app.logging_config import SampledLogger
+from app.middleware.admission import reclassify
+from app.middleware.server_timing import set_attr, stage
+from app.responses import JSONBytesResponse, encode_prediction
+from db import get_connection, replicas_configured
 from repositories.ads import AdRepository
-from repositories.moderation_results import ModerationResultRepository
+from repositories.moderation_outbox import ModerationOutboxRepository
+from repositories.moderation_results import (
+    ModerationResult,
+    ModerationResultRepository,
+    decode_task_id,
+    encode_task_id,
+)
+from repositories.negative_cache import NegativeCacheRepository
 from repositories.prediction_cache import PredictionCacheRepository
 from repositories.users import UserRepository
 from schemas.models import (
     AdRequest,
     AsyncPredictRequest,
     AsyncPredictResponse,
+    CloseManyRequest,
+    CloseManyResponse,
     ModerationStatusResponse,
     PredictResponse,
     SimplePredictRequest,
@@ -25,8 +41,27 @@ from services.moderation import prepare_features
 
 router = APIRouter()
 
-logging.basicConfig(level=logging.INFO)
+# сколько секунд завершенный результат модерации отдается на повторный /async_predict без новой задачи
+ASYNC_PREDICT_REUSE_SECONDS = int(os.getenv("ASYNC_PREDICT_REUSE_SECONDS", "300"))
+# задача в работе дольше этого считается потерянной: /async_predict создает новую вместо нее
+ASYNC_PREDICT_PENDING_TIMEOUT_SECONDS = int(os.getenv("ASYNC_PREDICT_PENDING_TIMEOUT_SECONDS", "600"))
+
 logger = logging.getLogger(__name__)
+request_log = SampledLogger(logger)
+
+
+def _prediction_cache(request: Request) -> PredictionCacheRepository:
+    # ключи кэша привязаны к версии модели, загруженной в lifespan
+    return PredictionCacheRepository(
+        RedisClient.get_binary_client(),
+        namespace=getattr(request.app.state, "prediction_cache_namespace", None),
+    )
+
+
+def _submit_shadow(request: Request, item_id: int, features, probability: float) -> None:
+    shadow_scorer = getattr(request.app.state, "shadow_scorer", None)
+    if shadow_scorer is not None:
+        shadow_scorer.submit(item_id, features, probability)
 
 
 def _get_model_from_app(request: Request):
@@ -47,32 +82,36 @@ async def predict(
 ):
 
     model = _get_model_from_app(request)
+    set_attr("item_id", ad.item_id)
 
     try:
         features = prepare_features(ad)
 
-        logger.info(
-            "Request: seller_id=%s, item_id=%s, features=%s",
-            ad.seller_id,
-            ad.item_id,
-            features.tolist(),
-        )
+        log_request = request_log.enabled()
+        if log_request:
+            request_log.log(
+                "Request: seller_id=%s, item_id=%s, features=%s",
+                ad.seller_id,
+                ad.item_id,
+                features.tolist(),
+            )
 
-        probability = float(model.predict_proba(features)[0][1])
+        with stage("model"):
+            probability = float(model.predict_proba(features)[0][1])
         is_violation = probability > 0.5
+        _submit_shadow(request, ad.item_id, features, probability)
 
-        logger.info(
-            "Result: is_violation=%s, probability=%s",
-            is_violation,
-            probability,
-        )
+        if log_request:
+            request_log.log(
+                "Result: is_violation=%s, probability=%s",
+                is_violation,
+                probability,
+            )
 
-        return PredictResponse(
-            is_violation=is_violation,
-            probability=probability,
-        )
+        return JSONBytesResponse(encode_prediction(is_violation, probability))
 
     except Exception as e:
+        logger.exception("Predict failed: item_id=%s", ad.item_id)
         raise HTTPException(
             status_code=500,
             detail=f"Внутренняя ошибка сервера: {str(e)}",
@@ -84,52 +123,74 @@ async def simple_predict(
     payload: SimplePredictRequest,
     request: Request,
     _current_account: Annotated[Account, Depends(get_current_account)],
+    _rate_limit: Annotated[None, Depends(rate_limit("simple_predict"))],
 ):
-    redis_client = RedisClient.get_client()
-    cache_repo = PredictionCacheRepository(redis_client)
+    set_attr("item_id", payload.item_id)
+    cache_repo = _prediction_cache(request)
 
-    cached_result = await cache_repo.get_prediction(payload.item_id)
-    if cached_result:
-        logger.info("Cache hit for item_id=%s", payload.item_id)
-        return PredictResponse(**cached_result)
+    with stage("cache_get"):
+        try:
+            cached_body = await cache_repo.get_prediction_raw(payload.item_id)
+        except RedisError:
+            # недоступный кэш — это промах, а не ошибка запроса
+            logger.warning("Prediction cache read failed: item_id=%s", payload.item_id, exc_info=True)
+            cached_body = None
+    if cached_body:
+        if request_log.enabled():
+            request_log.log("Cache hit for item_id=%s", payload.item_id)
+        # в кэше лежит готовое тело ответа
+        return JSONBytesResponse(cached_body)
+
+    negative_cache = NegativeCacheRepository(RedisClient.get_binary_client())
+    with stage("negative_cache_get"):
+        missing_reason = await negative_cache.get_reason(payload.item_id)
+    if missing_reason is not None:
+        raise _not_found(missing_reason)
 
     model = _get_model_from_app(request)
 
-    async with get_connection() as conn:
-        ad_repo = AdRepository(conn)
-        user_repo = UserRepository(conn)
-        
-        ad = await ad_repo.get(payload.item_id)
-        if ad is None:
-            raise HTTPException(status_code=404, detail="Объявление не найдено")
-
-        user = await user_repo.get(ad.seller_id)
-        if user is None:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-        ad_request = AdRequest(
-            seller_id=user.id,
-            is_verified_seller=user.is_verified_seller,
-            item_id=ad.id,
-            name=ad.title,
-            description=ad.description,
-            category=ad.category,
-            images_qty=ad.images_qty,
-        )
+    # промах кэша идет в БД: дальше запрос учитывается в лимите db, а не cache
+    await reclassify("db")
+
+    user = None
+    async with get_connection(readonly=True) as conn:
+        with stage("db_ad"):
+            ad = await AdRepository(conn).get(payload.item_id)
+        if ad is not None:
+            with stage("db_user"):
+                user = await UserRepository(conn).get(ad.seller_id)
+
+    if ad is None or user is None:
+        reason = NegativeCacheRepository.AD_NOT_FOUND if ad is None else NegativeCacheRepository.SELLER_NOT_FOUND
+        await negative_cache.mark_missing(payload.item_id, reason)
+        raise _not_found(reason)
+
+    ad_request = AdRequest(
+        seller_id=user.id,
+        is_verified_seller=user.is_verified_seller,
+        item_id=ad.id,
+        name=ad.title,
+        description=ad.description,
+        category=ad.category,
+        images_qty=ad.images_qty,
+    )
 
-        try:
-            features = prepare_features(ad_request)
+    try:
+        features = prepare_features(ad_request)
+        with stage("model"):
             probability_val = float(model.predict_proba(features)[0][1])
-            is_violation_val = probability_val > 0.5
-            
-            result_data = {
-                "is_violation": is_violation_val,
-                "probability": probability_val,
-            }
-
-            await cache_repo.set_prediction(payload.item_id, result_data)
-
-            logger.info(
+        is_violation_val = probability_val > 0.5
+        _submit_shadow(request, ad.id, features, probability_val)
+        body = encode_prediction(is_violation_val, probability_val)
+
+        with stage("cache_set"):
+            try:
+                await cache_repo.set_prediction_raw(payload.item_id, body)
+            except RedisError:
+                logger.warning("Prediction cache write failed: item_id=%s", payload.item_id, exc_info=True)
+
+        if request_log.enabled():
+            request_log.log(
                 "Simple predict: item_id=%s, seller_id=%s, is_violation=%s, probability=%s",
                 ad.id,
                 user.id,
@@ -137,70 +198,146 @@ async def simple_predict(
                 probability_val,
             )
 
-            return PredictResponse(**result_data)
+        return JSONBytesResponse(body)
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Внутренняя ошибка сервера: {str(e)}",
-            )
+    except Exception as e:
+        logger.exception("Simple predict failed: item_id=%s", payload.item_id)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Внутренняя ошибка сервера: {str(e)}",
+        )
+
+
+_NOT_FOUND_DETAILS = {
+    NegativeCacheRepository.AD_NOT_FOUND: "Объявление не найдено",
+    NegativeCacheRepository.SELLER_NOT_FOUND: "Пользователь не найден",
+}
+
+
+def _not_found(reason: str) -> HTTPException:
+    return HTTPException(status_code=404, detail=_NOT_FOUND_DETAILS[reason])
 
 
 @router.post("/async_predict", response_model=AsyncPredictResponse)
 async def async_predict(
     payload: AsyncPredictRequest,
-    request: Request,
     _current_account: Annotated[Account, Depends(get_current_account)],
+    _rate_limit: Annotated[None, Depends(rate_limit("async_predict"))],
+    idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key", max_length=255)] = None,
 ):
+    set_attr("item_id", payload.item_id)
+    negative_cache = NegativeCacheRepository(RedisClient.get_binary_client())
+    with stage("negative_cache_get"):
+        missing_reason = await negative_cache.get_reason(payload.item_id)
+    if missing_reason is not None:
+        # задача все равно завершилась бы ошибкой в воркере
+        raise _not_found(missing_reason)
+
     async with get_connection() as conn:
         ad_repo = AdRepository(conn)
         mod_repo = ModerationResultRepository(conn)
 
-        ad = await ad_repo.get(payload.item_id)
+        if idempotency_key is not None:
+            with stage("db_idempotency"):
+                existing = await mod_repo.get_by_idempotency_key(idempotency_key)
+            if existing is not None:
+                if existing.item_id != payload.item_id:
+                    raise _idempotency_conflict()
+                return _existing_task_response(existing)
+
+        with stage("db_ad"):
+            ad = await ad_repo.get(payload.item_id)
         if ad is None:
-            raise HTTPException(status_code=404, detail="Объявление не найдено")
+            await negative_cache.mark_missing(payload.item_id, NegativeCacheRepository.AD_NOT_FOUND)
+            raise _not_found(NegativeCacheRepository.AD_NOT_FOUND)
+
+        if ASYNC_PREDICT_REUSE_SECONDS > 0:
+            with stage("db_recent_result"):
+                recent = await mod_repo.get_latest_completed(ad.id, max_age_seconds=ASYNC_PREDICT_REUSE_SECONDS)
+            if recent is not None:
+                return _existing_task_response(recent)
+
+        # задача и сообщение для Kafka пишутся одной транзакцией, отправляет их OutboxRelay
+        with stage("db_create_task"):
+            async with conn.transaction():
+                moderation_result, created = await mod_repo.get_or_create_pending(
+                    item_id=ad.id,
+                    idempotency_key=idempotency_key,
+                    pending_timeout_seconds=ASYNC_PREDICT_PENDING_TIMEOUT_SECONDS,
+                )
+                if created:
+                    await ModerationOutboxRepository(conn).add(
+                        task_id=moderation_result.id,
+                        item_id=moderation_result.item_id,
+                        task_created_at=moderation_result.created_at,
+                    )
+
+    if not created:
+        # ключ мог занять параллельный запрос с другим объявлением
+        if moderation_result.item_id != payload.item_id:
+            raise _idempotency_conflict()
+        return _existing_task_response(moderation_result)
 
-        moderation_result = await mod_repo.create_pending(item_id=ad.id)
+    return AsyncPredictResponse(
+        task_id=encode_task_id(moderation_result.id, moderation_result.created_at),
+        status=moderation_result.status,
+        message="Запрос на модерацию принят",
+    )
 
-    kafka_client = getattr(request.app.state, "kafka_client", None)
-    if kafka_client is None:
-        raise HTTPException(status_code=503, detail="Продюсер Kafka недоступен")
 
-    await kafka_client.send_moderation_request(
-        item_id=moderation_result.item_id,
-        task_id=moderation_result.id,
+def _idempotency_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Idempotency-Key уже использован для другого объявления",
     )
 
+
+def _existing_task_response(result: ModerationResult) -> AsyncPredictResponse:
+    if result.status == "completed":
+        message = "Результат модерации уже готов"
+    elif result.status == "pending":
+        message = "Задача модерации уже в обработке"
+    else:
+        message = "Задача модерации уже была обработана"
     return AsyncPredictResponse(
-        task_id=moderation_result.id,
-        status=moderation_result.status,
-        message="Запрос на модерацию принят",
+        task_id=encode_task_id(result.id, result.created_at),
+        status=result.status,
+        message=message,
+        is_violation=result.is_violation,
+        probability=result.probability,
     )
 
 
 @router.get("/moderation_result/{task_id}", response_model=ModerationStatusResponse)
 async def get_moderation_result(
     task_id: int,
+    request: Request,
     _current_account: Annotated[Account, Depends(get_current_account)],
 ):
-    async with get_connection() as conn:
-        repo = ModerationResultRepository(conn)
-        result = await repo.get(task_id)
+    # в task_id закодирован месяц создания: запрос идет только в его секцию
+    try:
+        db_task_id, created_at = decode_task_id(task_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Задача модерации не найдена")
+    async with get_connection(readonly=True) as conn:
+        result = await ModerationResultRepository(conn).get(db_task_id, created_at)
+
+    if result is None and replicas_configured():
+        # задача могла только что создаться и еще не доехать до реплики
+        async with get_connection() as conn:
+            result = await ModerationResultRepository(conn).get(db_task_id, created_at)
 
     if result is None:
         raise HTTPException(status_code=404, detail="Задача модерации не найдена")
 
     if result.status == "completed":
-        redis_client = RedisClient.get_client()
-        cache_repo = PredictionCacheRepository(redis_client)
-        cached_data = {
-            "is_violation": result.is_violation,
-            "probability": result.probability
-        }
-        await cache_repo.set_prediction(result.item_id, cached_data)
+        await _prediction_cache(request).set_prediction_raw(
+            result.item_id,
+            encode_prediction(result.is_violation, result.probability),
+        )
 
     return ModerationStatusResponse(
-        task_id=result.id,
+        task_id=encode_task_id(result.id, result.created_at),
         status=result.status,
         is_violation=result.is_violation,
         probability=result.probability,
@@ -210,6 +347,7 @@ async def get_moderation_result(
 @router.post("/close")
 async def close(
     item_id: int,
+    request: Request,
     _current_account: Annotated[Account, Depends(get_current_account)],
 ):
     async with get_connection() as conn:
@@ -224,8 +362,36 @@ async def close(
         
         await mod_repo.delete_by_item_id(item_id)
         
-    redis_client = RedisClient.get_client()
-    cache_repo = PredictionCacheRepository(redis_client)
-    await cache_repo.delete_prediction(item_id)
+    await _prediction_cache(request).delete_prediction(item_id)
     
     return {"message": "Объявление успешно закрыто"}
+
+
+@router.post("/close_many", response_model=CloseManyResponse)
+async def close_many(
+    payload: CloseManyRequest,
+    request: Request,
+    _current_account: Annotated[Account, Depends(get_current_account)],
+):
+    item_ids = list(dict.fromkeys(payload.item_ids))
+
+    async with get_connection() as conn:
+        ad_repo = AdRepository(conn)
+        mod_repo = ModerationResultRepository(conn)
+
+        async with conn.transaction():
+            with stage("db_close"):
+                closed_ids = await ad_repo.close_many(item_ids)
+            if closed_ids:
+                with stage("db_delete_results"):
+                    await mod_repo.delete_by_item_ids(closed_ids)
+
+    if closed_ids:
+        with stage("cache_delete"):
+            await _prediction_cache(request).delete_predictions(closed_ids)
+
+    closed = set(closed_ids)
+    return CloseManyResponse(
+        closed=[item_id for item_id in item_ids if item_id in closed],
+        not_found=[item_id for item_id in item_ids if item_id not in closed],
+    )
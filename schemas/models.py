@@ -29,6 +29,8 @@ class AsyncPredictResponse(BaseModel):
     task_id: int
     status: str
     message: str
+    is_violation: Optional[bool] = None
+    probability: Optional[float] = None
 
 
 class ModerationStatusResponse(BaseModel):
@@ -38,6 +40,19 @@ class ModerationStatusResponse(BaseModel):
     probability: Optional[float] = None
 
 
+class CloseManyRequest(BaseModel):
+    item_ids: list[int] = Field(
+        min_length=1,
+        max_length=10_000,
+        description="Идентификаторы объявлений для закрытия",
+    )
+
+
+class CloseManyResponse(BaseModel):
+    closed: list[int]
+    not_found: list[int]
+
+
 class LoginRequest(BaseModel):
     login: str
     password: str
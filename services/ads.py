@@ -0,0 +1,29 @@
+from redis.asyncio import Redis
+
+from db import get_connection
+from repositories.ads import Ad, AdRepository
+from repositories.negative_cache import NegativeCacheRepository
+
+
+async def create_ad(
+    redis_client: Redis,
+    *,
+    seller_id: int,
+    title: str,
+    description: str,
+    category: int,
+    images_qty: int,
+) -> Ad:
+    """Создает объявление и сбрасывает закэшированный отказ «объявления нет» по его id."""
+    async with get_connection() as conn:
+        async with conn.transaction():
+            ad = await AdRepository(conn).create(
+                seller_id=seller_id,
+                title=title,
+                description=description,
+                category=category,
+                images_qty=images_qty,
+            )
+    # только после коммита: запрос, который еще не видит строку, иначе закэшировал бы отказ заново
+    await NegativeCacheRepository(redis_client).invalidate(ad.id)
+    return ad
@@ -1,5 +1,8 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 import jwt
 
@@ -22,6 +25,62 @@ class InvalidTokenError(AuthError):
     pass
 
 
+class VerifiedTokenCache:
+    """
+    Ограниченный LRU-кэш уже проверенных JWT: sha256 токена -> claims.
+
+    Запись живет до exp токена, срок проверяется на каждом попадании.
+    При смене секрета или алгоритма кэш очищается.
+    Claims хранятся и отдаются копиями: изменения у одного вызывающего не видны следующим запросам.
+    """
+
+    def __init__(self, max_size: int = 10_000, clock: Callable[[], float] = time.time) -> None:
+        self._max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict[bytes, tuple[dict[str, Any], float]] = OrderedDict()
+        self._signing_params: Optional[tuple[str, str]] = None
+
+    def bind(self, secret_key: str, algorithm: str) -> None:
+        params = (secret_key, algorithm)
+        if self._signing_params != params:
+            self._entries.clear()
+            self._signing_params = params
+
+    def get(self, token: str) -> Optional[dict[str, Any]]:
+        key = self._digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        claims, expires_at = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return dict(claims)
+
+    def put(self, token: str, claims: dict[str, Any]) -> None:
+        expires_at = claims.get("exp")
+        # без exp кэшировать нельзя, nbf проверяем только через полный decode
+        if not isinstance(expires_at, (int, float)) or "nbf" in claims:
+            return
+
+        self._entries[self._digest(token)] = (dict(claims), float(expires_at))
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+
 class AuthService:
     def __init__(
         self,
@@ -30,11 +89,15 @@ class AuthService:
         secret_key: str,
         algorithm: str = "HS256",
         token_ttl_seconds: int = 3600,
+        token_cache: Optional[VerifiedTokenCache] = None,
     ) -> None:
         self._account_repo = account_repo
         self._secret_key = secret_key
         self._algorithm = algorithm
         self._token_ttl_seconds = token_ttl_seconds
+        self._token_cache = token_cache
+        if token_cache is not None:
+            token_cache.bind(secret_key, algorithm)
 
     async def login(self, login: str, password: str) -> str:
         account = await self._account_repo.get_by_login_password(login=login, password=password)
@@ -57,11 +120,20 @@ class AuthService:
         return jwt.encode(payload, self._secret_key, algorithm=self._algorithm)
 
     def decode_token(self, token: str) -> dict[str, Any]:
+        if self._token_cache is not None:
+            cached = self._token_cache.get(token)
+            if cached is not None:
+                return cached
+
         try:
-            return jwt.decode(token, self._secret_key, algorithms=[self._algorithm])
+            payload = jwt.decode(token, self._secret_key, algorithms=[self._algorithm])
         except jwt.PyJWTError as exc:
             raise InvalidTokenError("Недействительный токен") from exc
 
+        if self._token_cache is not None:
+            self._token_cache.put(token, payload)
+        return payload
+
     async def get_account_from_token(self, token: str) -> Account:
         payload = self.decode_token(token)
         sub: Optional[str] = payload.get("sub")
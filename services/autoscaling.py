@@ -0,0 +1,65 @@
+"""
+Рекомендуемое число воркеров модерации.
+
+Нужная пропускная способность — поток новых задач плюс разбор накопившегося бэклога
+за AUTOSCALE_TARGET_DRAIN_SECONDS. Поток оценивается суммарной скоростью обработки воркеров
+(при растущем бэклоге он выше, это добирает второе слагаемое), бэклог — счетчиком pending-задач
+из БД. Делится на потолок одного воркера (1 / время обработки сообщения) с запасом
+AUTOSCALE_TARGET_UTILIZATION. Воркеров больше, чем партиций, не рекомендуется: лишние будут простаивать.
+"""
+import math
+import os
+from typing import Any, Optional
+
+
+AUTOSCALE_MIN_WORKERS = int(os.getenv("AUTOSCALE_MIN_WORKERS", "1"))
+AUTOSCALE_MAX_WORKERS = int(os.getenv("AUTOSCALE_MAX_WORKERS", "32"))
+AUTOSCALE_TARGET_DRAIN_SECONDS = float(os.getenv("AUTOSCALE_TARGET_DRAIN_SECONDS", "60"))
+AUTOSCALE_TARGET_UTILIZATION = float(os.getenv("AUTOSCALE_TARGET_UTILIZATION", "0.7"))
+# снимки старше этого считаются снимками упавших воркеров
+AUTOSCALE_WORKER_STALE_SECONDS = float(os.getenv("AUTOSCALE_WORKER_STALE_SECONDS", "30"))
+
+
+def recommend_workers(
+    *,
+    pending: int,
+    arrival_rps: float,
+    capacity_rps_per_worker: Optional[float],
+    current_workers: int,
+    partitions: Optional[int] = None,
+    min_workers: int = AUTOSCALE_MIN_WORKERS,
+    max_workers: int = AUTOSCALE_MAX_WORKERS,
+    target_drain_seconds: float = AUTOSCALE_TARGET_DRAIN_SECONDS,
+    target_utilization: float = AUTOSCALE_TARGET_UTILIZATION,
+) -> int:
+    upper = min(max_workers, partitions) if partitions else max_workers
+    if not capacity_rps_per_worker:
+        # потолок воркера еще не измерен: держим текущее число, но не ноль при бэклоге
+        needed = max(current_workers, 1 if pending > 0 else 0)
+    else:
+        required_rps = arrival_rps + pending / target_drain_seconds
+        needed = math.ceil(required_rps / (capacity_rps_per_worker * target_utilization))
+    return max(min_workers, min(upper, needed))
+
+
+def fleet_summary(snapshots: dict[str, dict[str, Any]], pending: int, oldest_pending_age: Optional[float]) -> dict[str, Any]:
+    capacities = sorted(s["capacity_rps"] for s in snapshots.values() if s.get("capacity_rps"))
+    partitions = {name for s in snapshots.values() for name in s.get("lag", {})}
+    arrival_rps = sum(s.get("processing_rps", 0.0) for s in snapshots.values())
+    capacity = capacities[len(capacities) // 2] if capacities else None
+    return {
+        "pending": pending,
+        "oldest_pending_age_seconds": round(oldest_pending_age, 3) if oldest_pending_age is not None else None,
+        "kafka_lag": sum(s.get("total_lag", 0) for s in snapshots.values()),
+        "processing_rps": round(arrival_rps, 3),
+        "capacity_rps_per_worker": capacity,
+        "current_workers": len(snapshots),
+        "recommended_workers": recommend_workers(
+            pending=pending,
+            arrival_rps=arrival_rps,
+            capacity_rps_per_worker=capacity,
+            current_workers=len(snapshots),
+            partitions=len(partitions) or None,
+        ),
+        "workers": snapshots,
+    }
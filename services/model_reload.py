@@ -0,0 +1,53 @@
+"""
+Перезагрузка модели из файла без перезапуска процесса.
+
+Пока модель читается с диска, readiness процесса падает и балансировщик уводит с него
+трафик; запросы, которые все же пришли, обслуживает старая модель. Замена атомарна:
+обработчики берут модель из app.state на каждый запрос.
+
+Версия после перезагрузки — всегда хэш файла: MODEL_VERSION описывает файл, с которым
+процесс стартовал, и с ним неймспейс кэша не сменился бы, а кэш отдавал бы ответы старой модели.
+Под app.server модель есть в каждом воркере: перезагрузку по SIGHUP рассылает родитель.
+"""
+import asyncio
+import dataclasses
+import logging
+import os
+from typing import Any
+
+from model import MODEL_PATH, load_model, model_file_version
+
+
+logger = logging.getLogger(__name__)
+
+# логины аккаунтов, которым разрешен POST /debug/reload_model; пусто — никому
+MODEL_RELOAD_ACCOUNTS = frozenset(
+    login.strip() for login in os.getenv("MODEL_RELOAD_ACCOUNTS", "").split(",") if login.strip()
+)
+
+_reload_lock = asyncio.Lock()
+
+
+async def reload_model(app: Any, path: str = MODEL_PATH) -> str:
+    """Загружает модель в потоке и подменяет app.state.model; возвращает новую версию."""
+    monitor = getattr(app.state, "health_monitor", None)
+    async with _reload_lock:
+        if monitor is not None:
+            with monitor.model_reloading():
+                model, version = await asyncio.to_thread(_load, path)
+        else:
+            model, version = await asyncio.to_thread(_load, path)
+
+        previous_version = getattr(app.state, "model_version", None)
+        app.state.model = model
+        app.state.model_version = version
+        namespace = getattr(app.state, "prediction_cache_namespace", None)
+        if namespace is not None and namespace.version != version:
+            # кэш предсказаний старой модели перестает читаться, fallback остается как был настроен
+            app.state.prediction_cache_namespace = dataclasses.replace(namespace, version=version)
+    logger.info("Model reloaded: %s -> %s", previous_version, version)
+    return version
+
+
+def _load(path: str) -> tuple[Any, str]:
+    return load_model(path), model_file_version(path)
@@ -15,4 +15,38 @@ def prepare_features(ad: AdRequest) -> np.ndarray:
 
     features = np.array([[is_verified, images_qty_norm, description_len_norm, category_norm]])
 
-    return features
\ No newline at end of file
+    return features
+
+
+def prepare_features_batch(
+    is_verified_seller: np.ndarray,
+    images_qty: np.ndarray,
+    description_len: np.ndarray,
+    category: np.ndarray,
+) -> np.ndarray:
+    """Векторный вариант prepare_features для пачки объявлений: те же признаки, одна матрица."""
+    images_qty = np.asarray(images_qty, dtype=np.float64)
+    category = np.asarray(category, dtype=np.float64)
+    if (images_qty < 0).any():
+        raise ValueError("images_qty не может быть отрицательным")
+    if (category < 0).any():
+        raise ValueError("category не может быть отрицательным")
+
+    return np.column_stack(
+        (
+            np.asarray(is_verified_seller, dtype=np.float64),
+            np.minimum(images_qty, 10) / 10.0,
+            np.asarray(description_len, dtype=np.float64) / 1000.0,
+            category / 100.0,
+        )
+    )
+
+
+def predict_proba_rows(model, rows) -> tuple[list[int], list[float]]:
+    """
+    Вероятности нарушения для пачки строк (id, is_verified_seller, images_qty, description_len, category).
+    Один вызов модели на всю пачку.
+    """
+    ids, is_verified_seller, images_qty, description_len, category = zip(*rows)
+    features = prepare_features_batch(is_verified_seller, images_qty, description_len, category)
+    return list(ids), model.predict_proba(features)[:, 1].tolist()
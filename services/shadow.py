@@ -0,0 +1,161 @@
+"""
+Теневой скоринг модели-кандидата на живом трафике.
+
+Запрос отдает ответ основной модели сразу, а в ShadowScorer только кладет вектор признаков
+(с сэмплированием) в ограниченную очередь. Фоновая задача забирает пачки и скорит их кандидатом
+в отдельном потоке. Переполненная очередь теряет теневую работу, а не тормозит запросы.
+Расхождения пишутся в append-only JSONL, у каждого процесса свой файл: pre-fork воркеры
+app.server иначе дописывали бы пачки в один файл, и строки разных процессов перемешивались бы.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# путь к модели-кандидату; пусто — теневой скоринг выключен
+SHADOW_MODEL_PATH = os.getenv("SHADOW_MODEL_PATH", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "10000"))
+SHADOW_BATCH_SIZE = int(os.getenv("SHADOW_BATCH_SIZE", "256"))
+SHADOW_FLUSH_INTERVAL_SECONDS = float(os.getenv("SHADOW_FLUSH_INTERVAL_SECONDS", "1.0"))
+# к имени добавляется pid процесса: shadow_scores.<pid>.jsonl
+SHADOW_LOG_PATH = os.getenv("SHADOW_LOG_PATH", "shadow_scores.jsonl")
+
+VIOLATION_THRESHOLD = 0.5
+
+
+class ShadowScorer:
+    def __init__(
+        self,
+        model,
+        log_path: Path,
+        *,
+        model_version: str = "",
+        sample_rate: float = SHADOW_SAMPLE_RATE,
+        queue_size: int = SHADOW_QUEUE_SIZE,
+        batch_size: int = SHADOW_BATCH_SIZE,
+        flush_interval: float = SHADOW_FLUSH_INTERVAL_SECONDS,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self._model = model
+        self._log_path = log_path
+        self._model_version = model_version
+        self._sample_rate = sample_rate
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._rng = rng
+        self._queue: asyncio.Queue[tuple[int, np.ndarray, float]] = asyncio.Queue(maxsize=queue_size)
+
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.disagreements = 0
+        self.abs_delta_sum = 0.0
+
+    def submit(self, item_id: int, features: np.ndarray, primary_probability: float) -> None:
+        """Вызывается из обработчика запроса: без await и без ожидания места в очереди."""
+        if self._rng() >= self._sample_rate:
+            return
+        try:
+            self._queue.put_nowait((item_id, features, primary_probability))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self.submitted += 1
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            batch = await self._next_batch()
+            if batch:
+                await self._score(batch)
+        # при остановке досчитываем то, что уже в очереди
+        while not self._queue.empty():
+            await self._score(self._drain(self._batch_size))
+
+    async def _next_batch(self) -> list[tuple[int, np.ndarray, float]]:
+        try:
+            first = await asyncio.wait_for(self._queue.get(), timeout=self._flush_interval)
+        except asyncio.TimeoutError:
+            return []
+        return [first, *self._drain(self._batch_size - 1)]
+
+    def _drain(self, limit: int) -> list[tuple[int, np.ndarray, float]]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _score(self, batch: list[tuple[int, np.ndarray, float]]) -> None:
+        try:
+            await asyncio.to_thread(self._score_and_log, batch)
+        except Exception:
+            logger.exception("Shadow scoring failed for %s items", len(batch))
+
+    def _score_and_log(self, batch: list[tuple[int, np.ndarray, float]]) -> None:
+        features = np.vstack([item_features for _, item_features, _ in batch])
+        shadow_probabilities = self._model.predict_proba(features)[:, 1].tolist()
+        ts = round(time.time(), 3)
+
+        lines = []
+        for (item_id, _, primary), shadow in zip(batch, shadow_probabilities):
+            delta = shadow - primary
+            disagree = (shadow > VIOLATION_THRESHOLD) != (primary > VIOLATION_THRESHOLD)
+            self.abs_delta_sum += abs(delta)
+            self.disagreements += disagree
+            lines.append(
+                json.dumps(
+                    {
+                        "ts": ts,
+                        "item_id": item_id,
+                        "primary": round(primary, 6),
+                        "shadow": round(shadow, 6),
+                        "delta": round(delta, 6),
+                        "disagree": disagree,
+                        "version": self._model_version,
+                    },
+                    separators=(",", ":"),
+                )
+            )
+        self.scored += len(batch)
+
+        with self._log_path.open("a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "model_version": self._model_version,
+            "sample_rate": self._sample_rate,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "scored": self.scored,
+            "disagreements": self.disagreements,
+            "disagreement_rate": self.disagreements / self.scored if self.scored else None,
+            "mean_abs_delta": self.abs_delta_sum / self.scored if self.scored else None,
+        }
+
+
+def process_log_path(path: Path, pid: int) -> Path:
+    return path.with_name(f"{path.stem}.{pid}{path.suffix}")
+
+
+def create_shadow_scorer() -> Optional[ShadowScorer]:
+    if not SHADOW_MODEL_PATH:
+        return None
+
+    from model import get_model_version, load_model
+
+    return ShadowScorer(
+        load_model(SHADOW_MODEL_PATH),
+        process_log_path(Path(SHADOW_LOG_PATH), os.getpid()),
+        model_version=get_model_version(SHADOW_MODEL_PATH),
+    )
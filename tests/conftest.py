@@ -29,7 +29,9 @@ def _stub_lifespan_dependencies(monkeypatch):
     monkeypatch.setattr("main.close_db", _noop_async)
     monkeypatch.setattr("main.KafkaModerationClient", _FakeKafkaClient)
     monkeypatch.setattr("main.get_or_train_model", lambda: MagicMock())
+    monkeypatch.setattr("main.OUTBOX_RELAY_ENABLED", False)
     monkeypatch.setattr("app.clients.redis.RedisClient.get_client", lambda: MagicMock())
+    monkeypatch.setattr("app.clients.redis.RedisClient.get_binary_client", lambda: MagicMock())
     monkeypatch.setattr("app.clients.redis.RedisClient.close", _noop_async)
 
 
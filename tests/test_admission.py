@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.admission import (
+    AdaptiveLimiter,
+    AdmissionController,
+    AdmissionMiddleware,
+    reclassify,
+    route_class_for,
+)
+
+
+def test_route_classes() -> None:
+    assert route_class_for("/simple_predict") == "cache"
+    assert route_class_for("/async_predict") == "async"
+    assert route_class_for("/moderation_result/42") == "db"
+    assert route_class_for("/debug/slow_requests") is None
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_and_hands_over_released_slot() -> None:
+    limiter = AdaptiveLimiter("db", initial_limit=1, min_limit=1, queue_size=1, queue_timeout=1.0)
+
+    assert await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    # очередь на один запрос уже занята
+    assert not await limiter.acquire()
+
+    limiter.release()
+    assert await waiter
+    assert limiter.in_flight == 1
+    assert limiter.stats()["shed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_sheds_after_queue_deadline() -> None:
+    limiter = AdaptiveLimiter("db", initial_limit=1, min_limit=1, queue_size=10, queue_timeout=0.01)
+
+    assert await limiter.acquire()
+    assert not await limiter.acquire()
+    assert limiter.stats()["waiting"] == 0
+
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+def test_limit_backs_off_once_per_slow_round_trip() -> None:
+    now = [0.0]
+    limiter = AdaptiveLimiter("db", initial_limit=20, target_latency=0.1, min_limit=2, clock=lambda: now[0])
+
+    # волна медленных ответов, завершившихся почти одновременно, снижает лимит один раз
+    for _ in range(10):
+        limiter.in_flight = 10
+        limiter.release(0.5)
+    assert limiter.limit == pytest.approx(18)
+
+    now[0] += 0.5
+    limiter.in_flight = 10
+    limiter.release(0.5)
+    assert limiter.limit == pytest.approx(16.2)
+
+
+def test_limit_grows_only_when_used() -> None:
+    limiter = AdaptiveLimiter("db", initial_limit=10, target_latency=0.1)
+
+    for _ in range(20):
+        limiter.in_flight = 2
+        limiter.release(0.01)
+    assert limiter.limit == 10
+
+    for _ in range(20):
+        limiter.in_flight = 8
+        limiter.release(0.01)
+    assert 11 < limiter.limit < 13
+
+
+def _make_app(controller: AdmissionController) -> FastAPI:
+    test_app = FastAPI()
+    test_app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @test_app.post("/simple_predict")
+    async def simple_predict():
+        await reclassify("db", controller)
+        return {"ok": True}
+
+    return test_app
+
+
+def test_middleware_sheds_with_retry_after() -> None:
+    controller = AdmissionController(
+        {
+            "cache": AdaptiveLimiter("cache", initial_limit=10),
+            "db": AdaptiveLimiter("db", initial_limit=1, min_limit=1, queue_timeout=0),
+        }
+    )
+    # слот db занят другим запросом
+    controller.limiters["db"].in_flight = 1
+
+    with TestClient(_make_app(controller)) as c:
+        response = c.post("/simple_predict")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert controller.limiters["cache"].in_flight == 0
+
+
+def test_middleware_releases_reclassified_slot() -> None:
+    controller = AdmissionController(
+        {
+            "cache": AdaptiveLimiter("cache", initial_limit=10),
+            "db": AdaptiveLimiter("db", initial_limit=10),
+        }
+    )
+
+    with TestClient(_make_app(controller)) as c:
+        response = c.post("/simple_predict")
+
+    assert response.status_code == 200
+    assert controller.limiters["cache"].in_flight == 0
+    assert controller.limiters["db"].in_flight == 0
+    assert controller.limiters["db"].admitted == 1
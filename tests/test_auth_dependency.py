@@ -54,3 +54,35 @@ async def test_get_current_account_raises_for_invalid_token_or_blocked(error: Ex
         await get_current_account(access_token="token", auth_service=auth_service)
 
     assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_pooled_account_repository_releases_connection_after_each_call(monkeypatch) -> None:
+    from contextlib import asynccontextmanager
+
+    import dependencies.auth as auth_module
+
+    checked_out = []
+
+    @asynccontextmanager
+    async def fake_get_connection(readonly: bool = False):
+        checked_out.append(readonly)
+        yield object()
+        checked_out.pop()
+
+    class FakeAccountRepository:
+        def __init__(self, conn) -> None:
+            pass
+
+        async def get_by_id(self, account_id: int) -> Account:
+            assert checked_out == [True]
+            return Account(id=account_id, login="u", password="p", is_blocked=False)
+
+    monkeypatch.setattr(auth_module, "get_connection", fake_get_connection)
+    monkeypatch.setattr(auth_module, "AccountRepository", FakeAccountRepository)
+
+    account = await auth_module.PooledAccountRepository().get_by_id(5)
+
+    assert account.id == 5
+    # соединение не удерживается до конца обработки HTTP-запроса
+    assert checked_out == []
@@ -2,11 +2,13 @@ import pytest
 from typing import Optional
 
 from repositories.accounts import Account
+import services.auth
 from services.auth import (
     AccountBlockedError,
     AuthService,
     InvalidCredentialsError,
     InvalidTokenError,
+    VerifiedTokenCache,
 )
 
 
@@ -88,3 +90,86 @@ def test_decode_token_raises_for_invalid_token() -> None:
 
     with pytest.raises(InvalidTokenError):
         service.decode_token("invalid.token.value")
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _count_jwt_decode(monkeypatch) -> list[str]:
+    calls: list[str] = []
+    original = services.auth.jwt.decode
+
+    def counting_decode(token, *args, **kwargs):
+        calls.append(token)
+        return original(token, *args, **kwargs)
+
+    monkeypatch.setattr(services.auth.jwt, "decode", counting_decode)
+    return calls
+
+
+def test_decode_token_uses_verified_token_cache(monkeypatch) -> None:
+    calls = _count_jwt_decode(monkeypatch)
+    cache = VerifiedTokenCache()
+    service = AuthService(FakeAccountRepo(), secret_key="test-secret", token_cache=cache)
+    token = service.issue_token(Account(id=1, login="u", password="p", is_blocked=False))
+
+    first = service.decode_token(token)
+    second = service.decode_token(token)
+
+    assert first == second
+    assert first["sub"] == "1"
+    assert len(calls) == 1
+
+
+def test_verified_token_cache_does_not_share_claims_between_callers(monkeypatch) -> None:
+    _count_jwt_decode(monkeypatch)
+    service = AuthService(FakeAccountRepo(), secret_key="test-secret", token_cache=VerifiedTokenCache())
+    token = service.issue_token(Account(id=1, login="u", password="p", is_blocked=False))
+
+    service.decode_token(token)["sub"] = "2"
+    service.decode_token(token)["sub"] = "3"
+
+    assert service.decode_token(token)["sub"] == "1"
+
+
+def test_verified_token_cache_enforces_expiry_on_hit() -> None:
+    clock = FakeClock(1000.0)
+    cache = VerifiedTokenCache(clock=clock)
+    cache.put("token", {"sub": "1", "exp": 1010})
+
+    assert cache.get("token") is not None
+
+    clock.now = 1010.0
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_verified_token_cache_is_cleared_on_secret_rotation(monkeypatch) -> None:
+    calls = _count_jwt_decode(monkeypatch)
+    cache = VerifiedTokenCache()
+    old_service = AuthService(FakeAccountRepo(), secret_key="old-secret", token_cache=cache)
+    token = old_service.issue_token(Account(id=1, login="u", password="p", is_blocked=False))
+    old_service.decode_token(token)
+
+    new_service = AuthService(FakeAccountRepo(), secret_key="new-secret", token_cache=cache)
+
+    with pytest.raises(InvalidTokenError):
+        new_service.decode_token(token)
+    assert len(calls) == 2
+
+
+def test_verified_token_cache_evicts_least_recently_used() -> None:
+    cache = VerifiedTokenCache(max_size=2, clock=FakeClock(0.0))
+    cache.put("a", {"exp": 100})
+    cache.put("b", {"exp": 100})
+    cache.get("a")
+    cache.put("c", {"exp": 100})
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
@@ -0,0 +1,63 @@
+import pytest
+
+from app.jobs.cache_warmup import RateLimiter, read_checkpoint, score_batch, write_checkpoint
+from app.responses import encode_prediction
+from model import train_model
+from schemas.models import AdRequest
+from services.moderation import prepare_features, prepare_features_batch
+
+
+def test_batch_scoring_matches_simple_predict_bodies() -> None:
+    model = train_model()
+    rows = [
+        (1, True, 3, 120, 5),
+        (2, False, 0, 4000, 99),
+        (3, False, 15, 10, 0),
+    ]
+
+    bodies = score_batch(model, rows)
+
+    for item_id, is_verified, images_qty, description_len, category in rows:
+        features = prepare_features(
+            AdRequest(
+                seller_id=1,
+                is_verified_seller=is_verified,
+                item_id=item_id,
+                name="ad",
+                description="x" * description_len,
+                category=category,
+                images_qty=images_qty,
+            )
+        )
+        probability = float(model.predict_proba(features)[0][1])
+        assert bodies[item_id] == encode_prediction(probability > 0.5, probability)
+
+
+def test_prepare_features_batch_rejects_negative_values() -> None:
+    with pytest.raises(ValueError):
+        prepare_features_batch([True], [-1], [10], [1])
+
+
+def test_checkpoint_roundtrip(tmp_path) -> None:
+    path = tmp_path / "warmup.checkpoint"
+
+    assert read_checkpoint(path) == 0
+    write_checkpoint(path, 4242)
+    assert read_checkpoint(path) == 4242
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_paces_to_target_rate() -> None:
+    now = [0.0]
+    sleeps = []
+
+    async def fake_sleep(delay: float) -> None:
+        sleeps.append(delay)
+        now[0] += delay
+
+    limiter = RateLimiter(1000, clock=lambda: now[0], sleep=fake_sleep)
+    await limiter.acquire(500)
+    now[0] += 0.1
+    await limiter.acquire(500)
+
+    assert sleeps == pytest.approx([0.5, 0.4])
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from benchmarks.datagen import TABLE_COLUMNS, ChunkTask, generate_chunk, plan_chunks
+
+
+def test_plan_chunks_covers_id_range_without_gaps() -> None:
+    chunks = plan_chunks("users", start_id=2, count=25, chunk_size=10, seed=1)
+
+    assert [(c.start_id, c.count) for c in chunks] == [(2, 10), (12, 10), (22, 5)]
+
+
+def test_generate_chunk_is_deterministic_per_chunk() -> None:
+    task = ChunkTask("ads", start_id=100, count=50, seed=7, params={"seller_ids": range(1, 11)})
+
+    assert generate_chunk(task) == generate_chunk(task)
+    assert generate_chunk(task) != generate_chunk(ChunkTask("ads", 100, 50, 8, task.params))
+
+
+def test_generated_rows_match_columns_and_references() -> None:
+    ads = generate_chunk(ChunkTask("ads", 1, 500, 42, {"seller_ids": range(5, 15)}))
+    results = generate_chunk(
+        ChunkTask(
+            "moderation_results",
+            1,
+            500,
+            42,
+            {"item_ids": range(1, 501), "now": datetime(2026, 10, 1), "history_days": 30},
+        )
+    )
+
+    assert all(len(row) == len(TABLE_COLUMNS["ads"]) for row in ads)
+    assert {row[1] for row in ads} <= set(range(5, 15))
+    assert [row[0] for row in ads] == list(range(1, 501))
+    for task_id, item_id, status, is_violation, probability, _, created_at, processed_at in results:
+        assert 1 <= item_id <= 500
+        assert datetime(2026, 8, 31) < created_at <= datetime(2026, 10, 1)
+        assert (status == "pending") == (processed_at is None)
+        assert (status == "completed") == (probability is not None)
+
+
+def test_items_have_at_most_one_pending_task_across_chunks() -> None:
+    params = {"item_ids": range(1, 101), "now": datetime(2026, 10, 1), "history_days": 30}
+    rows = [
+        row
+        for task in plan_chunks("moderation_results", start_id=1, count=5000, chunk_size=700, seed=3, params=params)
+        for row in generate_chunk(task)
+    ]
+
+    pending_items = [item_id for _, item_id, status, *_ in rows if status == "pending"]
+    assert pending_items
+    assert len(pending_items) == len(set(pending_items))
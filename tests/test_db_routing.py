@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import db
+
+
+class FakePool:
+    def __init__(self, name: str, fail_with: Exception | None = None) -> None:
+        self.name = name
+        self.fail_with = fail_with
+        self.released = 0
+
+    async def acquire(self, timeout=None):
+        if self.fail_with is not None:
+            raise self.fail_with
+        return self.name
+
+    async def release(self, conn) -> None:
+        self.released += 1
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    primary = FakePool("primary")
+    replicas = [db.Replica("r1", 5432, FakePool("r1")), db.Replica("r2", 5432, FakePool("r2"))]
+    monkeypatch.setattr(db, "_pool", primary)
+    monkeypatch.setattr(db, "_replicas", replicas)
+    return primary, replicas
+
+
+async def _use(readonly: bool) -> str:
+    async with db.get_connection(readonly=readonly) as conn:
+        return conn
+
+
+def test_parse_replicas() -> None:
+    replicas = db.parse_replicas("replica-1:5433, replica-2 ,", default_port=5435)
+
+    assert [(r.host, r.port) for r in replicas] == [("replica-1", 5433), ("replica-2", 5435)]
+
+
+@pytest.mark.asyncio
+async def test_readonly_round_robin_and_writes_go_to_primary(pools) -> None:
+    primary, replicas = pools
+
+    served = [await asyncio.create_task(_use(readonly=True)) for _ in range(4)]
+
+    assert sorted(served) == ["r1", "r1", "r2", "r2"]
+    assert await asyncio.create_task(_use(readonly=False)) == "primary"
+    assert replicas[0].pool.released == replicas[1].pool.released == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_replica_is_ejected(pools) -> None:
+    _, replicas = pools
+    replicas[0].pool.fail_with = ConnectionRefusedError()
+
+    served = [await asyncio.create_task(_use(readonly=True)) for _ in range(4)]
+
+    assert served == ["r2"] * 4
+    assert not replicas[0].is_available(0)
+
+
+@pytest.mark.asyncio
+async def test_busy_replica_is_skipped_but_not_ejected(pools) -> None:
+    primary, replicas = pools
+    for replica in replicas:
+        replica.pool.fail_with = asyncio.TimeoutError()
+
+    assert await asyncio.create_task(_use(readonly=True)) == "primary"
+    assert all(replica.ejected_until == 0.0 for replica in replicas)
+
+
+@pytest.mark.asyncio
+async def test_reads_after_write_in_same_context_use_primary(pools) -> None:
+    async def write_then_read() -> str:
+        await _use(readonly=False)
+        return await _use(readonly=True)
+
+    assert await asyncio.create_task(write_then_read()) == "primary"
+    assert await asyncio.create_task(_use(readonly=True)) in {"r1", "r2"}
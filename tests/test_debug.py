@@ -0,0 +1,42 @@
+import signal
+
+import pytest
+from fastapi.testclient import TestClient
+
+import routers.debug as debug_module
+from dependencies.auth import get_current_account
+from main import app
+from repositories.accounts import Account
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.dependency_overrides[get_current_account] = lambda: Account(
+        id=1,
+        login="ops",
+        password="secret",
+        is_blocked=False,
+    )
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+
+def test_reload_model_is_forbidden_for_other_accounts(client, monkeypatch) -> None:
+    monkeypatch.setattr(debug_module, "MODEL_RELOAD_ACCOUNTS", frozenset({"admin"}))
+
+    response = client.post("/debug/reload_model")
+
+    assert response.status_code == 403
+
+
+def test_reload_model_under_prefork_server_is_delegated_to_arbiter(client, monkeypatch) -> None:
+    monkeypatch.setattr(debug_module, "MODEL_RELOAD_ACCOUNTS", frozenset({"ops"}))
+    monkeypatch.setattr(app.state, "arbiter_pid", 4242, raising=False)
+    signalled = []
+    monkeypatch.setattr(debug_module.os, "kill", lambda pid, signum: signalled.append((pid, signum)))
+
+    response = client.post("/debug/reload_model")
+
+    assert response.status_code == 202
+    assert signalled == [(4242, signal.SIGHUP)]
@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.middleware.draining import InFlightMiddleware, InFlightTracker
+
+
+def _make_app(tracker: InFlightTracker, release: asyncio.Event) -> FastAPI:
+    test_app = FastAPI()
+    test_app.add_middleware(InFlightMiddleware, tracker=tracker)
+
+    @test_app.post("/async_predict")
+    async def async_predict():
+        await release.wait()
+        return {"ok": True}
+
+    @test_app.get("/readyz")
+    async def readyz():
+        return {"status": "draining"}
+
+    return test_app
+
+
+async def test_draining_rejects_new_requests_and_waits_for_in_flight() -> None:
+    tracker = InFlightTracker()
+    release = asyncio.Event()
+    transport = httpx.ASGITransport(app=_make_app(tracker, release))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        in_flight_request = asyncio.create_task(client.post("/async_predict"))
+        while tracker.count == 0:
+            await asyncio.sleep(0)
+
+        tracker.start_draining()
+        rejected = await client.post("/async_predict")
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "1"
+        assert (await client.get("/readyz")).status_code == 200
+
+        assert await tracker.wait_idle(0.05) is False
+        release.set()
+        assert await tracker.wait_idle(1.0) is True
+        assert (await in_flight_request).status_code == 200
+    assert tracker.rejected == 1
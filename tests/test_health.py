@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import model as model_module
+import services.model_reload as model_reload_module
+from app.health import HealthMonitor, ProbeFailed
+from main import app
+from model import save_model, train_model
+from repositories.prediction_cache import CacheNamespace
+from services.model_reload import reload_model
+
+
+async def _ok():
+    return None
+
+
+async def _down():
+    raise ProbeFailed("down")
+
+
+async def _hangs():
+    await asyncio.sleep(10)
+
+
+async def test_readiness_reflects_cached_probe_results() -> None:
+    probes = {"db": _ok, "redis": _ok}
+    monitor = HealthMonitor(probes, timeout=0.05)
+    assert monitor.readiness()[0] is False
+
+    await monitor.probe()
+    assert monitor.readiness()[0] is True
+
+    probes["redis"] = _down
+    probes["db"] = _hangs
+    await monitor.probe()
+    ready, body = monitor.readiness()
+    assert ready is False
+    assert b'"redis":{"ok":false,"detail":"down"' in body
+    assert monitor.results["db"].detail == "timeout"
+
+
+async def test_model_reloading_and_stale_results_fail_readiness() -> None:
+    now = [0.0]
+    monitor = HealthMonitor({"model": _ok}, stale_after=5, clock=lambda: now[0])
+    await monitor.probe()
+
+    with monitor.model_reloading():
+        ready, body = monitor.readiness()
+        assert ready is False
+        assert body.startswith(b'{"status":"model_reloading"')
+    assert monitor.readiness()[0] is True
+
+    now[0] = 6.0
+    assert monitor.readiness()[0] is False
+    assert not monitor.alive()
+
+
+def test_endpoints_serve_cached_state(client) -> None:
+    # в тестах зависимости заглушены, пул БД не создан — реплика не готова, но жива
+    assert client.get("/livez").status_code == 200
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["checks"]["db"]["detail"] == "pool is not initialized"
+
+    app.state.health_monitor = HealthMonitor({"model": _ok})
+    assert client.get("/readyz").status_code == 503
+    asyncio.run(app.state.health_monitor.probe())
+    assert client.get("/readyz").status_code == 200
+
+
+async def test_reload_model_swaps_model_and_marks_not_ready(tmp_path, monkeypatch) -> None:
+    path = str(tmp_path / "model.pkl")
+    save_model(train_model(), path)
+    monitor = HealthMonitor({"model": _ok})
+    await monitor.probe()
+    state = SimpleNamespace(
+        model=None,
+        model_version="old",
+        prediction_cache_namespace=CacheNamespace(version="old"),
+        health_monitor=monitor,
+    )
+
+    ready_during_load = []
+    load = model_reload_module._load
+
+    def observed_load(model_path):
+        ready_during_load.append(monitor.readiness()[0])
+        return load(model_path)
+
+    monkeypatch.setattr(model_reload_module, "_load", observed_load)
+    version = await reload_model(SimpleNamespace(state=state), path)
+
+    assert ready_during_load == [False]
+    assert monitor.readiness()[0] is True
+    assert state.model is not None
+    assert state.model_version == version != "old"
+    assert state.prediction_cache_namespace.version == version
+
+
+async def test_reload_model_ignores_pinned_model_version(tmp_path, monkeypatch) -> None:
+    # MODEL_VERSION описывает файл на момент старта: после перезагрузки кэш должен сменить неймспейс
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(model_module, "MODEL_VERSION", "release-1")
+    save_model(train_model(), model_module.MODEL_PATH)
+    state = SimpleNamespace(
+        model=None,
+        model_version="release-1",
+        prediction_cache_namespace=CacheNamespace(version="release-1"),
+    )
+
+    version = await reload_model(SimpleNamespace(state=state))
+
+    assert version == model_module.model_file_version() != "release-1"
+    assert state.prediction_cache_namespace.version == version
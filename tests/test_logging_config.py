@@ -0,0 +1,40 @@
+import logging
+import queue
+
+import pytest
+
+from app.logging_config import DeferredQueueHandler, SampledLogger, parse_level
+
+
+def test_sampled_logger_respects_rate_and_level() -> None:
+    logger = logging.getLogger("tests.sampled")
+    logger.setLevel(logging.INFO)
+
+    assert SampledLogger(logger, sample_rate=1.0, level=logging.INFO).enabled() is True
+    assert SampledLogger(logger, sample_rate=0.0, level=logging.INFO).enabled() is False
+    assert SampledLogger(logger, sample_rate=1.0, level=logging.DEBUG).enabled() is False
+
+
+def test_parse_level_is_case_insensitive_and_rejects_unknown_names() -> None:
+    assert parse_level("debug") == logging.DEBUG
+    assert parse_level(" Warning ") == logging.WARNING
+
+    with pytest.raises(ValueError):
+        parse_level("verbose")
+
+
+def test_deferred_queue_handler_keeps_args_and_drops_when_full() -> None:
+    handler = DeferredQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("tests.deferred")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        logger.warning("first %s", "value")
+        logger.warning("second %s", "value")
+    finally:
+        logger.removeHandler(handler)
+
+    record = handler.queue.get_nowait()
+    assert record.msg == "first %s"
+    assert record.args == ("value",)
+    assert handler.dropped == 1
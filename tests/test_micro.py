@@ -0,0 +1,16 @@
+from benchmarks.micro import main
+
+
+def test_missing_baseline_fails_without_save_flag(tmp_path, capsys) -> None:
+    assert main(["--baseline", str(tmp_path / "micro.json"), "-k", "prepare_features", "--repeat", "1", "--min-time", "0.001"]) == 1
+    assert "not found" in capsys.readouterr().err
+
+
+def test_save_baseline_then_compare(tmp_path) -> None:
+    baseline = tmp_path / "micro.json"
+    args = ["--baseline", str(baseline), "-k", "prepare_features", "--repeat", "1", "--min-time", "0.001"]
+
+    assert main([*args, "--save-baseline"]) == 0
+    assert baseline.exists()
+    # порог заведомо выше шума одного короткого замера
+    assert main([*args, "--threshold", "10000"]) == 0
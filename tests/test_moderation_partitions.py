@@ -0,0 +1,23 @@
+from datetime import date
+
+from app.jobs.moderation_partitions import partitions_to_archive, retention_cutoff
+
+
+def test_retention_cutoff_crosses_year_boundary() -> None:
+    assert retention_cutoff(date(2026, 2, 15), 3) == date(2025, 11, 1)
+    assert retention_cutoff(date(2026, 10, 1), 0) == date(2026, 10, 1)
+
+
+def test_partitions_to_archive_skips_recent_and_default() -> None:
+    names = [
+        "moderation_results_p202604",
+        "moderation_results_default",
+        "moderation_results_p202603",
+        "moderation_results_p202605",
+        "moderation_results_p202610",
+    ]
+
+    assert partitions_to_archive(names, date(2026, 10, 19), retention_months=5) == [
+        "moderation_results_p202603",
+        "moderation_results_p202604",
+    ]
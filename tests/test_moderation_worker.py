@@ -0,0 +1,228 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from aiokafka import TopicPartition
+
+import app.workers.moderation_worker as worker_module
+from app.workers.moderation_worker import ModerationWorker
+
+
+TP0 = TopicPartition("moderation", 0)
+TP1 = TopicPartition("moderation", 1)
+
+
+def _message(offset: int, task_id: int) -> SimpleNamespace:
+    return SimpleNamespace(offset=offset, value=json.dumps({"item_id": 1, "task_id": task_id}).encode("utf-8"))
+
+
+class FakeConsumer:
+    def __init__(self, batches: list[dict]) -> None:
+        self._batches = batches
+        self.commits: list[dict] = []
+
+    async def getmany(self, timeout_ms: int, max_records: int) -> dict:
+        if self._batches:
+            return self._batches.pop(0)
+        await asyncio.sleep(0)
+        return {}
+
+    async def commit(self, offsets: dict) -> None:
+        self.commits.append(dict(offsets))
+
+
+@pytest.fixture
+def handled(monkeypatch) -> list[int]:
+    handled: list[int] = []
+
+    async def fake_handle_message(message, model, kafka_client) -> bool:
+        handled.append(message["task_id"])
+        return True
+
+    monkeypatch.setattr(worker_module, "handle_message", fake_handle_message)
+    return handled
+
+
+async def test_offsets_are_committed_after_processing(handled) -> None:
+    consumer = FakeConsumer([{TP0: [_message(10, 1), _message(11, 2)], TP1: [_message(5, 3)]}])
+    stop_event = asyncio.Event()
+    worker = ModerationWorker(consumer, kafka_client=None, model=None)
+
+    async def stop_when_done() -> None:
+        while worker.processed < 3:
+            await asyncio.sleep(0)
+        stop_event.set()
+
+    await asyncio.gather(worker.run(stop_event), stop_when_done())
+
+    assert handled == [1, 2, 3]
+    assert consumer.commits == [{TP0: 12, TP1: 6}]
+    assert worker.telemetry.next_offsets == {TP0: 12, TP1: 6}
+
+
+async def test_stop_finishes_batch_within_deadline(handled, monkeypatch) -> None:
+    consumer = FakeConsumer([{TP0: [_message(0, 1), _message(1, 2)], TP1: [_message(0, 3)]}])
+    stop_event = asyncio.Event()
+    worker = ModerationWorker(consumer, kafka_client=None, model=None, drain_timeout=5)
+
+    # SIGTERM приходит посреди пачки
+    original = worker_module.handle_message
+
+    async def stop_on_first(message, model, kafka_client) -> bool:
+        stop_event.set()
+        return await original(message, model, kafka_client)
+
+    monkeypatch.setattr(worker_module, "handle_message", stop_on_first)
+    await worker.run(stop_event)
+
+    assert handled == [1, 2, 3]
+    assert consumer.commits == [{TP0: 2, TP1: 1}]
+    assert worker.handed_back == 0
+
+
+async def test_unfinished_messages_are_handed_back_after_deadline(monkeypatch) -> None:
+    consumer = FakeConsumer([{TP0: [_message(0, 1), _message(1, 2), _message(2, 3)]}])
+    stop_event = asyncio.Event()
+    worker = ModerationWorker(consumer, kafka_client=None, model=None, drain_timeout=0.05)
+    handled = []
+
+    async def slow_after_stop(message, model, kafka_client) -> bool:
+        stop_event.set()
+        if message["task_id"] == 2:
+            await asyncio.sleep(1)
+        handled.append(message["task_id"])
+        return True
+
+    monkeypatch.setattr(worker_module, "handle_message", slow_after_stop)
+    await worker.run(stop_event)
+
+    # первое сообщение зафиксировано, второе прервано по дедлайну, оба остальных достанутся другому воркеру
+    assert handled == [1]
+    assert consumer.commits == [{TP0: 1}]
+    assert worker.handed_back == 2
+
+
+async def test_revoked_partitions_commit_processed_offsets(handled) -> None:
+    consumer = FakeConsumer([])
+    worker = ModerationWorker(consumer, kafka_client=None, model=None)
+    worker._pending = {TP0: 7, TP1: 3}
+
+    await worker.rebalance_listener.on_partitions_revoked([TP1])
+
+    assert consumer.commits == [{TP1: 3}]
+    assert worker._pending == {TP0: 7}
+
+
+async def test_redelivered_tasks_are_skipped_and_counted(monkeypatch) -> None:
+    # 1 и 2 приходят повторно в той же пачке; 3 уже завершена в БД другим воркером
+    consumer = FakeConsumer([{TP0: [_message(0, 1), _message(1, 2), _message(2, 1), _message(3, 3), _message(4, 2)]}])
+    stop_event = asyncio.Event()
+    worker = ModerationWorker(consumer, kafka_client=None, model=None)
+    handled = []
+
+    async def fake_handle_message(message, model, kafka_client) -> bool:
+        handled.append(message["task_id"])
+        if len(handled) == 3:
+            stop_event.set()
+        return message["task_id"] != 3
+
+    monkeypatch.setattr(worker_module, "handle_message", fake_handle_message)
+    await worker.run(stop_event)
+
+    assert handled == [1, 2, 3]
+    assert worker.telemetry.duplicates_skipped == {"recent_tasks": 2, "db": 1}
+    assert consumer.commits == [{TP0: 5}]
+    assert 3 in worker.recent_tasks
+
+
+async def test_malformed_messages_are_skipped_and_committed(handled) -> None:
+    bad = [
+        b"not json",
+        b"\xff\xfe",
+        b"[1, 2]",
+        json.dumps({"item_id": 1}).encode("utf-8"),
+        json.dumps({"item_id": 1, "task_id": "abc"}).encode("utf-8"),
+        json.dumps({"task_id": 5}).encode("utf-8"),
+    ]
+    messages = [SimpleNamespace(offset=offset, value=value) for offset, value in enumerate(bad)]
+    consumer = FakeConsumer([{TP0: [*messages, _message(len(bad), 7)]}])
+    stop_event = asyncio.Event()
+    worker = ModerationWorker(consumer, kafka_client=None, model=None)
+
+    async def stop_when_done() -> None:
+        while worker.processed < len(bad) + 1:
+            await asyncio.sleep(0)
+        stop_event.set()
+
+    await asyncio.gather(worker.run(stop_event), stop_when_done())
+
+    # воркер не упал, битые сообщения пропущены, за ними обработано нормальное
+    assert handled == [7]
+    assert consumer.commits == [{TP0: len(bad) + 1}]
+
+
+class FakeModerationResults:
+    def __init__(self, pending: bool) -> None:
+        self.pending = pending
+        self.updates = []
+        self.created_at = []
+
+    async def get_status(self, task_id, created_at=None):
+        self.created_at.append(created_at)
+        return "pending" if self.pending else "completed"
+
+    async def complete_if_pending(self, task_id, **result) -> bool:
+        self.updates.append(result["status"])
+        self.created_at.append(result["created_at"])
+        applied, self.pending = self.pending, False
+        return applied
+
+
+class FakeNegativeCache:
+    AD_NOT_FOUND = "ad_not_found"
+
+    reads: list = []
+
+    def __init__(self, redis_client) -> None:
+        pass
+
+    async def get_reason(self, item_id):
+        self.reads.append(item_id)
+        return self.AD_NOT_FOUND
+
+
+class FakeDLQ:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send_to_dlq(self, message, error, retry_count=0) -> None:
+        self.sent.append(message["task_id"])
+
+
+@pytest.mark.parametrize("pending", [True, False])
+async def test_failed_task_goes_to_dlq_only_when_still_pending(monkeypatch, pending: bool) -> None:
+    results = FakeModerationResults(pending)
+
+    @asynccontextmanager
+    async def fake_connection(readonly: bool = False):
+        yield None
+
+    monkeypatch.setattr(worker_module, "get_connection", fake_connection)
+    monkeypatch.setattr(FakeNegativeCache, "reads", [])
+    monkeypatch.setattr(worker_module, "NegativeCacheRepository", FakeNegativeCache)
+    monkeypatch.setattr(worker_module, "ModerationResultRepository", lambda conn: results)
+    dlq = FakeDLQ()
+
+    message = {"item_id": 1, "task_id": 9, "task_created_at": "2026-10-19T12:30:00"}
+    applied = await worker_module.handle_message(message, model=None, kafka_client=dlq)
+
+    assert applied is pending
+    # уже завершенная задача отсекается по статусу: до объявления и модели дело не доходит
+    assert results.updates == (["failed"] if pending else [])
+    assert FakeNegativeCache.reads == ([1] if pending else [])
+    # задача ищется только в секции своего месяца
+    assert set(results.created_at) == {datetime(2026, 10, 19, 12, 30)}
+    assert dlq.sent == ([9] if pending else [])
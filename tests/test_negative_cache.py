@@ -0,0 +1,71 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from benchmarks.stubs import InMemoryRedis
+from repositories.negative_cache import NegativeCacheRepository
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise RedisConnectionError("redis is down")
+
+    async def set(self, key, value, ex=None):
+        raise RedisConnectionError("redis is down")
+
+
+@pytest.mark.asyncio
+async def test_missing_reason_round_trip() -> None:
+    repo = NegativeCacheRepository(InMemoryRedis())
+
+    await repo.mark_missing(1, NegativeCacheRepository.SELLER_NOT_FOUND)
+
+    assert await repo.get_reason(1) == NegativeCacheRepository.SELLER_NOT_FOUND
+    assert await repo.get_reason(2) is None
+
+
+@pytest.mark.asyncio
+async def test_unavailable_redis_is_a_miss() -> None:
+    repo = NegativeCacheRepository(BrokenRedis())
+
+    assert await repo.get_reason(1) is None
+    await repo.mark_missing(1, NegativeCacheRepository.AD_NOT_FOUND)
+
+
+@pytest.mark.asyncio
+async def test_create_ad_invalidates_missing_entry_after_commit(monkeypatch) -> None:
+    import services.ads as ads_module
+    from repositories.ads import Ad
+
+    redis = InMemoryRedis()
+    negative_cache = NegativeCacheRepository(redis)
+    await negative_cache.mark_missing(7, NegativeCacheRepository.AD_NOT_FOUND)
+    events = []
+
+    class FakeConnection:
+        @asynccontextmanager
+        async def transaction(self):
+            yield
+            events.append(("commit", await negative_cache.get_reason(7)))
+
+    @asynccontextmanager
+    async def fake_connection(readonly: bool = False):
+        yield FakeConnection()
+
+    class FakeAdRepository:
+        def __init__(self, conn) -> None:
+            pass
+
+        async def create(self, **fields) -> Ad:
+            return Ad(id=7, **fields)
+
+    monkeypatch.setattr(ads_module, "get_connection", fake_connection)
+    monkeypatch.setattr(ads_module, "AdRepository", FakeAdRepository)
+
+    ad = await ads_module.create_ad(redis, seller_id=1, title="T", description="D", category=1, images_qty=1)
+
+    assert ad.id == 7
+    # отказ еще был на момент коммита и сброшен сразу после него
+    assert events == [("commit", NegativeCacheRepository.AD_NOT_FOUND)]
+    assert await negative_cache.get_reason(7) is None
@@ -0,0 +1,67 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.workers.outbox_relay import OutboxRelay
+from repositories.moderation_outbox import OutboxMessage
+
+
+class FakeOutboxRepo:
+    def __init__(self, messages: list[OutboxMessage]) -> None:
+        self.messages = messages
+        self.sent_ids: list[int] = []
+
+    async def fetch_unsent(self, limit: int) -> list[OutboxMessage]:
+        return [m for m in self.messages if m.id not in self.sent_ids][:limit]
+
+    async def mark_sent(self, message_ids: list[int]) -> None:
+        self.sent_ids.extend(message_ids)
+
+
+class FakeKafkaClient:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.batches: list[list[tuple[int, int, datetime, datetime]]] = []
+        self._error = error
+
+    async def send_moderation_requests(self, messages) -> None:
+        batch = list(messages)
+        if self._error is not None:
+            raise self._error
+        self.batches.append(batch)
+
+
+@pytest.fixture
+def outbox_repo(monkeypatch) -> FakeOutboxRepo:
+    now = datetime.now(timezone.utc)
+    repo = FakeOutboxRepo([OutboxMessage(id=i, task_id=100 + i, item_id=10 + i, created_at=now) for i in range(1, 4)])
+
+    @asynccontextmanager
+    async def fake_connection(*args, **kwargs):
+        yield MagicMock()
+
+    monkeypatch.setattr("app.workers.outbox_relay.get_connection", fake_connection)
+    monkeypatch.setattr("app.workers.outbox_relay.ModerationOutboxRepository", lambda conn: repo)
+    return repo
+
+
+async def test_relay_once_publishes_batch_and_marks_sent(outbox_repo: FakeOutboxRepo) -> None:
+    kafka = FakeKafkaClient()
+    relay = OutboxRelay(kafka, batch_size=2)
+
+    assert await relay.relay_once() == 2
+    assert await relay.relay_once() == 1
+    assert await relay.relay_once() == 0
+
+    assert [[task_id for _, task_id, _, _ in batch] for batch in kafka.batches] == [[101, 102], [103]]
+    assert outbox_repo.sent_ids == [1, 2, 3]
+
+
+async def test_relay_once_keeps_messages_when_produce_fails(outbox_repo: FakeOutboxRepo) -> None:
+    relay = OutboxRelay(FakeKafkaClient(error=RuntimeError("broker down")), batch_size=10)
+
+    with pytest.raises(RuntimeError):
+        await relay.relay_once()
+
+    assert outbox_repo.sent_ids == []
@@ -28,8 +28,8 @@ async def test_pg_repositories():
         assert mod_res.id is not None
         assert mod_res.status == "pending"
         
-        await mod_repo.update_result(
-            task_id=mod_res.id,
+        assert await mod_repo.complete_if_pending(
+            mod_res.id,
             status="completed",
             is_violation=False,
             probability=0.2,
@@ -49,3 +49,117 @@ async def test_pg_repositories():
         
         fetched_mod_deleted = await mod_repo.get(mod_res.id)
         assert fetched_mod_deleted is None
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_pending_counter_follows_status_changes():
+    async with get_connection() as conn:
+        user = await UserRepository(conn).create(is_verified_seller=False)
+        ad = await AdRepository(conn).create(
+            seller_id=user.id, title="Ad", description="Desc", category=1, images_qty=1
+        )
+        mod_repo = ModerationResultRepository(conn)
+        before = await mod_repo.count_pending()
+
+        task = await mod_repo.create_pending(item_id=ad.id)
+        assert await mod_repo.count_pending() == before + 1
+        assert await mod_repo.oldest_pending_age_seconds() >= 0
+
+        assert await mod_repo.complete_if_pending(
+            task.id,
+            created_at=task.created_at,
+            status="completed",
+            is_violation=False,
+            probability=0.1,
+            error_message=None,
+        )
+        assert await mod_repo.count_pending() == before
+        # повторная доставка не перезаписывает результат
+        assert not await mod_repo.complete_if_pending(
+            task.id, status="failed", is_violation=None, probability=None, error_message="redelivered"
+        )
+        assert (await mod_repo.get(task.id)).status == "completed"
+        assert (await mod_repo.get(task.id, task.created_at)).status == "completed"
+        assert await mod_repo.get_status(task.id, task.created_at) == "completed"
+
+        await mod_repo.delete_by_item_id(ad.id)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_stale_pending_task_is_replaced():
+    async with get_connection() as conn:
+        user = await UserRepository(conn).create(is_verified_seller=False)
+        ad = await AdRepository(conn).create(
+            seller_id=user.id, title="Ad", description="Desc", category=1, images_qty=1
+        )
+        mod_repo = ModerationResultRepository(conn)
+
+        stuck, created = await mod_repo.get_or_create_pending(ad.id, pending_timeout_seconds=600)
+        assert created
+        reused, created = await mod_repo.get_or_create_pending(ad.id, pending_timeout_seconds=600)
+        assert reused.id == stuck.id and not created
+
+        await conn.execute(
+            "UPDATE moderation_results SET created_at = created_at - interval '11 minutes' WHERE id = $1",
+            stuck.id,
+        )
+        fresh, created = await mod_repo.get_or_create_pending(ad.id, pending_timeout_seconds=600)
+        assert created and fresh.id != stuck.id
+        assert (await mod_repo.get(stuck.id)).status == "failed"
+
+        await mod_repo.delete_by_item_id(ad.id)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_idempotency_key_is_bound_to_one_task():
+    async with get_connection() as conn:
+        user = await UserRepository(conn).create(is_verified_seller=False)
+        ad_repo = AdRepository(conn)
+        first_ad = await ad_repo.create(seller_id=user.id, title="Ad", description="Desc", category=1, images_qty=1)
+        second_ad = await ad_repo.create(seller_id=user.id, title="Ad", description="Desc", category=1, images_qty=1)
+        mod_repo = ModerationResultRepository(conn)
+        key = f"key-{first_ad.id}"
+
+        task, created = await mod_repo.get_or_create_pending(first_ad.id, key)
+        assert created
+        # тот же ключ с другим объявлением новой задачи не создает
+        same, created = await mod_repo.get_or_create_pending(second_ad.id, key)
+        assert not created and same.id == task.id and same.item_id == first_ad.id
+        assert (await mod_repo.get_by_idempotency_key(key)).id == task.id
+
+        # задачу удалили — ключ переходит к новой
+        await mod_repo.delete_by_item_id(first_ad.id)
+        assert await mod_repo.get_by_idempotency_key(key) is None
+        fresh, created = await mod_repo.get_or_create_pending(second_ad.id, key)
+        assert created and (await mod_repo.get_by_idempotency_key(key)).id == fresh.id
+
+        await mod_repo.delete_by_item_id(second_ad.id)
+        await conn.execute("DELETE FROM moderation_idempotency_keys WHERE idempotency_key = $1", key)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_created_ad_is_found_despite_cached_miss():
+    from benchmarks.stubs import InMemoryRedis
+    from repositories.negative_cache import NegativeCacheRepository
+    from services.ads import create_ad
+
+    redis = InMemoryRedis()
+    negative_cache = NegativeCacheRepository(redis)
+    async with get_connection() as conn:
+        user = await UserRepository(conn).create(is_verified_seller=False)
+        next_id = await conn.fetchval(
+            "SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM ads_id_seq"
+        )
+    # запрос до создания закэшировал «объявления нет»
+    await negative_cache.mark_missing(next_id, NegativeCacheRepository.AD_NOT_FOUND)
+
+    ad = await create_ad(redis, seller_id=user.id, title="Ad", description="Desc", category=1, images_qty=1)
+
+    assert ad.id == next_id
+    assert await negative_cache.get_reason(ad.id) is None
+    async with get_connection() as conn:
+        assert (await AdRepository(conn).get(ad.id)).id == ad.id
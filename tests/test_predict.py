@@ -1,11 +1,15 @@
 import pytest
+from datetime import datetime
 from unittest.mock import AsyncMock, MagicMock
+from redis.exceptions import TimeoutError as RedisTimeoutError
 from main import app
 from fastapi.testclient import TestClient
 from dependencies.auth import get_current_account
 from repositories.accounts import Account
 from repositories.ads import Ad
-from repositories.moderation_results import ModerationResult
+from repositories.moderation_results import ModerationResult, decode_task_id, encode_task_id
+from repositories.negative_cache import NegativeCacheRepository
+from routers.predict import ASYNC_PREDICT_PENDING_TIMEOUT_SECONDS
 
 @pytest.fixture
 def client_mock():
@@ -19,6 +23,14 @@ def client_mock():
         yield c
     app.dependency_overrides.clear()
 
+def _negative_cache_factory(instance):
+    # константы причин нужны роутеру и без экземпляра
+    factory = MagicMock(return_value=instance)
+    factory.AD_NOT_FOUND = NegativeCacheRepository.AD_NOT_FOUND
+    factory.SELLER_NOT_FOUND = NegativeCacheRepository.SELLER_NOT_FOUND
+    return factory
+
+
 @pytest.fixture
 def mock_repos_and_db(monkeypatch):
     ad_repo_instance = AsyncMock()
@@ -26,26 +38,36 @@ def mock_repos_and_db(monkeypatch):
     mod_repo_instance = AsyncMock()
     cache_repo_instance = AsyncMock()
 
+    conn = AsyncMock()
+    conn.transaction = MagicMock()
     mock_conn = AsyncMock()
-    mock_conn.__aenter__.return_value = AsyncMock()
+    mock_conn.__aenter__.return_value = conn
     mock_conn.__aexit__.return_value = None
     
-    monkeypatch.setattr("routers.predict.get_connection", lambda: mock_conn)
+    monkeypatch.setattr("routers.predict.get_connection", lambda *args, **kwargs: mock_conn)
     
     ad_repo_instance.get.return_value = None
     
     monkeypatch.setattr("routers.predict.AdRepository", lambda conn: ad_repo_instance)
     monkeypatch.setattr("routers.predict.UserRepository", lambda conn: user_repo_instance)
     monkeypatch.setattr("routers.predict.ModerationResultRepository", lambda conn: mod_repo_instance)
-    monkeypatch.setattr("routers.predict.PredictionCacheRepository", lambda client: cache_repo_instance)
+    monkeypatch.setattr("routers.predict.PredictionCacheRepository", lambda *args, **kwargs: cache_repo_instance)
+    outbox_repo_instance = AsyncMock()
+    monkeypatch.setattr("routers.predict.ModerationOutboxRepository", lambda conn: outbox_repo_instance)
+    negative_cache_instance = AsyncMock()
+    negative_cache_instance.get_reason.return_value = None
+    monkeypatch.setattr("routers.predict.NegativeCacheRepository", _negative_cache_factory(negative_cache_instance))
     
     monkeypatch.setattr("app.clients.redis.RedisClient.get_client", lambda: MagicMock())
+    monkeypatch.setattr("app.clients.redis.RedisClient.get_binary_client", lambda: MagicMock())
 
     return {
         "ad_repo": ad_repo_instance,
         "user_repo": user_repo_instance,
         "mod_repo": mod_repo_instance,
-        "cache_repo": cache_repo_instance
+        "cache_repo": cache_repo_instance,
+        "outbox_repo": outbox_repo_instance,
+        "negative_cache": negative_cache_instance,
     }
 
 @pytest.fixture
@@ -58,10 +80,7 @@ def mock_model(monkeypatch):
     {"item_id": 10},
 ])
 def test_simple_predict_cache_hit(client_mock, mock_repos_and_db, mock_model, payload):
-    mock_repos_and_db["cache_repo"].get_prediction.return_value = {
-        "is_violation": True,
-        "probability": 0.95
-    }
+    mock_repos_and_db["cache_repo"].get_prediction_raw.return_value = b'{"is_violation":true,"probability":0.95}'
     
     response = client_mock.post("/simple_predict", json=payload)
     
@@ -74,7 +93,7 @@ def test_simple_predict_cache_hit(client_mock, mock_repos_and_db, mock_model, pa
     mock_model.predict_proba.assert_not_called()
 
 def test_simple_predict_cache_miss(client_mock, mock_repos_and_db, mock_model):
-    mock_repos_and_db["cache_repo"].get_prediction.return_value = None
+    mock_repos_and_db["cache_repo"].get_prediction_raw.return_value = None
     
     ad = Ad(id=10, seller_id=1, title="Test", description="Desc", category=1, images_qty=1)
     mock_repos_and_db["ad_repo"].get.return_value = ad
@@ -95,7 +114,45 @@ def test_simple_predict_cache_miss(client_mock, mock_repos_and_db, mock_model):
     
     mock_repos_and_db["ad_repo"].get.assert_awaited_once_with(10)
     
-    mock_repos_and_db["cache_repo"].set_prediction.assert_awaited_once()
+    mock_repos_and_db["cache_repo"].set_prediction_raw.assert_awaited_once_with(
+        10, b'{"is_violation":true,"probability":0.8}'
+    )
+
+def test_simple_predict_survives_cache_outage(client_mock, mock_repos_and_db, mock_model):
+    mock_repos_and_db["cache_repo"].get_prediction_raw.side_effect = RedisTimeoutError()
+    mock_repos_and_db["cache_repo"].set_prediction_raw.side_effect = RedisTimeoutError()
+    mock_repos_and_db["ad_repo"].get.return_value = Ad(
+        id=10, seller_id=1, title="Test", description="Desc", category=1, images_qty=1
+    )
+    mock_repos_and_db["user_repo"].get.return_value = MagicMock(id=1, is_verified_seller=False)
+    mock_model.predict_proba.return_value = [[0.9, 0.1]]
+
+    response = client_mock.post("/simple_predict", json={"item_id": 10})
+
+    assert response.status_code == 200
+    assert response.json() == {"is_violation": False, "probability": 0.1}
+
+def test_simple_predict_remembers_missing_ad(client_mock, mock_repos_and_db, mock_model):
+    mock_repos_and_db["cache_repo"].get_prediction_raw.return_value = None
+    mock_repos_and_db["ad_repo"].get.return_value = None
+
+    response = client_mock.post("/simple_predict", json={"item_id": 404})
+
+    assert response.status_code == 404
+    mock_repos_and_db["negative_cache"].mark_missing.assert_awaited_once_with(404, NegativeCacheRepository.AD_NOT_FOUND)
+
+
+@pytest.mark.parametrize("path", ["/simple_predict", "/async_predict"])
+def test_negative_cache_hit_skips_database(client_mock, mock_repos_and_db, mock_model, path):
+    mock_repos_and_db["cache_repo"].get_prediction_raw.return_value = None
+    mock_repos_and_db["negative_cache"].get_reason.return_value = NegativeCacheRepository.SELLER_NOT_FOUND
+
+    response = client_mock.post(path, json={"item_id": 10})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Пользователь не найден"
+    mock_repos_and_db["ad_repo"].get.assert_not_called()
+    mock_repos_and_db["mod_repo"].get_or_create_pending.assert_not_called()
 
 def test_close_ad(client_mock, mock_repos_and_db):
     ad = Ad(id=10, seller_id=1, title="Test", description="Desc", category=1, images_qty=1)
@@ -107,3 +164,143 @@ def test_close_ad(client_mock, mock_repos_and_db):
     mock_repos_and_db["ad_repo"].close.assert_awaited_once_with(10)
     mock_repos_and_db["mod_repo"].delete_by_item_id.assert_awaited_once_with(10)
     mock_repos_and_db["cache_repo"].delete_prediction.assert_awaited_once_with(10)
+
+
+def test_close_many_reports_closed_and_not_found(client_mock, mock_repos_and_db):
+    mock_repos_and_db["ad_repo"].close_many.return_value = [10, 12]
+
+    response = client_mock.post("/close_many", json={"item_ids": [10, 11, 12, 10]})
+
+    assert response.status_code == 200
+    assert response.json() == {"closed": [10, 12], "not_found": [11]}
+    mock_repos_and_db["ad_repo"].close_many.assert_awaited_once_with([10, 11, 12])
+    mock_repos_and_db["mod_repo"].delete_by_item_ids.assert_awaited_once_with([10, 12])
+    mock_repos_and_db["cache_repo"].delete_predictions.assert_awaited_once_with([10, 12])
+
+
+def test_close_many_skips_cleanup_when_nothing_closed(client_mock, mock_repos_and_db):
+    mock_repos_and_db["ad_repo"].close_many.return_value = []
+
+    response = client_mock.post("/close_many", json={"item_ids": [11]})
+
+    assert response.status_code == 200
+    assert response.json() == {"closed": [], "not_found": [11]}
+    mock_repos_and_db["mod_repo"].delete_by_item_ids.assert_not_awaited()
+    mock_repos_and_db["cache_repo"].delete_predictions.assert_not_awaited()
+
+
+TASK_CREATED_AT = datetime(2026, 10, 19, 12, 30)
+
+
+def _moderation_result(task_id: int, status: str, item_id: int = 10) -> ModerationResult:
+    completed = status == "completed"
+    return ModerationResult(
+        id=task_id,
+        item_id=item_id,
+        status=status,
+        is_violation=False if completed else None,
+        probability=0.2 if completed else None,
+        error_message=None,
+        created_at=TASK_CREATED_AT,
+        processed_at=datetime.now() if completed else None,
+    )
+
+
+def test_async_predict_creates_task_with_outbox_message(client_mock, mock_repos_and_db):
+    mock_repos_and_db["ad_repo"].get.return_value = Ad(id=10, seller_id=1, title="T", description="D", category=1, images_qty=1)
+    mock_repos_and_db["mod_repo"].get_latest_completed.return_value = None
+    mock_repos_and_db["mod_repo"].get_or_create_pending.return_value = (_moderation_result(5, "pending"), True)
+
+    response = client_mock.post("/async_predict", json={"item_id": 10})
+
+    assert response.status_code == 200
+    assert response.json()["task_id"] == encode_task_id(5, TASK_CREATED_AT)
+    mock_repos_and_db["outbox_repo"].add.assert_awaited_once_with(
+        task_id=5, item_id=10, task_created_at=TASK_CREATED_AT
+    )
+    # зависшая задача не должна навсегда закреплять объявление
+    mock_repos_and_db["mod_repo"].get_or_create_pending.assert_awaited_once_with(
+        item_id=10,
+        idempotency_key=None,
+        pending_timeout_seconds=ASYNC_PREDICT_PENDING_TIMEOUT_SECONDS,
+    )
+
+
+def test_async_predict_reuses_pending_task(client_mock, mock_repos_and_db):
+    mock_repos_and_db["ad_repo"].get.return_value = Ad(id=10, seller_id=1, title="T", description="D", category=1, images_qty=1)
+    mock_repos_and_db["mod_repo"].get_latest_completed.return_value = None
+    mock_repos_and_db["mod_repo"].get_or_create_pending.return_value = (_moderation_result(5, "pending"), False)
+
+    response = client_mock.post("/async_predict", json={"item_id": 10})
+
+    assert response.status_code == 200
+    assert response.json()["task_id"] == encode_task_id(5, TASK_CREATED_AT)
+    assert response.json()["status"] == "pending"
+    mock_repos_and_db["outbox_repo"].add.assert_not_awaited()
+
+
+def test_async_predict_returns_recent_completed_result(client_mock, mock_repos_and_db):
+    mock_repos_and_db["ad_repo"].get.return_value = Ad(id=10, seller_id=1, title="T", description="D", category=1, images_qty=1)
+    mock_repos_and_db["mod_repo"].get_latest_completed.return_value = _moderation_result(4, "completed")
+
+    response = client_mock.post("/async_predict", json={"item_id": 10})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["task_id"] == encode_task_id(4, TASK_CREATED_AT)
+    assert data["status"] == "completed"
+    assert data["probability"] == 0.2
+    mock_repos_and_db["mod_repo"].get_or_create_pending.assert_not_awaited()
+    mock_repos_and_db["outbox_repo"].add.assert_not_awaited()
+
+
+def test_task_id_carries_partition_month():
+    public_task_id = encode_task_id(5, TASK_CREATED_AT)
+
+    assert decode_task_id(public_task_id) == (5, datetime(2026, 10, 1))
+    # task_id, выданные до кодирования месяца, ищутся по всем секциям
+    assert decode_task_id(5) == (5, None)
+
+
+def test_task_id_edges():
+    last_month = (9999 * 12 + 11) << 31
+    assert decode_task_id(last_month | (2**31 - 1)) == (2**31 - 1, datetime(9999, 12, 1))
+    assert decode_task_id(2**31 - 1) == (2**31 - 1, None)
+    # месяцы 1..11 — это год 0, дальше 9999 года — тоже не выдавались
+    for task_id in (-1, -(2**31), 2**31, 11 << 31, (10000 * 12) << 31):
+        with pytest.raises(ValueError):
+            decode_task_id(task_id)
+
+
+@pytest.mark.parametrize("task_id", [-1, 2**31, (10000 * 12) << 31])
+def test_moderation_result_with_impossible_task_id_is_not_found(client_mock, mock_repos_and_db, task_id):
+    response = client_mock.get(f"/moderation_result/{task_id}")
+
+    assert response.status_code == 404
+    mock_repos_and_db["mod_repo"].get.assert_not_awaited()
+
+
+def test_async_predict_idempotency_key(client_mock, mock_repos_and_db):
+    mock_repos_and_db["mod_repo"].get_by_idempotency_key.return_value = _moderation_result(6, "pending", item_id=10)
+
+    same_item = client_mock.post("/async_predict", json={"item_id": 10}, headers={"Idempotency-Key": "abc"})
+    other_item = client_mock.post("/async_predict", json={"item_id": 11}, headers={"Idempotency-Key": "abc"})
+
+    assert same_item.status_code == 200
+    assert same_item.json()["task_id"] == encode_task_id(6, TASK_CREATED_AT)
+    assert other_item.status_code == 409
+    mock_repos_and_db["ad_repo"].get.assert_not_awaited()
+    mock_repos_and_db["outbox_repo"].add.assert_not_awaited()
+
+
+def test_async_predict_idempotency_key_taken_concurrently(client_mock, mock_repos_and_db):
+    # до блокировки ключа задачи еще не было, под блокировкой она нашлась — для другого объявления
+    mock_repos_and_db["mod_repo"].get_by_idempotency_key.return_value = None
+    mock_repos_and_db["ad_repo"].get.return_value = Ad(id=11, seller_id=1, title="T", description="D", category=1, images_qty=1)
+    mock_repos_and_db["mod_repo"].get_latest_completed.return_value = None
+    mock_repos_and_db["mod_repo"].get_or_create_pending.return_value = (_moderation_result(6, "pending", item_id=10), False)
+
+    response = client_mock.post("/async_predict", json={"item_id": 11}, headers={"Idempotency-Key": "abc"})
+
+    assert response.status_code == 409
+    mock_repos_and_db["outbox_repo"].add.assert_not_awaited()
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from benchmarks.stubs import InMemoryRedis
+from repositories.prediction_cache import CacheNamespace, PredictionCacheRepository
+
+
+@pytest.mark.asyncio
+async def test_model_version_switch_hides_old_entries() -> None:
+    redis = InMemoryRedis()
+    old = PredictionCacheRepository(redis, namespace=CacheNamespace(version="v1"))
+    new = PredictionCacheRepository(redis, namespace=CacheNamespace(version="v2"))
+
+    await old.set_prediction_raw(1, b"old")
+
+    assert await old.get_prediction_raw(1) == b"old"
+    assert await new.get_prediction_raw(1) is None
+    assert "prediction:v1:1" in redis._data
+
+
+@pytest.mark.asyncio
+async def test_fallback_to_previous_version_during_window() -> None:
+    redis = InMemoryRedis()
+    await PredictionCacheRepository(redis, namespace=CacheNamespace(version="v1")).set_prediction_raw(1, b"old")
+    warming = CacheNamespace(version="v2", fallback_version="v1", fallback_until=time.monotonic() + 60)
+    expired = CacheNamespace(version="v2", fallback_version="v1", fallback_until=time.monotonic() - 1)
+    repo = PredictionCacheRepository(redis, namespace=warming)
+
+    assert await repo.get_prediction_raw(1) == b"old"
+    assert await PredictionCacheRepository(redis, namespace=expired).get_prediction_raw(1) is None
+
+    await repo.set_prediction_raw(1, b"new")
+    assert await repo.get_prediction_raw(1) == b"new"
+
+    # закрытое объявление не должно всплыть из кэша предыдущей версии
+    await repo.delete_predictions([1])
+    assert await repo.get_prediction_raw(1) is None
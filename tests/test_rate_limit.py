@@ -0,0 +1,139 @@
+import math
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import dependencies.rate_limit as rate_limit_module
+from app.middleware.response_headers import ResponseHeadersMiddleware
+from app.responses import JSONBytesResponse
+from dependencies.auth import get_current_account
+from dependencies.rate_limit import AccountRateLimiter, Quota, parse_account_quotas, parse_quotas, rate_limit
+from repositories.accounts import Account
+from repositories.rate_limits import BucketState
+
+
+class FakeBucketRepository:
+    """Тот же token bucket, что и Lua-скрипт, но на часах теста."""
+
+    def __init__(self, clock) -> None:
+        self._clock = clock
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.calls: list[int] = []
+
+    async def take(self, key: str, *, rate: float, burst: int, requested: int = 1) -> BucketState:
+        self.calls.append(requested)
+        now = self._clock()
+        tokens, ts = self.buckets.get(key, (float(burst), now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        granted = min(requested, math.floor(tokens))
+        tokens -= granted
+        self.buckets[key] = (tokens, now)
+        return BucketState(
+            granted=granted,
+            remaining=math.floor(tokens),
+            retry_after=(1 - tokens) / rate if granted == 0 else 0.0,
+            reset_after=(burst - tokens) / rate,
+        )
+
+
+def _limiter(quota: Quota, now: list[float]) -> tuple[AccountRateLimiter, FakeBucketRepository]:
+    repository = FakeBucketRepository(lambda: now[0])
+    limiter = AccountRateLimiter(
+        {"simple_predict": quota},
+        repository_factory=lambda: repository,
+        lease_ttl=1.0,
+        clock=lambda: now[0],
+    )
+    return limiter, repository
+
+
+def test_parse_quotas() -> None:
+    assert parse_quotas("simple_predict=50/100, async_predict=5") == {
+        "simple_predict": Quota(rate=50.0, burst=100),
+        "async_predict": Quota(rate=5.0, burst=5),
+    }
+    assert parse_account_quotas("42:simple_predict=500/1000") == {(42, "simple_predict"): Quota(rate=500.0, burst=1000)}
+    assert parse_account_quotas("") == {}
+
+
+@pytest.mark.asyncio
+async def test_under_limit_client_is_served_from_local_lease() -> None:
+    now = [0.0]
+    limiter, repository = _limiter(Quota(rate=100, burst=200), now)
+
+    decisions = [await limiter.check(1, "simple_predict") for _ in range(20)]
+
+    assert all(decision.allowed for decision in decisions)
+    # lease по 10 токенов: 20 запросов — два похода в Redis
+    assert repository.calls == [10, 10]
+    assert decisions[-1].remaining == 180
+    assert limiter.local_hits == 18
+
+
+@pytest.mark.asyncio
+async def test_exhausted_bucket_rejects_with_retry_after_and_skips_redis_until_then() -> None:
+    now = [0.0]
+    limiter, repository = _limiter(Quota(rate=2, burst=4), now)
+
+    decisions = [await limiter.check(1, "simple_predict") for _ in range(5)]
+
+    assert [decision.allowed for decision in decisions] == [True, True, True, True, False]
+    assert decisions[-1].retry_after == pytest.approx(0.5)
+    calls_after_reject = len(repository.calls)
+
+    rejected = await limiter.check(1, "simple_predict")
+    assert not rejected.allowed
+    assert len(repository.calls) == calls_after_reject
+
+    now[0] += 0.5
+    assert (await limiter.check(1, "simple_predict")).allowed
+
+
+@pytest.mark.asyncio
+async def test_account_quota_overrides_route_quota_and_buckets_are_per_account() -> None:
+    now = [0.0]
+    repository = FakeBucketRepository(lambda: now[0])
+    limiter = AccountRateLimiter(
+        {"simple_predict": Quota(rate=1, burst=1)},
+        {(7, "simple_predict"): Quota(rate=1, burst=3)},
+        repository_factory=lambda: repository,
+        clock=lambda: now[0],
+    )
+
+    assert [(await limiter.check(1, "simple_predict")).allowed for _ in range(2)] == [True, False]
+    assert [(await limiter.check(7, "simple_predict")).allowed for _ in range(4)] == [True, True, True, False]
+    assert await limiter.check(1, "predict") is None
+
+
+def _make_app() -> FastAPI:
+    test_app = FastAPI()
+    test_app.add_middleware(ResponseHeadersMiddleware)
+
+    @test_app.post("/simple_predict")
+    async def simple_predict(_rate_limit: None = Depends(rate_limit("simple_predict"))):
+        return JSONBytesResponse(b'{"ok":true}')
+
+    test_app.dependency_overrides[get_current_account] = lambda: Account(
+        id=1, login="u", password="p", is_blocked=False
+    )
+    return test_app
+
+
+def test_dependency_sets_headers_and_returns_429(monkeypatch) -> None:
+    now = [0.0]
+    limiter, _ = _limiter(Quota(rate=1, burst=2), now)
+    monkeypatch.setattr(rate_limit_module, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit_module, "account_rate_limiter", limiter)
+
+    with TestClient(_make_app()) as c:
+        first = c.post("/simple_predict")
+        c.post("/simple_predict")
+        rejected = c.post("/simple_predict")
+
+    assert first.status_code == 200
+    assert first.headers["ratelimit-limit"] == "2"
+    assert first.headers["ratelimit-remaining"] == "1"
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "1"
+    assert rejected.headers["ratelimit-remaining"] == "0"
@@ -22,3 +22,28 @@ async def test_redis_cache():
     assert cached is None
     
     await RedisClient.close()
+
+
+@pytest.mark.integration
+async def test_token_bucket_script():
+    from repositories.rate_limits import RateLimitRepository
+
+    redis = RedisClient.get_binary_client()
+    repo = RateLimitRepository(redis)
+    key = RateLimitRepository.bucket_key(99999, "integration")
+    await redis.unlink(key)
+
+    leased = await repo.take(key, rate=1, burst=3, requested=2)
+    assert leased.granted == 2
+    assert leased.remaining == 1
+
+    partial = await repo.take(key, rate=1, burst=3, requested=2)
+    assert partial.granted == 1
+
+    rejected = await repo.take(key, rate=1, burst=3)
+    assert rejected.granted == 0
+    assert 0 < rejected.retry_after <= 1
+    assert await redis.pttl(key) > 0
+
+    await redis.unlink(key)
+    await RedisClient.close()
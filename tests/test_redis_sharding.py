@@ -0,0 +1,46 @@
+import pytest
+
+from app.clients.redis_sharding import HashRing, ShardedRedis
+from benchmarks.stubs import InMemoryRedis
+
+
+def _keys(count: int) -> list[str]:
+    return [f"prediction:{item_id}" for item_id in range(count)]
+
+
+def test_hash_ring_spreads_keys_and_moves_few_on_resize() -> None:
+    three = HashRing(["a", "b", "c"])
+    four = HashRing(["a", "b", "c", "d"])
+    keys = _keys(20_000)
+
+    counts = [0, 0, 0]
+    for key in keys:
+        counts[three.node_index(key)] += 1
+    moved = sum(three.node_index(key) != four.node_index(key) for key in keys)
+
+    assert min(counts) > len(keys) / 3 * 0.8
+    # при добавлении четвертого узла переезжает ~1/4 ключей, а не почти все
+    assert moved < len(keys) * 0.35
+
+
+@pytest.mark.asyncio
+async def test_sharded_redis_routes_commands_and_pipelines() -> None:
+    nodes = [InMemoryRedis(), InMemoryRedis(), InMemoryRedis()]
+    redis = ShardedRedis(nodes, names=["n1", "n2", "n3"])
+    keys = _keys(30)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.set(key, key.encode(), ex=60)
+        assert await pipe.execute() == [True] * len(keys)
+
+    assert all(len(node._data) > 0 for node in nodes)
+    assert await redis.get(keys[7]) == keys[7].encode()
+    assert await redis.client_for(keys[7]).get(keys[7]) == keys[7].encode()
+
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.unlink(*keys[:20])
+        pipe.get(keys[25])
+        assert await pipe.execute() == [20, keys[25].encode()]
+
+    assert await redis.unlink(*keys) == 10
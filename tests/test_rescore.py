@@ -0,0 +1,26 @@
+from app.jobs.rescore import IdRange, split_id_range
+from model import train_model
+from services.moderation import predict_proba_rows
+
+
+def test_split_id_range_covers_all_ids_once() -> None:
+    ranges = split_id_range(1, 10, parts=3)
+
+    assert ranges == [IdRange(0, 3), IdRange(3, 7), IdRange(7, 10)]
+    covered = [item_id for r in ranges for item_id in range(r.after_id + 1, r.up_to_id + 1)]
+    assert covered == list(range(1, 11))
+
+
+def test_split_id_range_never_returns_empty_parts() -> None:
+    assert split_id_range(5, 6, parts=8) == [IdRange(4, 5), IdRange(5, 6)]
+
+
+def test_predict_proba_rows_keeps_row_order() -> None:
+    model = train_model()
+    rows = [(7, True, 5, 100, 3), (3, False, 0, 900, 50)]
+
+    item_ids, probabilities = predict_proba_rows(model, rows)
+
+    assert item_ids == [7, 3]
+    assert len(probabilities) == 2
+    assert all(0.0 <= p <= 1.0 for p in probabilities)
@@ -0,0 +1,81 @@
+import os
+import signal
+from types import SimpleNamespace
+
+import app.server as server_module
+import db
+from app.clients import redis as redis_client
+from app.server import Arbiter, WorkerProcess, apply_connection_budget, per_worker, read_rss_bytes
+from model import MODEL_PATH, model_file_version, save_model, train_model
+
+
+def test_per_worker_splits_budget_and_keeps_at_least_one() -> None:
+    assert per_worker(80, 4) == 20
+    assert per_worker(10, 3) == 3
+    assert per_worker(2, 8) == 1
+
+
+def test_read_rss_bytes() -> None:
+    assert read_rss_bytes(os.getpid()) > 0
+
+
+def test_apply_connection_budget_sets_pool_sizes(monkeypatch) -> None:
+    monkeypatch.setattr(db, "DB_POOL_MIN_SIZE", 10)
+    monkeypatch.setattr(db, "DB_POOL_MAX_SIZE", 10)
+    monkeypatch.setattr(redis_client, "REDIS_MAX_CONNECTIONS", 100)
+
+    apply_connection_budget(workers=4, db_budget=20, redis_budget=0)
+
+    assert (db.DB_POOL_MIN_SIZE, db.DB_POOL_MAX_SIZE) == (5, 5)
+    assert redis_client.REDIS_MAX_CONNECTIONS == 100
+
+
+def test_worker_is_recycled_when_rss_grows(monkeypatch) -> None:
+    rss = {101: 100 * 1024 * 1024, 102: 100 * 1024 * 1024}
+    monkeypatch.setattr(server_module, "read_rss_bytes", lambda pid: rss[pid])
+    killed = []
+    monkeypatch.setattr(server_module.os, "kill", lambda pid, signum: killed.append(pid))
+
+    arbiter = Arbiter(app=None, sock=None, workers=2, max_rss_growth_mb=50)
+    arbiter.children = {101: WorkerProcess(pid=101), 102: WorkerProcess(pid=102)}
+    spawned = []
+    monkeypatch.setattr(arbiter, "spawn", lambda: spawned.append(True))
+
+    # первый замер — базовая линия
+    arbiter._check_memory()
+    rss[102] += 60 * 1024 * 1024
+    arbiter._check_memory()
+
+    assert killed == [102]
+    assert arbiter.children[102].stopping
+    assert not arbiter.children[101].stopping
+    assert spawned == [True]
+
+
+def test_reload_model_signals_running_workers(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    save_model(train_model(), MODEL_PATH)
+    signalled = []
+    monkeypatch.setattr(server_module.os, "kill", lambda pid, signum: signalled.append((pid, signum)))
+
+    arbiter = Arbiter(app=SimpleNamespace(state=SimpleNamespace(model=None, model_version="old")), sock=None, workers=2)
+    arbiter.children = {101: WorkerProcess(pid=101), 102: WorkerProcess(pid=102, stopping=True)}
+    arbiter.reload_model()
+
+    # родитель держит новую модель для воркеров, которые запустятся позже
+    assert arbiter.app.state.model is not None
+    assert arbiter.app.state.model_version == model_file_version(MODEL_PATH)
+    assert signalled == [(101, signal.SIGHUP)]
+
+
+def test_failed_reload_keeps_workers_on_current_model(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    signalled = []
+    monkeypatch.setattr(server_module.os, "kill", lambda pid, signum: signalled.append(pid))
+
+    arbiter = Arbiter(app=SimpleNamespace(state=SimpleNamespace(model="current", model_version="old")), sock=None, workers=1)
+    arbiter.children = {101: WorkerProcess(pid=101)}
+    arbiter.reload_model()
+
+    assert arbiter.app.state.model == "current"
+    assert signalled == []
@@ -0,0 +1,70 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.server_timing import ServerTimingMiddleware, SlowRequestLog, set_attr, stage
+
+
+def _make_app(**middleware_kwargs) -> tuple[FastAPI, SlowRequestLog]:
+    log = SlowRequestLog(maxlen=2)
+    test_app = FastAPI()
+    test_app.add_middleware(ServerTimingMiddleware, log=log, **middleware_kwargs)
+
+    @test_app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        set_attr("item_id", item_id)
+        with stage("db"):
+            time.sleep(0.002)
+        with stage("db"):
+            pass
+        with stage("model"):
+            pass
+        return {"ok": True}
+
+    return test_app, log
+
+
+def test_server_timing_header_contains_stages() -> None:
+    test_app, _ = _make_app(header_enabled=True, sample_rate=1.0, threshold_ms=10_000)
+
+    with TestClient(test_app) as c:
+        response = c.get("/items/5")
+
+    header = response.headers["server-timing"]
+    assert "db;dur=" in header
+    assert "model;dur=" in header
+    assert "total;dur=" in header
+
+
+def test_slow_requests_are_captured_with_route_template() -> None:
+    test_app, log = _make_app(header_enabled=False, sample_rate=1.0, threshold_ms=0)
+
+    with TestClient(test_app) as c:
+        response = c.get("/items/7")
+        c.get("/items/8")
+        c.get("/items/9")
+
+    assert "server-timing" not in response.headers
+    entries = log.snapshot()
+    assert len(entries) == 2
+    assert entries[0]["route"] == "/items/{item_id}"
+    assert entries[0]["item_id"] == 8
+    assert entries[0]["status_code"] == 200
+    assert entries[0]["stages_ms"]["db"] >= 2.0
+
+
+def test_unsampled_slow_requests_are_captured_without_stages() -> None:
+    test_app, log = _make_app(header_enabled=True, sample_rate=0.0, threshold_ms=0)
+
+    with TestClient(test_app) as c:
+        response = c.get("/items/1")
+
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+    [entry] = log.snapshot()
+    assert entry["route"] == "/items/{item_id}"
+    assert entry["sampled"] is False
+    assert entry["stages_ms"] == {}
+    assert entry["item_id"] == 1
+    assert entry["total_ms"] >= 2.0
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from services.shadow import ShadowScorer
+
+
+class FakeModel:
+    def __init__(self, probability: float) -> None:
+        self.probability = probability
+        self.calls = []
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        self.calls.append(features.shape)
+        rows = features.shape[0]
+        return np.column_stack([np.full(rows, 1 - self.probability), np.full(rows, self.probability)])
+
+
+def _features() -> np.ndarray:
+    return np.array([[1.0, 0.3, 0.1, 0.05]])
+
+
+def test_submit_respects_sample_rate(tmp_path) -> None:
+    draws = iter([0.05, 0.5, 0.09])
+    scorer = ShadowScorer(FakeModel(0.5), tmp_path / "shadow.jsonl", sample_rate=0.1, rng=lambda: next(draws))
+
+    for item_id in range(3):
+        scorer.submit(item_id, _features(), 0.2)
+
+    assert scorer.stats()["submitted"] == 2
+    assert scorer.stats()["queued"] == 2
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path) -> None:
+    scorer = ShadowScorer(FakeModel(0.5), tmp_path / "shadow.jsonl", sample_rate=1.0, queue_size=2)
+
+    for item_id in range(5):
+        scorer.submit(item_id, _features(), 0.2)
+
+    stats = scorer.stats()
+    assert stats["submitted"] == 2
+    assert stats["dropped"] == 3
+
+
+@pytest.mark.asyncio
+async def test_run_scores_batches_and_logs_disagreements(tmp_path) -> None:
+    log_path = tmp_path / "shadow.jsonl"
+    model = FakeModel(0.9)
+    scorer = ShadowScorer(
+        model,
+        log_path,
+        model_version="candidate",
+        sample_rate=1.0,
+        batch_size=10,
+        flush_interval=0.01,
+    )
+    scorer.submit(1, _features(), 0.2)
+    scorer.submit(2, _features(), 0.8)
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(scorer.run(stop))
+    for _ in range(100):
+        if scorer.scored == 2:
+            break
+        await asyncio.sleep(0.01)
+    stop.set()
+    await task
+
+    # оба объекта скорятся одним вызовом модели
+    assert model.calls == [(2, 4)]
+    records = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["item_id"] for record in records] == [1, 2]
+    assert [record["disagree"] for record in records] == [True, False]
+    assert records[0]["version"] == "candidate"
+
+    stats = scorer.stats()
+    assert stats["disagreement_rate"] == 0.5
+    assert stats["mean_abs_delta"] == pytest.approx(0.4)
+
+
+def test_each_process_logs_to_its_own_file(tmp_path, monkeypatch) -> None:
+    import services.shadow as shadow_module
+    from model import save_model, train_model
+
+    model_path = tmp_path / "candidate.pkl"
+    save_model(train_model(), str(model_path))
+    monkeypatch.setattr(shadow_module, "SHADOW_MODEL_PATH", str(model_path))
+    monkeypatch.setattr(shadow_module, "SHADOW_LOG_PATH", str(tmp_path / "shadow_scores.jsonl"))
+
+    scorer = shadow_module.create_shadow_scorer()
+
+    assert scorer._log_path == tmp_path / f"shadow_scores.{os.getpid()}.jsonl"
+    assert shadow_module.process_log_path(Path("logs/shadow"), 42) == Path("logs/shadow.42")
@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+
+import pytest
+from aiokafka import TopicPartition
+
+from app.workers.telemetry import WorkerTelemetry, partition_lag
+from repositories.worker_telemetry import WorkerTelemetryRepository
+from services.autoscaling import fleet_summary, recommend_workers
+
+
+TP0 = TopicPartition("moderation", 0)
+TP1 = TopicPartition("moderation", 1)
+
+
+class FakeConsumer:
+    def __init__(self, highwaters: dict, committed: dict) -> None:
+        self._highwaters = highwaters
+        self._committed = committed
+
+    def assignment(self) -> set:
+        return set(self._highwaters)
+
+    def highwater(self, tp):
+        return self._highwaters[tp]
+
+    async def committed(self, tp):
+        return self._committed.get(tp)
+
+
+class FakeHashRedis:
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict] = {}
+
+    async def hset(self, key, field, value) -> None:
+        self.hashes.setdefault(key, {})[field.encode("utf-8")] = value
+
+    async def hgetall(self, key) -> dict:
+        return dict(self.hashes.get(key, {}))
+
+    async def hdel(self, key, *fields) -> int:
+        return sum(self.hashes[key].pop(field.encode("utf-8"), None) is not None for field in fields)
+
+
+async def test_snapshot_reports_rate_latency_capacity_and_lag() -> None:
+    now = [1000.0]
+    telemetry = WorkerTelemetry(window_seconds=60, clock=lambda: now[0])
+    created = datetime.fromtimestamp(990.0, tz=timezone.utc)
+    now[0] = 1010.0
+    for offset in range(20):
+        telemetry.record(TP0, offset, created, service_time=0.05)
+
+    consumer = FakeConsumer({TP0: 50, TP1: 7}, committed={TP1: 4})
+    snapshot = telemetry.snapshot(await partition_lag(consumer, telemetry))
+
+    assert snapshot["processing_rps"] == 2.0
+    assert snapshot["capacity_rps"] == 20.0
+    assert snapshot["e2e_latency_ms"]["p50"] == 20000.0
+    assert snapshot["lag"] == {"moderation:0": 30, "moderation:1": 3}
+    assert snapshot["total_lag"] == 33
+
+
+@pytest.mark.parametrize(
+    ("pending", "arrival_rps", "capacity", "partitions", "expected"),
+    [
+        (0, 10.0, 20.0, None, 1),  # 10 / (20 * 0.7) -> 1
+        (6000, 10.0, 20.0, None, 8),  # (10 + 100) / 14 -> 8
+        (6000, 10.0, 20.0, 4, 4),  # не больше партиций
+        (50, 0.0, None, None, 1),  # потолок не измерен, но бэклог есть
+    ],
+)
+def test_recommend_workers(pending, arrival_rps, capacity, partitions, expected) -> None:
+    assert (
+        recommend_workers(
+            pending=pending,
+            arrival_rps=arrival_rps,
+            capacity_rps_per_worker=capacity,
+            current_workers=0,
+            partitions=partitions,
+        )
+        == expected
+    )
+
+
+async def test_fleet_summary_from_published_snapshots() -> None:
+    redis = FakeHashRedis()
+    repo = WorkerTelemetryRepository(redis)
+    snapshot = {"processing_rps": 5.0, "capacity_rps": 10.0, "lag": {"moderation:0": 3}, "total_lag": 3}
+    await repo.publish("a:1", snapshot)
+    await repo.publish("b:2", {**snapshot, "lag": {"moderation:1": 2}, "total_lag": 2})
+    await redis.hset(repo.KEY, "dead:3", b'{"reported_at":0}')
+
+    snapshots = await repo.list_recent(max_age_seconds=30)
+    summary = fleet_summary(snapshots, pending=1400, oldest_pending_age=12.5)
+
+    assert set(snapshots) == {"a:1", "b:2"}
+    assert b"dead:3" not in redis.hashes[repo.KEY]
+    assert summary["kafka_lag"] == 5
+    # (10 + 1400 / 60) / (10 * 0.7) -> 5, но партиций только две
+    assert summary["recommended_workers"] == 2